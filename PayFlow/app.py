@@ -1,23 +1,881 @@
 import base64
+import cProfile
+import json
 import os
 import io
 import csv
+import hashlib
+import heapq
+import hmac
+import random
 import re
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from datetime import datetime, date, timedelta
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, send_from_directory
+from decimal import Decimal, InvalidOperation
+import click
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify, send_file, send_from_directory, g, has_request_context, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask.cli import AppGroup
+from flask.json.provider import DefaultJSONProvider
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import inspect, text
+from sqlalchemy import inspect, text, func, case, and_, or_, bindparam, event
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
 
 _FALLBACK_FAVICON = base64.b64decode(
     'iVBORw0KGgoAAAANSUhEUgAAAA4AAAAOCAYAAAAfSC3RAAAALElEQVQ4jWNgGAWjYBSMglEwCkbBUDAqRgUj4P///58BqYJRMArGgFDy0QAA2C4MxVQXJxYAAAAASUVORK5CYII='
 )
 
+
+def parse_date(value):
+    """Parse the YYYY-MM-DD / YYYY/MM/DD strings the client sends into a date."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str):
+        return None
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_money(value):
+    """Parse a wage/amount string into a Decimal rounded to cents, or None."""
+    if value is None or value == '':
+        return None
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite():
+        return None
+    return amount.quantize(Decimal('0.01'))
+
+
+def parse_month(value):
+    """First day of a YYYY-MM month string, or None."""
+    if not value or not re.fullmatch(r'\d{4}-\d{2}', value.strip()):
+        return None
+    return parse_date(f'{value.strip()}-01')
+
+
+def parse_id_list(value):
+    """Parse a comma-separated id list such as the job_ids query parameter."""
+    if not value:
+        return []
+    try:
+        return [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        return []
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque cursor token."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor produced by encode_cursor; returns None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+def parse_weekly_rule(value):
+    """Parse the weekly subset of an RRULE, e.g. 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20261231'.
+
+    Returns a dict with interval_weeks, weekdays (sorted Monday=0 indexes) and
+    until (a date or None), or None when the rule is not a weekly rule we support.
+    """
+    parts = {}
+    for part in (value or '').upper().replace('RRULE:', '').split(';'):
+        if not part.strip():
+            continue
+        name, _, raw = part.partition('=')
+        parts[name.strip()] = raw.strip()
+    if parts.pop('FREQ', None) != 'WEEKLY':
+        return None
+    try:
+        interval = int(parts.pop('INTERVAL', '1'))
+        weekdays = sorted({WEEKDAY_CODES.index(code.strip()) for code in parts.pop('BYDAY', '').split(',')})
+    except ValueError:
+        return None
+    until = None
+    until_raw = parts.pop('UNTIL', '')
+    if until_raw:
+        try:
+            until = datetime.strptime(until_raw[:8], '%Y%m%d').date()
+        except ValueError:
+            return None
+    if parts or interval < 1 or interval > 52 or not weekdays:
+        return None
+    return {'interval_weeks': interval, 'weekdays': weekdays, 'until': until}
+
+
+def format_weekly_rule(interval_weeks, weekdays, until=None):
+    rule = f"FREQ=WEEKLY;INTERVAL={interval_weeks};BYDAY={','.join(WEEKDAY_CODES[day] for day in weekdays)}"
+    if until:
+        rule += f";UNTIL={until.strftime('%Y%m%d')}"
+    return rule
+
+
+def time_to_minutes(value):
+    """Minutes since midnight for an HH:MM string, or None ('-' and '' mean unset)."""
+    hours, sep, mins = (value or '').strip().partition(':')
+    if not sep:
+        return None
+    try:
+        hours, mins = int(hours), int(mins)
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= mins < 60):
+        return None
+    return hours * 60 + mins
+
+
+def _overlap(start_a, end_a, start_b, end_b):
+    return np.maximum(0, np.minimum(end_a, end_b) - np.maximum(start_a, start_b))
+
+
+def compute_pay_batch(times, hourly_wage, night_start=None, night_end=None, night_multiplier=None,
+                      overtime_threshold=None, overtime_multiplier=None):
+    """Price many shifts at one hourly rate in a single vectorized pass.
+
+    `times` is a sequence of (start_time, end_time, break_start, break_end)
+    HH:MM strings. Mirrors the client's calculateWage: an end at or before the
+    start runs past midnight, night minutes earn night_multiplier, and hours past
+    overtime_threshold earn the overtime_multiplier premium on top. Returns a
+    list of (total_hours, total_wage) Decimals, or None where the times are invalid.
+    """
+    if not times:
+        return []
+    day = 24 * 60
+    parsed = np.array([[time_to_minutes(value) if value else None for value in row] for row in times],
+                      dtype=float)  # None -> nan
+    start, end, break_start, break_end = parsed.T
+    valid = ~(np.isnan(start) | np.isnan(end))
+    end = np.where(end > start, end, end + day)
+
+    has_break = ~(np.isnan(break_start) | np.isnan(break_end))
+    break_start = np.where(break_start >= start, break_start, break_start + day)
+    break_end = np.where(break_end > break_start, break_end, break_end + day)
+    # Clip the break to the shift so a stray break never goes negative.
+    break_start = np.where(has_break, np.clip(break_start, start, end), start)
+    break_end = np.where(has_break, np.clip(break_end, break_start, end), start)
+    worked = (end - start) - (break_end - break_start)
+
+    night = np.zeros_like(worked)
+    night_from, night_to = time_to_minutes(night_start), time_to_minutes(night_end)
+    if night_multiplier and night_from is not None and night_to is not None:
+        if night_to <= night_from:
+            night_to += day
+        # Shifts span at most two calendar days, so three copies of the window cover them.
+        for offset in (-day, 0, day):
+            window_from, window_to = night_from + offset, night_to + offset
+            night += _overlap(start, end, window_from, window_to)
+            night -= _overlap(break_start, break_end, window_from, window_to)
+    rate = float(hourly_wage or 0)
+    pay = (worked - night) / 60 * rate + night / 60 * rate * float(night_multiplier or 1)
+    if overtime_threshold is not None and overtime_multiplier:
+        overtime_hours = np.maximum(0, worked / 60 - float(overtime_threshold))
+        pay += overtime_hours * rate * (float(overtime_multiplier) - 1)
+    # Whole currency units, rounded half up like Math.round in the client.
+    wages = np.floor(pay + 0.5)
+
+    results = []
+    for ok, minutes, wage in zip(valid, worked, wages):
+        if not ok:
+            results.append(None)
+        else:
+            results.append((Decimal(f'{minutes / 60:.2f}'), Decimal(int(wage))))
+    return results
+
+
+def compute_shift_pay(start_time, end_time, break_start, break_end, hourly_wage, **rules):
+    """compute_pay_batch for a single shift."""
+    return compute_pay_batch([(start_time, end_time, break_start, break_end)], hourly_wage, **rules)[0]
+
+
+def non_string_field(data, names):
+    """The first of ``names`` whose value in ``data`` is set but not a string, or None."""
+    for name in names:
+        value = data.get(name)
+        if value is not None and not isinstance(value, str):
+            return name
+    return None
+
+
+def parse_wage_rules(data):
+    """Validate the optional job pay rules in a request body.
+
+    Returns (rules, error); rules only holds the WAGE_RULE_FIELDS present in data.
+    """
+    rules = {}
+    invalid = non_string_field(data, ('night_start', 'night_end'))
+    if invalid:
+        return None, f'Invalid {invalid}'
+    for name in ('night_start', 'night_end'):
+        if name in data:
+            value = (data.get(name) or '').strip() or None
+            if value is not None and time_to_minutes(value) is None:
+                return None, f'Invalid {name}'
+            rules[name] = value
+    for name, minimum in (('night_multiplier', 1), ('overtime_threshold', 0), ('overtime_multiplier', 1)):
+        if name in data:
+            value = data.get(name)
+            if value in (None, ''):
+                rules[name] = None
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None, f'Invalid {name}'
+            if value < minimum:
+                return None, f'Invalid {name}'
+            rules[name] = value
+    return rules, None
+
+
+def expand_weekly(anchor, interval_weeks, weekdays, until, window_start, window_end):
+    """Yield, in order, the dates a weekly rule falls on inside [window_start, window_end].
+
+    Weeks are counted from the Monday of the anchor week, so an every-other-week
+    rule keeps its phase however far the window is from the anchor.
+    """
+    start = max(anchor, window_start)
+    end = min(until, window_end) if until else window_end
+    if start > end:
+        return
+    anchor_monday = anchor - timedelta(days=anchor.weekday())
+    monday = start - timedelta(days=start.weekday())
+    offset = ((monday - anchor_monday).days // 7) % interval_weeks
+    if offset:
+        monday += timedelta(weeks=interval_weeks - offset)
+    step = timedelta(weeks=interval_weeks)
+    while monday <= end:
+        for weekday in weekdays:
+            day = monday + timedelta(days=weekday)
+            if start <= day <= end:
+                yield day
+        monday += step
+
+
+def merge_shift_streams(concrete, virtual):
+    """Merge date-ordered concrete shifts with date-ordered recurring occurrences.
+
+    `concrete` yields (day, job_id, row) and `virtual` yields (day, job_id, template).
+    Yields (day, row, template) with exactly one of row/template set. An occurrence
+    is dropped when the same job already has a concrete shift that day, since the
+    user logged (or adjusted) that one by hand.
+    """
+    merged = heapq.merge(
+        ((day, 0, job_id, row) for day, job_id, row in concrete),
+        ((day, 1, job_id, template) for day, job_id, template in virtual),
+        key=lambda entry: (entry[0], entry[1]),
+    )
+    current_day, jobs_logged = None, set()
+    for day, is_virtual, job_id, item in merged:
+        if day != current_day:
+            current_day, jobs_logged = day, set()
+        if not is_virtual:
+            jobs_logged.add(job_id)
+            yield day, item, None
+        elif job_id not in jobs_logged:
+            yield day, None, item
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson when it is installed.
+
+    Output matches the default provider: sorted keys, non-ASCII kept as-is,
+    and dates/Decimals handled by the default provider's fallback.
+    """
+
+    ensure_ascii = False
+
+    def _orjson_options(self, indent=False):
+        options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        if orjson is None:
+            response = super().response(*args, **kwargs)
+        else:
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            body = orjson.dumps(obj, default=self.default, option=self._orjson_options(indent))
+            response = self._app.response_class(body + b'\n', mimetype=self.mimetype)
+        if has_request_context():
+            g.json_time = g.get('json_time', 0.0) + time.perf_counter() - started
+        return response
+
+
+# Output fields of the list/sync payloads. The list endpoints select exactly
+# these columns (no ORM entities) and zip each result row with the tuple.
+SHIFT_FIELDS = ('id', 'date', 'shift_type', 'start_time', 'end_time', 'break_start', 'break_end',
+                'total_hours', 'hourly_wage', 'currency', 'total_wage', 'job_id', 'job_name', 'job_color')
+JOB_FIELDS = ('id', 'name', 'hourly_wage', 'currency', 'color', 'night_start', 'night_end',
+              'night_multiplier', 'overtime_threshold', 'overtime_multiplier')
+# Job columns the wage engine reads besides hourly_wage (see compute_pay_batch).
+WAGE_RULE_FIELDS = ('night_start', 'night_end', 'night_multiplier', 'overtime_threshold', 'overtime_multiplier')
+# HH:MM request fields the wage engine parses.
+SHIFT_TIME_FIELDS = ('start_time', 'end_time', 'break_start', 'break_end')
+EXPENSE_FIELDS = ('id', 'date', 'category', 'amount', 'description')
+RECEIPT_FIELDS = ('id', 'title', 'date', 'subtotal', 'tax_total', 'grand_total', 'note', 'created_at')
+RECEIPT_ITEM_FIELDS = ('id', 'date', 'category', 'description', 'quantity', 'unit_price', 'tax_rate', 'line_total')
+RECEIPT_ITEM_BATCH = 500
+SEARCH_ENTITIES = ('expenses', 'receipts', 'jobs')
+RECURRING_SHIFT_FIELDS = ('id', 'shift_type', 'start_time', 'end_time', 'break_start', 'break_end',
+                          'total_hours', 'hourly_wage', 'currency', 'total_wage', 'job_id',
+                          'interval_weeks', 'weekdays', 'start_date', 'end_date', 'job_name', 'job_color')
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self):
+        return {'backend': 'memory', 'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+class RedisCache:
+    """Cache backed by a (local) Redis-compatible server; values are stored as JSON."""
+
+    def __init__(self, client, ttl=300, namespace='payflow:cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.namespace + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self.client.setex(self.namespace + key, self.ttl, json.dumps(value))
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.namespace + prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses}
+
+
+class NullCache:
+    """Cache that never stores anything (CACHE_BACKEND=none)."""
+
+    hits = 0
+
+    def __init__(self):
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def stats(self):
+        return {'backend': 'none', 'hits': 0, 'misses': self.misses}
+
+
+# Only one profiler may be active per process (on Python 3.12+ a second
+# concurrent enable() raises), so sampled requests take turns: a request that
+# finds it busy simply goes unprofiled.
+PROFILER_LOCK = threading.Lock()
+
+
+class RequestMetrics:
+    """Per-process request timings, rendered in the Prometheus text format.
+
+    Counters are per process, so behind gunicorn each scrape sees one worker.
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._statuses = {}
+
+    def observe(self, endpoint, method, status, wall, sql, queries, serialization):
+        with self._lock:
+            stats = self._endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self._endpoints[(endpoint, method)] = {
+                    'buckets': [0] * len(self.BUCKETS), 'count': 0, 'wall': 0.0,
+                    'sql': 0.0, 'queries': 0, 'serialization': 0.0,
+                }
+            for index, bound in enumerate(self.BUCKETS):
+                if wall <= bound:
+                    stats['buckets'][index] += 1
+            stats['count'] += 1
+            stats['wall'] += wall
+            stats['sql'] += sql
+            stats['queries'] += queries
+            stats['serialization'] += serialization
+            key = (endpoint, method, status)
+            self._statuses[key] = self._statuses.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            endpoints = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._endpoints.items()}
+            statuses = dict(self._statuses)
+        lines = [
+            '# HELP payflow_requests_total Requests handled, by endpoint, method and status.',
+            '# TYPE payflow_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(statuses.items()):
+            lines.append(f'payflow_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+        lines += [
+            '# HELP payflow_request_duration_seconds Wall time spent in the Flask handler.',
+            '# TYPE payflow_request_duration_seconds histogram',
+        ]
+        for (endpoint, method), stats in sorted(endpoints.items()):
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            for bound, count in zip(self.BUCKETS, stats['buckets']):
+                lines.append(f'payflow_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'payflow_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+            lines.append(f'payflow_request_duration_seconds_sum{{{labels}}} {stats["wall"]:.6f}')
+            lines.append(f'payflow_request_duration_seconds_count{{{labels}}} {stats["count"]}')
+        for name, field, help_text in (
+            ('payflow_request_sql_seconds_total', 'sql', 'Time spent executing SQL statements.'),
+            ('payflow_request_queries_total', 'queries', 'SQL statements executed.'),
+            ('payflow_request_serialization_seconds_total', 'serialization', 'Time spent encoding JSON responses.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (endpoint, method), stats in sorted(endpoints.items()):
+                value = stats[field]
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{name}{{endpoint="{endpoint}",method="{method}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def make_cache(backend, ttl, max_entries, redis_url=None):
+    if backend == 'none':
+        return NullCache()
+    if backend == 'redis':
+        try:
+            import redis
+        except Exception as exc:
+            raise RuntimeError(
+                "CACHE_BACKEND is 'redis' but the redis package is missing. "
+                "Add 'redis' to your requirements."
+            ) from exc
+        return RedisCache(redis.Redis.from_url(redis_url or 'redis://localhost:6379/0'), ttl=ttl)
+    return LRUCache(max_entries=max_entries, ttl=ttl)
+
+
+class PasswordHashBusy(Exception):
+    """Raised when the password hashing queue is full; answered with a 503."""
+
+
+# Fields of the per-process user cache (see cached_user in create_app). The
+# password hash is deliberately absent: other workers cannot invalidate this
+# process's cache, so checks always read it from the database.
+CachedUser = namedtuple('CachedUser', ('id', 'username', 'email'))
+
+
+class ServerSession(SecureCookieSession):
+    """Session dict whose contents live in a SessionStore; the cookie holds only a token."""
+
+    def __init__(self, initial=None, token=None, expires_at=None):
+        super().__init__(initial)
+        self.token = token
+        self.expires_at = expires_at
+        self.loaded_user_id = self.get('user_id')
+
+
+class SqlSessionStore:
+    """Sessions in the app database (the user_session table).
+
+    Every call runs on its own connection so a session write never commits,
+    or is rolled back with, the request's own transaction.
+    """
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+
+    def load(self, sid):
+        with self.db.engine.connect() as conn:
+            row = conn.execute(
+                self.table.select().with_only_columns(self.table.c.data, self.table.c.expires_at)
+                .where(self.table.c.id == sid)
+            ).first()
+        return (row.data, row.expires_at) if row else None
+
+    def save(self, sid, user_id, data, expires_at):
+        values = {'user_id': user_id, 'data': data, 'expires_at': expires_at}
+        with self.db.engine.begin() as conn:
+            updated = conn.execute(self.table.update().where(self.table.c.id == sid).values(**values))
+            if not updated.rowcount:
+                conn.execute(self.table.insert().values(id=sid, **values))
+
+    def touch(self, sid, expires_at):
+        with self.db.engine.begin() as conn:
+            conn.execute(self.table.update().where(self.table.c.id == sid).values(expires_at=expires_at))
+
+    def delete(self, sid):
+        with self.db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.id == sid))
+
+    def delete_user(self, user_id, keep=None):
+        stmt = self.table.delete().where(self.table.c.user_id == user_id)
+        if keep is not None:
+            stmt = stmt.where(self.table.c.id != keep)
+        with self.db.engine.begin() as conn:
+            return conn.execute(stmt).rowcount
+
+    def sweep(self, now):
+        with self.db.engine.begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.expires_at < now)).rowcount
+
+
+class RedisSessionStore:
+    """Sessions in Redis; keys expire on their own, so sweep() has nothing to do."""
+
+    def __init__(self, client, namespace='payflow:session:'):
+        self.client = client
+        self.namespace = namespace
+
+    def _ttl(self, expires_at):
+        return max(1, int((expires_at - datetime.utcnow()).total_seconds()))
+
+    def load(self, sid):
+        raw = self.client.get(self.namespace + sid)
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        return record['data'], datetime.fromisoformat(record['expires_at'])
+
+    def save(self, sid, user_id, data, expires_at):
+        record = {'user_id': user_id, 'data': data, 'expires_at': expires_at.isoformat()}
+        pipe = self.client.pipeline()
+        pipe.setex(self.namespace + sid, self._ttl(expires_at), json.dumps(record))
+        if user_id is not None:
+            pipe.sadd(f'{self.namespace}user:{user_id}', sid)
+        pipe.execute()
+
+    def touch(self, sid, expires_at):
+        raw = self.client.get(self.namespace + sid)
+        if raw is not None:
+            record = json.loads(raw)
+            self.save(sid, record['user_id'], record['data'], expires_at)
+
+    def delete(self, sid):
+        self.client.delete(self.namespace + sid)
+
+    def delete_user(self, user_id, keep=None):
+        index = f'{self.namespace}user:{user_id}'
+        sids = [sid.decode() if isinstance(sid, bytes) else sid for sid in self.client.smembers(index)]
+        doomed = [sid for sid in sids if sid != keep]
+        if doomed:
+            self.client.delete(*[self.namespace + sid for sid in doomed])
+            self.client.srem(index, *doomed)
+        return len(doomed)
+
+    def sweep(self, now):
+        return 0
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over a SqlSessionStore or RedisSessionStore.
+
+    The cookie carries a random token and the store is keyed by its SHA-256,
+    so a leaked session table cannot be replayed. Expiry slides: a request
+    pushes expires_at forward once it is more than ``refresh`` old.
+    """
+
+    def __init__(self, store, ttl, refresh):
+        self.store = store
+        self.ttl = ttl
+        self.refresh = refresh
+
+    @staticmethod
+    def session_id(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def open_session(self, app, request):
+        token = request.cookies.get(self.get_cookie_name(app))
+        if token:
+            record = self.store.load(self.session_id(token))
+            if record and record[1] > datetime.utcnow():
+                return ServerSession(session_json_serializer.loads(record[0]), token, record[1])
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.token:
+                self.store.delete(self.session_id(session.token))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        user_id = session.get('user_id')
+        if session.token is None or user_id != session.loaded_user_id:
+            # New session, or a login/logout on an existing one: issue a fresh
+            # token so a token planted before login is useless afterwards.
+            if session.token:
+                self.store.delete(self.session_id(session.token))
+            session.token = secrets.token_urlsafe(32)
+            self.store.save(self.session_id(session.token), user_id,
+                            session_json_serializer.dumps(dict(session)), expires_at)
+        elif session.modified:
+            self.store.save(self.session_id(session.token), user_id,
+                            session_json_serializer.dumps(dict(session)), expires_at)
+        elif session.expires_at < expires_at - self.refresh:
+            self.store.touch(self.session_id(session.token), expires_at)
+        else:
+            return
+        response.set_cookie(
+            name, session.token, expires=expires_at, httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path, secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def make_session_store(backend, db, table, redis_url=None):
+    if backend == 'redis':
+        try:
+            import redis
+        except Exception as exc:
+            raise RuntimeError(
+                "SESSION_BACKEND is 'redis' but the redis package is missing. "
+                "Add 'redis' to your requirements."
+            ) from exc
+        return RedisSessionStore(redis.Redis.from_url(redis_url or 'redis://localhost:6379/0'))
+    return SqlSessionStore(db, table)
+
+# Labels for server-rendered receipt PDFs; other languages fall back to the
+# client-side jsPDF renderer.
+RECEIPT_PDF_LABELS = {
+    'en': {
+        'heading': '領収書 (Receipt)', 'latin_heading': 'Receipt', 'title': 'Receipt Title', 'date': 'Receipt Date', 'note': 'Note',
+        'columns': ('Date', 'Category', 'Description', 'Qty', 'Unit Price', 'Tax %', 'Line Total'),
+        'subtotal': 'Subtotal', 'tax': 'Tax', 'grand': 'Grand Total',
+        'categories': {'food': 'Food', 'transportation': 'Transportation', 'shopping': 'Shopping',
+                       'bills': 'Bills', 'other': 'Other'},
+    },
+    'ja': {
+        'heading': '領収書 (Receipt)', 'latin_heading': 'Receipt', 'title': '領収書タイトル', 'date': '領収書日付', 'note': '備考',
+        'columns': ('日付', 'カテゴリ', '説明', '数量', '単価', '税率 %', '合計'),
+        'subtotal': '小計', 'tax': '税額', 'grand': '合計',
+        'categories': {'food': '食費', 'transportation': '交通費', 'shopping': 'ショッピング',
+                       'bills': '公共料金', 'other': 'その他'},
+    },
+}
+# Bump when the PDF layout changes so cached files are re-rendered.
+RECEIPT_PDF_LAYOUT_VERSION = 1
+
+
+def receipt_pdf_digest(receipt, lang, currency, font_path):
+    """Content address of a rendered receipt: everything that ends up in the PDF."""
+    rendered = {key: receipt[key] for key in RECEIPT_FIELDS if key not in ('id', 'created_at')}
+    rendered['items'] = [{key: item[key] for key in RECEIPT_ITEM_FIELDS if key != 'id'} for item in receipt['items']]
+    font = None
+    if font_path and os.path.exists(font_path):
+        font = [os.path.basename(font_path), os.path.getsize(font_path)]
+    payload = [RECEIPT_PDF_LAYOUT_VERSION, lang, currency, font, rendered]
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def render_receipt_pdf(receipt, lang, currency, font_path):
+    """Render a receipt dict (as built by receipts_to_dicts) to PDF bytes.
+
+    Uses fpdf2, which embeds only the glyphs used from the TrueType font.
+    Without the font file only Latin-1 text can be rendered; returns None
+    when the receipt needs glyphs that are not available.
+    """
+    try:
+        from fpdf import FPDF
+        from fpdf.fonts import FontFace
+    except Exception as exc:
+        raise RuntimeError(
+            "Server-side receipt PDFs need the fpdf2 package. Add 'fpdf2' to your requirements."
+        ) from exc
+    labels = RECEIPT_PDF_LABELS[lang]
+
+    def money(value):
+        return f"{currency}{float(value or 0):,.2f}"
+
+    lines = [
+        (18, labels['heading']),
+        (12, f"{labels['title']}: {receipt['title'] or '-'}"),
+        (12, f"{labels['date']}: {receipt['date'] or '-'}"),
+    ]
+    if receipt['note']:
+        lines.append((12, f"{labels['note']}: {receipt['note']}"))
+    rows = [labels['columns']] + [(
+        item['date'] or '-',
+        labels['categories'].get(item['category'], labels['categories']['other']),
+        item['description'] or '',
+        f"{float(item['quantity'] or 0):g}",
+        f"{float(item['unit_price'] or 0):.2f}",
+        f"{float(item['tax_rate'] or 0):.1f}",
+        money(item['line_total']),
+    ) for item in receipt['items']]
+    totals = [
+        (12, f"{labels['subtotal']}: {money(receipt['subtotal'])}"),
+        (12, f"{labels['tax']}: {money(receipt['tax_total'])}"),
+        (14, f"{labels['grand']}: {money(receipt['grand_total'])}"),
+    ]
+
+    pdf = FPDF(format='A4')
+    pdf.set_creation_date(datetime(2000, 1, 1))  # keep output byte-identical for identical input
+    if font_path and os.path.exists(font_path):
+        pdf.add_font('ReceiptFont', '', font_path)
+        font = 'ReceiptFont'
+    else:
+        lines[0] = (18, labels['latin_heading'])
+        all_text = ''.join(t for _, t in lines + totals) + ''.join(''.join(row) for row in rows)
+        try:
+            all_text.encode('latin-1')
+        except UnicodeEncodeError:
+            return None
+        font = 'Helvetica'
+    pdf.add_page()
+    pdf.set_margins(14, 14)
+    for size, line in lines:
+        pdf.set_font(font, size=size)
+        pdf.multi_cell(0, size * 0.6, line, new_x='LMARGIN', new_y='NEXT')
+        pdf.ln(2)
+    pdf.ln(4)
+    pdf.set_font(font, size=10)
+    with pdf.table(
+        rows,
+        col_widths=(22, 26, 50, 14, 24, 16, 30),
+        text_align=('LEFT', 'LEFT', 'LEFT', 'RIGHT', 'RIGHT', 'RIGHT', 'RIGHT'),
+        headings_style=FontFace(fill_color=(41, 128, 185), color=(255, 255, 255)),
+        first_row_as_headings=True,
+    ):
+        pass
+    pdf.ln(8)
+    for size, line in totals:
+        pdf.set_font(font, size=size)
+        pdf.cell(0, size * 0.7, line, new_x='LMARGIN', new_y='NEXT')
+    return bytes(pdf.output())
+
+
+def prune_file_cache(directory, max_bytes, max_age, grace=60):
+    """Trim a file cache: drop files unused for ``max_age`` seconds, then the
+    least recently used until the total is under ``max_bytes``.
+
+    Files touched in the last ``grace`` seconds are kept so a download that
+    is about to be sent is not pulled out from under it. Returns the number
+    of files removed.
+    """
+    now = time.time()
+    entries = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        idle = now - mtime
+        if idle < grace or (idle < max_age and total <= max_bytes):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
 def create_app():
     app = Flask(__name__)
     app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key')
     # Ensure JSON responses keep Unicode characters such as Japanese intact
     app.config['JSON_AS_ASCII'] = False
+    app.json = FastJSONProvider(app)
 
     # --- Database Configuration ---
     # Prefer DATABASE_URL (Render/Heroku), otherwise use SQLite.
@@ -39,8 +897,210 @@ def create_app():
 
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Connection pool: pre-ping and recycle so connections a hosted Postgres has
+    # dropped while the service idled are replaced instead of erroring.
+    if database_url.startswith('postgresql://'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '300')),
+            'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes'),
+        }
+    # SQLite connection PRAGMAs: WAL lets readers run alongside the single
+    # writer, and busy_timeout makes workers wait for the write lock instead of
+    # failing with "database is locked". cache_size is in KiB (negative in SQLite).
+    app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    app.config['SQLITE_CACHE_KB'] = int(os.getenv('SQLITE_CACHE_KB', '20000'))
+    # Operational endpoints (pool and cache stats, /metrics) answer only
+    # requests carrying "Authorization: Bearer <METRICS_TOKEN>"; without a
+    # token they are off.
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
+    # Per-request SQL statement budget (0 disables). When exceeded the request
+    # raises under app.testing or QUERY_BUDGET_STRICT, otherwise it is logged.
+    app.config['QUERY_BUDGET'] = int(os.getenv('QUERY_BUDGET', '0') or 0)
+    app.config['QUERY_BUDGET_STRICT'] = os.getenv('QUERY_BUDGET_STRICT', '').lower() in ('1', 'true', 'yes')
+    # Opt-in request profiling: Server-Timing headers and /metrics (behind
+    # METRICS_TOKEN, like /health/db). With PROFILE_SLOW_MS set,
+    # PROFILE_SAMPLE_RATE of requests run under cProfile and those slower than
+    # the threshold are dumped to PROFILE_DIR.
+    app.config['PROFILING'] = os.getenv('PROFILING', '').lower() in ('1', 'true', 'yes')
+    app.config['PROFILE_SLOW_MS'] = float(os.getenv('PROFILE_SLOW_MS', '0') or 0)
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0.1'))
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    # Password hashing policy, in Werkzeug's method syntax (e.g. "scrypt:16384:8:1"
+    # or "pbkdf2:sha256:600000"). Hashes made under another policy are upgraded
+    # on the next successful login (the salt length is part of the policy).
+    # Hashing runs on PASSWORD_HASH_WORKERS threads per process, which caps its
+    # CPU use; request threads wait for their hash, so at most
+    # PASSWORD_HASH_QUEUE hashes may be running or waiting and further attempts
+    # get a 503 instead of tying up more request threads.
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_SALT_LENGTH'] = int(os.getenv('PASSWORD_SALT_LENGTH', '16'))
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    app.config['PASSWORD_HASH_QUEUE'] = int(
+        os.getenv('PASSWORD_HASH_QUEUE', str(app.config['PASSWORD_HASH_WORKERS'] * 2))
+    )
+    # Sessions: 'sql' keeps them in the user_session table, 'redis' in a local
+    # Redis, 'cookie' falls back to Flask's signed cookie (which cannot be
+    # revoked). Expiry slides by SESSION_TTL, rewritten at most every
+    # SESSION_REFRESH seconds per session.
+    app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'sql').lower()
+    app.config['SESSION_TTL'] = int(os.getenv('SESSION_TTL', str(14 * 24 * 3600)))
+    app.config['SESSION_REFRESH'] = int(os.getenv('SESSION_REFRESH', '3600'))
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', '60'))
+    app.config['USER_CACHE_MAX_ENTRIES'] = int(os.getenv('USER_CACHE_MAX_ENTRIES', '1024'))
+    # Schema migrations normally run as a release step (`flask payflow migrate`).
+    # Local SQLite setups have no release step, so they migrate on boot by default.
+    auto_migrate_default = '1' if database_url.startswith('sqlite') else '0'
+    app.config['AUTO_MIGRATE'] = os.getenv('AUTO_MIGRATE', auto_migrate_default).lower() in ('1', 'true', 'yes')
+
+    # Report/budget response cache: memory (default), redis or none.
+    app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory').lower()
+    app.config['CACHE_TTL'] = int(os.getenv('CACHE_TTL', '300'))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', '2048'))
+    report_cache = make_cache(
+        app.config['CACHE_BACKEND'], app.config['CACHE_TTL'],
+        app.config['CACHE_MAX_ENTRIES'], os.getenv('REDIS_URL')
+    )
+
+    # Server-rendered receipt PDFs: TrueType font to subset from, and the
+    # content-addressed directory rendered files are kept in (trimmed by age
+    # and total size, see prune_file_cache).
+    app.config['RECEIPT_PDF_FONT'] = os.getenv(
+        'RECEIPT_PDF_FONT', os.path.join(app.static_folder, 'fonts', 'NotoSansJP-Regular.ttf')
+    )
+    app.config['RECEIPT_PDF_CACHE_DIR'] = os.getenv(
+        'RECEIPT_PDF_CACHE_DIR', os.path.join(app.instance_path, 'receipt_pdfs')
+    )
+    app.config['RECEIPT_PDF_CACHE_MAX_MB'] = int(os.getenv('RECEIPT_PDF_CACHE_MAX_MB', '200'))
+    app.config['RECEIPT_PDF_CACHE_MAX_AGE_DAYS'] = int(os.getenv('RECEIPT_PDF_CACHE_MAX_AGE_DAYS', '30'))
+    # The font is not committed (it is several MB). Without it only Latin-1
+    # receipts render on the server and the rest get a 503, on which the
+    # client renders the PDF itself. A missing font is therefore a warning;
+    # deployments that ship the font can set RECEIPT_PDF_FONT_REQUIRED=1 to
+    # refuse to boot without it.
+    app.config['RECEIPT_PDF_FONT_REQUIRED'] = os.getenv(
+        'RECEIPT_PDF_FONT_REQUIRED', ''
+    ).lower() in ('1', 'true', 'yes')
+    if not os.path.exists(app.config['RECEIPT_PDF_FONT']):
+        message = (f"Receipt PDF font {app.config['RECEIPT_PDF_FONT']} is missing. Download "
+                   "NotoSansJP-Regular.ttf into static/fonts/ or point RECEIPT_PDF_FONT at a TrueType "
+                   "font with Japanese glyphs.")
+        if app.config['RECEIPT_PDF_FONT_REQUIRED']:
+            raise RuntimeError(message + " Unset RECEIPT_PDF_FONT_REQUIRED to run without it.")
+        print(f"[WARN] {message} Only Latin-1 receipts will render server-side.")
 
     db = SQLAlchemy(app)
+    payflow_cli = AppGroup('payflow', help='PayFlow maintenance commands.')
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_request_queries(conn, cursor, statement, parameters, context, executemany):
+            if has_request_context():
+                g.query_count = g.get('query_count', 0) + 1
+                context._payflow_started = time.perf_counter()
+
+        @event.listens_for(db.engine, 'after_cursor_execute')
+        def time_request_queries(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_payflow_started', None)
+            if started is not None and has_request_context():
+                g.sql_time = g.get('sql_time', 0.0) + time.perf_counter() - started
+
+        if db.engine.dialect.name == 'sqlite':
+            @event.listens_for(db.engine, 'connect')
+            def apply_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+                cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+                cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']:d}")
+                cursor.execute(f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_KB']:d}")
+                cursor.close()
+
+    def internal_only(view):
+        """Serve ``view`` only to callers presenting METRICS_TOKEN (404 while no token is configured)."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = app.config['METRICS_TOKEN']
+            if not token:
+                return jsonify({'error': 'Not found'}), 404
+            scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() != 'bearer' or not hmac.compare_digest(presented.strip(), token):
+                return jsonify({'error': 'Forbidden'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+
+    @app.after_request
+    def enforce_query_budget(response):
+        budget = app.config.get('QUERY_BUDGET') or 0
+        count = g.get('query_count', 0)
+        if budget and count > budget:
+            message = f"{request.method} {request.path} issued {count} queries (budget {budget})"
+            if app.testing or app.config.get('QUERY_BUDGET_STRICT'):
+                raise RuntimeError(message)
+            app.logger.warning(message)
+        return response
+
+    request_metrics = RequestMetrics()
+
+    if app.config['PROFILING']:
+        @app.before_request
+        def start_request_profile():
+            g.request_started = time.perf_counter()
+            if (app.config['PROFILE_SLOW_MS'] and random.random() < app.config['PROFILE_SAMPLE_RATE']
+                    and PROFILER_LOCK.acquire(blocking=False)):
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiling tool (e.g. a debugger) holds the hook.
+                    PROFILER_LOCK.release()
+                else:
+                    g.profiler = profiler
+
+        @app.after_request
+        def finish_request_profile(response):
+            started = g.get('request_started')
+            if started is None:
+                return response
+            wall = time.perf_counter() - started
+            sql = g.get('sql_time', 0.0)
+            queries = g.get('query_count', 0)
+            serialization = g.get('json_time', 0.0)
+            response.headers['Server-Timing'] = (
+                f'app;dur={wall * 1000:.2f}, db;dur={sql * 1000:.2f};desc="{queries} queries", '
+                f'json;dur={serialization * 1000:.2f}'
+            )
+            request_metrics.observe(request.endpoint or 'unmatched', request.method, response.status_code,
+                                    wall, sql, queries, serialization)
+
+            profiler = g.get('profiler')
+            if profiler is not None:
+                profiler.disable()
+                if wall * 1000 >= app.config['PROFILE_SLOW_MS']:
+                    os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+                    path = os.path.join(app.config['PROFILE_DIR'], '{}-{}-{}.prof'.format(
+                        datetime.utcnow().strftime('%Y%m%dT%H%M%S%f'), request.endpoint or 'unmatched', os.getpid()))
+                    profiler.dump_stats(path)
+                    app.logger.warning(f"{request.method} {request.path} took {wall * 1000:.0f} ms "
+                                       f"({sql * 1000:.0f} ms SQL over {queries} queries); profile saved to {path}")
+            return response
+
+        @app.teardown_request
+        def stop_request_profile(exc):
+            # Runs even when the handler or after_request raised, so the lock
+            # is always handed back.
+            profiler = g.pop('profiler', None)
+            if profiler is not None:
+                profiler.disable()
+                PROFILER_LOCK.release()
+
+        @app.route('/metrics')
+        @internal_only
+        def metrics():
+            return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
 
     # --- Models ---
     class User(db.Model):
@@ -48,10 +1108,13 @@ def create_app():
         username = db.Column(db.String(150), unique=True, nullable=False)
         email = db.Column(db.String(150), unique=True, nullable=True)
         password = db.Column(db.Text, nullable=False)
+        # Bumped by every write handler; read APIs derive their ETag from it.
+        data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
         shifts = db.relationship('Shift', backref='user', lazy=True, cascade='all, delete-orphan')
         jobs = db.relationship('Job', backref='user', lazy=True, cascade='all, delete-orphan')
         expenses = db.relationship('Expense', backref='user', lazy=True, cascade='all, delete-orphan')
         receipts = db.relationship('Receipt', backref='user', lazy=True, cascade='all, delete-orphan')
+        recurring_shifts = db.relationship('RecurringShift', backref='user', lazy=True, cascade='all, delete-orphan')
 
     class Job(db.Model):
         id = db.Column(db.Integer, primary_key=True)
@@ -59,8 +1122,19 @@ def create_app():
         hourly_wage = db.Column(db.Float, nullable=False, default=0.0)
         currency = db.Column(db.String(10), nullable=False, default='¥')
         color = db.Column(db.String(20), nullable=False, default='#4f46e5')
+        # Optional pay rules; NULL multipliers switch the rule off.
+        night_start = db.Column(db.String(10))
+        night_end = db.Column(db.String(10))
+        night_multiplier = db.Column(db.Float)
+        overtime_threshold = db.Column(db.Float)  # hours per shift
+        overtime_multiplier = db.Column(db.Float)
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
         user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
         shifts = db.relationship('Shift', backref='job', lazy=True)
+        __table_args__ = (
+            db.Index('ix_job_user', 'user_id'),
+            db.Index('ix_job_user_updated_at', 'user_id', 'updated_at'),
+        )
 
     class Shift(db.Model):
         id = db.Column(db.Integer, primary_key=True)
@@ -74,8 +1148,46 @@ def create_app():
         hourly_wage = db.Column(db.String(10))
         currency = db.Column(db.String(10))
         total_wage = db.Column(db.String(10))
+        # typed copies of date/total_wage used for SQL-side aggregation
+        work_date = db.Column(db.Date)
+        wage_amount = db.Column(db.Numeric(12, 2))
+        # Set when the user's own pay settings (allowances, weekend bonus, night or
+        # overtime rules) priced the shift; recompute_job_wages leaves it alone.
+        client_priced = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
         job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=True)
         user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+        __table_args__ = (
+            db.Index('ix_shift_user_work_date', 'user_id', 'work_date'),
+            db.Index('ix_shift_user_job', 'user_id', 'job_id'),
+            db.Index('ix_shift_user_updated_at', 'user_id', 'updated_at'),
+        )
+
+    class RecurringShift(db.Model):
+        # A weekly shift template. Occurrences are never stored; they are expanded
+        # for the date window a request asks for (see expand_weekly).
+        __tablename__ = 'recurring_shift'
+        id = db.Column(db.Integer, primary_key=True)
+        shift_type = db.Column(db.String(50))
+        start_time = db.Column(db.String(10))
+        end_time = db.Column(db.String(10))
+        break_start = db.Column(db.String(10))
+        break_end = db.Column(db.String(10))
+        total_hours = db.Column(db.String(10))
+        hourly_wage = db.Column(db.String(10))
+        currency = db.Column(db.String(10))
+        total_wage = db.Column(db.String(10))
+        wage_amount = db.Column(db.Numeric(12, 2))
+        interval_weeks = db.Column(db.Integer, nullable=False, default=1)
+        weekdays = db.Column(db.String(20), nullable=False)  # BYDAY codes, e.g. "MO,WE,FR"
+        start_date = db.Column(db.Date, nullable=False)
+        end_date = db.Column(db.Date)  # inclusive UNTIL; NULL repeats indefinitely
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+        job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        __table_args__ = (
+            db.Index('ix_recurring_shift_user', 'user_id'),
+        )
 
     class Expense(db.Model):
         id = db.Column(db.Integer, primary_key=True)
@@ -83,7 +1195,14 @@ def create_app():
         category = db.Column(db.String(100), nullable=False)
         amount = db.Column(db.Float, nullable=False, default=0.0)
         description = db.Column(db.String(255))
+        expense_date = db.Column(db.Date)  # typed copy of date
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
         user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        __table_args__ = (
+            db.Index('ix_expense_user_expense_date', 'user_id', 'expense_date'),
+            db.Index('ix_expense_user_date', 'user_id', 'date'),
+            db.Index('ix_expense_user_updated_at', 'user_id', 'updated_at'),
+        )
 
     class Budget(db.Model):
         id = db.Column(db.Integer, primary_key=True)
@@ -91,6 +1210,9 @@ def create_app():
         category = db.Column(db.String(100), nullable=False)
         amount = db.Column(db.Float, nullable=False, default=0.0)
         user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        __table_args__ = (
+            db.Index('uq_budget_user_month_category', 'user_id', 'month', 'category', unique=True),
+        )
 
     class Receipt(db.Model):
         id = db.Column(db.Integer, primary_key=True)
@@ -101,6 +1223,8 @@ def create_app():
         grand_total = db.Column(db.Float, default=0.0)
         note = db.Column(db.Text, default='', server_default='')
         created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        receipt_date = db.Column(db.Date)  # typed copy of date
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
         user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
         items = db.relationship('ReceiptItem', backref='receipt', lazy=True, cascade='all, delete-orphan')
         # legacy columns retained for backward compatibility
@@ -110,6 +1234,11 @@ def create_app():
         ocr_text = db.Column(db.Text, default='', server_default='')
         suggested_category = db.Column(db.String(100), default='', server_default='')
         suggested_amount = db.Column(db.Float, default=0.0, server_default='0')
+        __table_args__ = (
+            db.Index('ix_receipt_user_created_at', 'user_id', 'created_at'),
+            db.Index('ix_receipt_user_receipt_date', 'user_id', 'receipt_date'),
+            db.Index('ix_receipt_user_updated_at', 'user_id', 'updated_at'),
+        )
 
     class ReceiptItem(db.Model):
         id = db.Column(db.Integer, primary_key=True)
@@ -121,6 +1250,672 @@ def create_app():
         tax_rate = db.Column(db.Float, default=0.0)
         line_total = db.Column(db.Float, default=0.0)
         receipt_id = db.Column(db.Integer, db.ForeignKey('receipt.id'))
+        __table_args__ = (
+            db.Index('ix_receipt_item_receipt', 'receipt_id'),
+        )
+
+    class Tombstone(db.Model):
+        # Records deletions so /api/sync can tell clients which rows to drop.
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        entity = db.Column(db.String(20), nullable=False)  # shifts | jobs | expenses | receipts
+        entity_id = db.Column(db.Integer, nullable=False)
+        deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+        __table_args__ = (
+            db.Index('ix_tombstone_user_deleted_at', 'user_id', 'deleted_at'),
+        )
+
+    class DailyRollup(db.Model):
+        # Pre-summed income/expense/receipt totals per user, day and job or category.
+        __tablename__ = 'daily_rollup'
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+        day = db.Column(db.Date)  # NULL when the source date could not be parsed
+        kind = db.Column(db.String(10), nullable=False)  # income | expense | receipt
+        job_id = db.Column(db.Integer)
+        category = db.Column(db.String(100))
+        amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+        entries = db.Column(db.Integer, nullable=False, default=0)
+        __table_args__ = (
+            db.Index('ix_daily_rollup_lookup', 'user_id', 'kind', 'day'),
+        )
+
+    class UserSession(db.Model):
+        # Server-side session contents, keyed by the SHA-256 of the cookie token.
+        __tablename__ = 'user_session'
+        id = db.Column(db.String(64), primary_key=True)
+        user_id = db.Column(db.Integer)  # NULL for sessions without a login
+        data = db.Column(db.Text, nullable=False)
+        expires_at = db.Column(db.DateTime, nullable=False)
+        __table_args__ = (
+            db.Index('ix_user_session_user', 'user_id'),
+            db.Index('ix_user_session_expires_at', 'expires_at'),
+        )
+
+    session_store = None
+    if app.config['SESSION_BACKEND'] != 'cookie':
+        session_store = make_session_store(
+            app.config['SESSION_BACKEND'], db, UserSession.__table__,
+            os.getenv('SESSION_REDIS_URL') or os.getenv('REDIS_URL')
+        )
+        app.session_interface = ServerSessionInterface(
+            session_store, timedelta(seconds=app.config['SESSION_TTL']),
+            timedelta(seconds=app.config['SESSION_REFRESH'])
+        )
+
+    def apply_rollup(user_id, day, kind, amount, entries=1, job_id=None, category=None):
+        """Add (or with negative entries, remove) an amount from the matching rollup row.
+
+        Callers run this before their own commit so the rollup changes in the
+        same transaction as the source row.
+        """
+        amount = parse_money(amount) or Decimal('0')
+        if entries < 0:
+            amount = -amount
+        params = {'user_id': user_id, 'day': day, 'kind': kind, 'job_id': job_id,
+                  'category': category, 'amount': amount, 'entries': entries}
+        # The arithmetic happens in SQL against the unique rollup key, so two
+        # concurrent writers to the same row add up instead of overwriting.
+        db.session.execute(rollup_upsert if entries > 0 else rollup_decrement, params)
+        if entries <= 0:
+            db.session.execute(rollup_prune, params)
+
+    # NULL day/job/category are folded to sentinels so the unique index (and
+    # the ON CONFLICT target, which must repeat it verbatim) treats them as equal.
+    ROLLUP_KEY = "user_id, kind, COALESCE(day, '0001-01-01'), COALESCE(job_id, 0), COALESCE(category, '')"
+    ROLLUP_KEY_MATCH = (
+        "user_id = :user_id AND kind = :kind AND COALESCE(day, '0001-01-01') = COALESCE(:day, '0001-01-01') "
+        "AND COALESCE(job_id, 0) = COALESCE(:job_id, 0) AND COALESCE(category, '') = COALESCE(:category, '')"
+    )
+    def rollup_params():
+        return bindparam('day', type_=DailyRollup.day.type), bindparam('amount', type_=DailyRollup.amount.type)
+
+    rollup_upsert = text(
+        "INSERT INTO daily_rollup (user_id, day, kind, job_id, category, amount, entries) "
+        "VALUES (:user_id, :day, :kind, :job_id, :category, :amount, :entries) "
+        f"ON CONFLICT ({ROLLUP_KEY}) DO UPDATE SET "
+        "amount = daily_rollup.amount + excluded.amount, entries = daily_rollup.entries + excluded.entries"
+    ).bindparams(*rollup_params())
+    rollup_decrement = text(
+        f"UPDATE daily_rollup SET amount = amount + :amount, entries = entries + :entries WHERE {ROLLUP_KEY_MATCH}"
+    ).bindparams(*rollup_params())
+    rollup_prune = text(
+        f"DELETE FROM daily_rollup WHERE {ROLLUP_KEY_MATCH} AND entries <= 0"
+    ).bindparams(rollup_params()[0])
+
+    def receipt_item_rollup_key(receipt_date, item_date, category):
+        return parse_date(item_date) or parse_date(receipt_date), category or ''
+
+    def shift_rollup_select(*conditions):
+        return db.select(
+            Shift.user_id, Shift.work_date, db.literal('income'), Shift.job_id,
+            db.null(), func.sum(func.coalesce(Shift.wage_amount, 0)), func.count()
+        ).where(Shift.user_id.isnot(None), *conditions).group_by(Shift.user_id, Shift.work_date, Shift.job_id)
+
+    def rebuild_rollups(user_id=None, bump_versions=True):
+        """Recompute daily_rollup from the shift, expense and receipt tables.
+
+        Report and budget ETags and cache keys carry the data version, so the
+        affected users' versions are bumped in the same transaction.
+        """
+        rollup = DailyRollup.__table__
+        delete_stmt = rollup.delete()
+        if user_id is not None:
+            delete_stmt = delete_stmt.where(rollup.c.user_id == user_id)
+        db.session.execute(delete_stmt)
+
+        target_columns = ['user_id', 'day', 'kind', 'job_id', 'category', 'amount', 'entries']
+        shift_select = shift_rollup_select(*([Shift.user_id == user_id] if user_id is not None else []))
+        expense_select = db.select(
+            Expense.user_id, Expense.expense_date, db.literal('expense'), db.null(),
+            Expense.category, func.sum(func.coalesce(Expense.amount, 0)), func.count()
+        )
+        if user_id is not None:
+            expense_select = expense_select.where(Expense.user_id == user_id)
+        expense_select = expense_select.group_by(Expense.user_id, Expense.expense_date, Expense.category)
+        db.session.execute(rollup.insert().from_select(target_columns, shift_select))
+        db.session.execute(rollup.insert().from_select(target_columns, expense_select))
+
+        # Receipt item dates are free-form strings, so they are bucketed in Python.
+        receipt_totals = {}
+        # Plain columns rather than entities: this also runs as migration 3, before
+        # later migrations have added every mapped column.
+        receipt_query = db.session.query(
+            Receipt.user_id, Receipt.date, ReceiptItem.date, ReceiptItem.category, ReceiptItem.line_total
+        ).join(ReceiptItem, ReceiptItem.receipt_id == Receipt.id)
+        if user_id is not None:
+            receipt_query = receipt_query.filter(Receipt.user_id == user_id)
+        for owner_id, receipt_date, item_date, item_category, line_total in receipt_query:
+            day, category = receipt_item_rollup_key(receipt_date, item_date, item_category)
+            key = (owner_id, day, category)
+            amount, entries = receipt_totals.get(key, (Decimal('0'), 0))
+            receipt_totals[key] = (amount + (parse_money(line_total) or Decimal('0')), entries + 1)
+        if receipt_totals:
+            db.session.execute(rollup.insert(), [{
+                'user_id': owner_id, 'day': day, 'kind': 'receipt', 'job_id': None,
+                'category': category, 'amount': amount, 'entries': entries
+            } for (owner_id, day, category), (amount, entries) in receipt_totals.items()])
+        if bump_versions:
+            users = User.query if user_id is None else User.query.filter_by(id=user_id)
+            users.update({'data_version': User.data_version + 1}, synchronize_session=False)
+            if user_id is not None:
+                report_cache.delete_prefix(f'{user_id}:')
+        db.session.commit()
+
+    @payflow_cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the daily rollup table from the source tables."""
+        rebuild_rollups()
+        print('Daily rollups rebuilt.')
+
+    # --- Full-text search ---
+    # One document per expense, receipt (title, note and line items) and job, kept
+    # in an FTS5 table on SQLite or a tsvector/GIN table on Postgres. Write handlers
+    # update it in the same transaction as the rows it mirrors.
+    search_on_postgres = database_url.startswith('postgresql://')
+    search_key = 'doc_id' if search_on_postgres else 'rowid'
+    SEARCH_PAGE_SIZE = 20
+
+    def create_search_index():
+        if search_on_postgres:
+            statements = [
+                "CREATE TABLE IF NOT EXISTS search_index ("
+                "doc_id BIGINT PRIMARY KEY, user_id INTEGER NOT NULL, entity VARCHAR(20) NOT NULL, "
+                "entity_id INTEGER NOT NULL, day DATE, body TEXT NOT NULL, "
+                "tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED)",
+                "CREATE INDEX IF NOT EXISTS ix_search_index_tsv ON search_index USING GIN (tsv)",
+                "CREATE INDEX IF NOT EXISTS ix_search_index_user ON search_index (user_id)",
+            ]
+        else:
+            statements = [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                "body, user_id UNINDEXED, entity UNINDEXED, entity_id UNINDEXED, day UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ]
+        for statement in statements:
+            db.session.execute(text(statement))
+        db.session.commit()
+
+    def search_doc_id(entity, entity_id):
+        # Stable per row, so re-indexing replaces the document by primary key / rowid.
+        return entity_id * 4 + SEARCH_ENTITIES.index(entity) + 1
+
+    def expense_document(expense_id, user_id, day, category, description):
+        return 'expenses', expense_id, user_id, day, ' '.join(filter(None, [category, description]))
+
+    def receipt_document(receipt_id, user_id, day, title, note, items):
+        parts = [title, note]
+        for item in items:
+            parts += [item.get('description'), item.get('category')]
+        return 'receipts', receipt_id, user_id, day, ' '.join(filter(None, parts))
+
+    def job_document(job_id, user_id, name):
+        return 'jobs', job_id, user_id, None, name or ''
+
+    def index_documents(documents):
+        """Insert or replace (entity, entity_id, user_id, day, body) documents."""
+        if not documents:
+            return
+        params = [{
+            'doc_id': search_doc_id(entity, entity_id), 'user_id': user_id, 'entity': entity,
+            'entity_id': entity_id, 'day': day.isoformat() if day else None, 'body': body
+        } for entity, entity_id, user_id, day, body in documents]
+        db.session.execute(text(f'DELETE FROM search_index WHERE {search_key} = :doc_id'),
+                           [{'doc_id': row['doc_id']} for row in params])
+        db.session.execute(text(
+            f'INSERT INTO search_index ({search_key}, user_id, entity, entity_id, day, body) '
+            'VALUES (:doc_id, :user_id, :entity, :entity_id, :day, :body)'
+        ), params)
+
+    def unindex_documents(entity, entity_ids):
+        if entity_ids:
+            db.session.execute(text(f'DELETE FROM search_index WHERE {search_key} = :doc_id'),
+                               [{'doc_id': search_doc_id(entity, entity_id)} for entity_id in entity_ids])
+
+    def expense_documents_since(user_id, last_id):
+        rows = db.session.query(
+            Expense.id, Expense.user_id, Expense.expense_date, Expense.category, Expense.description
+        ).filter(Expense.user_id == user_id, Expense.id > last_id)
+        return [expense_document(*row) for row in rows]
+
+    def rebuild_search_index(user_id=None):
+        """Re-create every search document (for one user, or everyone)."""
+        if user_id is None:
+            db.session.execute(text('DELETE FROM search_index'))
+        else:
+            db.session.execute(text('DELETE FROM search_index WHERE user_id = :user_id'), {'user_id': user_id})
+
+        def scoped(query, model):
+            return query if user_id is None else query.filter(model.user_id == user_id)
+
+        expenses = scoped(db.session.query(
+            Expense.id, Expense.user_id, Expense.expense_date, Expense.category, Expense.description
+        ), Expense)
+        index_documents([expense_document(*row) for row in expenses])
+        items_by_receipt = {}
+        items = scoped(db.session.query(ReceiptItem.receipt_id, ReceiptItem.description, ReceiptItem.category).join(
+            Receipt, ReceiptItem.receipt_id == Receipt.id
+        ), Receipt)
+        for receipt_id, description, category in items:
+            items_by_receipt.setdefault(receipt_id, []).append({'description': description, 'category': category})
+        receipts = scoped(db.session.query(
+            Receipt.id, Receipt.user_id, Receipt.receipt_date, Receipt.title, Receipt.note
+        ), Receipt)
+        index_documents([receipt_document(*row, items_by_receipt.get(row.id, [])) for row in receipts])
+        jobs = scoped(db.session.query(Job.id, Job.user_id, Job.name), Job)
+        index_documents([job_document(*row) for row in jobs])
+        db.session.commit()
+
+    @payflow_cli.command('rebuild-search')
+    def rebuild_search_command():
+        """Re-create the full-text search index from the source tables."""
+        rebuild_search_index()
+        print('Search index rebuilt.')
+
+    def search_documents(user_id, terms, entity, start_date, end_date, limit, offset):
+        """One page of (entity, entity_id, day, snippet, score) hits, best first."""
+        params = {'user_id': user_id, 'limit': limit, 'offset': offset}
+        filters = ['user_id = :user_id']
+        if entity:
+            filters.append('entity = :entity')
+            params['entity'] = entity
+        if start_date:
+            filters.append('day >= :start')
+            params['start'] = start_date.isoformat()
+        if end_date:
+            filters.append('day <= :end')
+            params['end'] = end_date.isoformat()
+        if search_on_postgres:
+            params['query'] = ' & '.join(f'{term}:*' for term in terms)
+            sql = (
+                "SELECT hit.entity, hit.entity_id, hit.day, "
+                "ts_headline('simple', hit.body, to_tsquery('simple', :query), "
+                "'StartSel=[, StopSel=], MaxWords=12, MinWords=4') AS snippet, hit.score "
+                "FROM (SELECT entity, entity_id, day, body, doc_id, "
+                "ts_rank(tsv, to_tsquery('simple', :query)) AS score FROM search_index "
+                f"WHERE tsv @@ to_tsquery('simple', :query) AND {' AND '.join(filters)} "
+                "ORDER BY score DESC, doc_id LIMIT :limit OFFSET :offset) AS hit "
+                "ORDER BY hit.score DESC, hit.doc_id"
+            )
+        else:
+            params['query'] = ' '.join(f'"{term}"*' for term in terms)
+            sql = (
+                "SELECT entity, entity_id, day, snippet(search_index, 0, '[', ']', '…', 12) AS snippet, "
+                "-bm25(search_index) AS score FROM search_index "
+                f"WHERE search_index MATCH :query AND {' AND '.join(filters)} "
+                "ORDER BY bm25(search_index), rowid LIMIT :limit OFFSET :offset"
+            )
+        return db.session.execute(text(sql), params).all()
+
+    MAX_PAGE_SIZE = 500
+
+    def cursor_value(col, value):
+        """Convert one decoded cursor value to its sort column's type (TypeError/ValueError if it does not fit)."""
+        if isinstance(col.type, db.Integer):
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise TypeError(f'{col.key} cursor value must be an integer')
+            return value
+        if not isinstance(value, str):
+            raise TypeError(f'{col.key} cursor value must be a string')
+        if isinstance(col.type, db.DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(col.type, db.Date):
+            return date.fromisoformat(value)
+        return value
+
+    def windowed_query(query, date_col, sort_cols, descending=False):
+        """Apply the optional from/to/limit/cursor list parameters to a query.
+
+        Returns (query, limit, error). Without parameters the query is only
+        ordered, so callers keep returning the full history.
+        """
+        args = request.args
+        for name, op in (('from', date_col.__ge__), ('to', date_col.__le__)):
+            raw = (args.get(name) or '').strip()
+            if raw:
+                value = parse_date(raw)
+                if value is None:
+                    return None, None, f"Invalid '{name}' date"
+                query = query.filter(op(value))
+
+        limit = None
+        limit_raw = (args.get('limit') or '').strip()
+        if limit_raw:
+            try:
+                limit = int(limit_raw)
+            except ValueError:
+                return None, None, 'Invalid limit'
+            if limit < 1:
+                return None, None, 'Invalid limit'
+            limit = min(limit, MAX_PAGE_SIZE)
+
+        cursor_raw = (args.get('cursor') or '').strip()
+        if cursor_raw:
+            values = decode_cursor(cursor_raw)
+            if values is None or len(values) != len(sort_cols):
+                return None, None, 'Invalid cursor'
+            try:
+                values = [cursor_value(col, value) for col, value in zip(sort_cols, values)]
+            except (TypeError, ValueError):
+                return None, None, 'Invalid cursor'
+            # Keyset condition: rows strictly after the cursor in sort order.
+            conditions = []
+            for idx, (col, value) in enumerate(zip(sort_cols, values)):
+                prefix = [c == v for c, v in zip(sort_cols[:idx], values[:idx])]
+                conditions.append(and_(*prefix, col < value if descending else col > value))
+            query = query.filter(or_(*conditions))
+
+        query = query.order_by(*[col.desc() if descending else col.asc() for col in sort_cols])
+        if limit:
+            query = query.limit(limit + 1)
+        return query, limit, None
+
+    def paged_json(rows, limit, serialize_rows, cursor_values):
+        """jsonify one page; the cursor for the next page goes in X-Next-Cursor."""
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(cursor_values(rows[-1]))
+        response = jsonify(serialize_rows(rows))
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+
+    def bump_data_version(user_id):
+        User.query.filter_by(id=user_id).update(
+            {'data_version': User.data_version + 1}, synchronize_session=False
+        )
+        report_cache.delete_prefix(f'{user_id}:')
+
+    def current_data_version(user_id):
+        if 'data_version' not in g:
+            g.data_version = db.session.query(User.data_version).filter_by(id=user_id).scalar() or 0
+        return g.data_version
+
+    def cache_key(user_id, kind, *parts):
+        # The data version keeps other workers' in-process entries from going
+        # stale after a write; today's date rolls report periods over at midnight.
+        version = current_data_version(user_id)
+        return ':'.join([str(user_id), kind, str(version), date.today().isoformat()] + [str(p) for p in parts])
+
+    def conditional_get(view):
+        """Answer GETs with a 304 when If-None-Match matches the user's data version.
+
+        The ETag also carries today's date because report periods roll over daily.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or 'user_id' not in session:
+                return view(*args, **kwargs)
+            version = current_data_version(session['user_id'])
+            etag = f"{session['user_id']}-{version}-{date.today().isoformat()}"
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+
+    # --- Wage engine glue ---
+    def job_wage_rules(job):
+        return {name: getattr(job, name) for name in WAGE_RULE_FIELDS}
+
+    def price_shift(job, start_time, end_time, break_start, break_end, hourly_wage=None, total_wage=None,
+                    custom_pay=False):
+        """(total_hours, hourly_wage, total_wage) for a new shift or template.
+
+        Job shifts use the job's rate and rules, unless ``custom_pay`` says the
+        user's own pay settings (allowances, weekend bonus, night or overtime
+        rules the server does not model) priced the shift: then, as for shifts
+        without a job, the client's rate and total win. Returns None for
+        invalid times.
+        """
+        if job and not custom_pay:
+            rate, rules, client_total = job.hourly_wage, job_wage_rules(job), None
+        else:
+            default_rate = job.hourly_wage if job else 0
+            rate, rules, client_total = parse_money(hourly_wage) or default_rate, {}, parse_money(total_wage)
+        pay = compute_shift_pay(start_time, end_time, break_start, break_end, rate, **rules)
+        if pay is None:
+            return None
+        hours, wage = pay
+        return hours, f'{float(rate):g}', client_total if client_total is not None else wage
+
+    def recompute_job_wages(job):
+        """Re-price all of a job's shifts and templates after its pay rules changed.
+
+        Every shift is priced in one compute_pay_batch pass and written back with a
+        single executemany UPDATE; the job's income rollups are then re-summed.
+        """
+        rules = job_wage_rules(job)
+        rate = f'{float(job.hourly_wage):g}'
+        rows = db.session.query(
+            Shift.id, Shift.start_time, Shift.end_time, Shift.break_start, Shift.break_end
+        ).filter(Shift.user_id == job.user_id, Shift.job_id == job.id, Shift.client_priced.is_(False)).all()
+        priced = compute_pay_batch([row[1:] for row in rows], job.hourly_wage, **rules)
+        params = [
+            {'shift_id': row.id, 'new_hours': str(pay[0]), 'new_rate': rate,
+             'new_total': str(pay[1]), 'new_amount': pay[1]}
+            for row, pay in zip(rows, priced) if pay is not None
+        ]
+        if params:
+            shifts = Shift.__table__
+            db.session.execute(
+                shifts.update().where(shifts.c.id == bindparam('shift_id')).values(
+                    total_hours=bindparam('new_hours'), hourly_wage=bindparam('new_rate'),
+                    total_wage=bindparam('new_total'), wage_amount=bindparam('new_amount')
+                ),
+                params
+            )
+
+        templates = RecurringShift.query.filter_by(user_id=job.user_id, job_id=job.id).all()
+        priced = compute_pay_batch(
+            [(t.start_time, t.end_time, t.break_start, t.break_end) for t in templates], job.hourly_wage, **rules
+        )
+        for template, pay in zip(templates, priced):
+            if pay is not None:
+                template.total_hours, template.hourly_wage = str(pay[0]), rate
+                template.total_wage, template.wage_amount = str(pay[1]), pay[1]
+
+        DailyRollup.query.filter_by(user_id=job.user_id, kind='income', job_id=job.id).delete()
+        db.session.execute(DailyRollup.__table__.insert().from_select(
+            ['user_id', 'day', 'kind', 'job_id', 'category', 'amount', 'entries'],
+            shift_rollup_select(Shift.user_id == job.user_id, Shift.job_id == job.id)
+        ))
+        return len(params)
+
+    # --- Row queries and serializers shared by the list, detail and sync endpoints ---
+    shift_columns = [getattr(Shift, name) for name in SHIFT_FIELDS[:-2]] + [Job.name, Job.color]
+    job_columns = [getattr(Job, name) for name in JOB_FIELDS]
+    expense_columns = [getattr(Expense, name) for name in EXPENSE_FIELDS]
+    receipt_columns = [getattr(Receipt, name) for name in RECEIPT_FIELDS]
+    receipt_item_columns = [getattr(ReceiptItem, name) for name in RECEIPT_ITEM_FIELDS] + [ReceiptItem.receipt_id]
+    recurring_columns = [getattr(RecurringShift, name) for name in RECURRING_SHIFT_FIELDS[:-2]] + [
+        Job.name.label('job_name'), Job.color.label('job_color'), RecurringShift.wage_amount
+    ]
+
+    def shift_rows(user_id):
+        return db.session.query(*shift_columns).outerjoin(Job, Shift.job_id == Job.id).filter(Shift.user_id == user_id)
+
+    def job_rows(user_id):
+        return db.session.query(*job_columns).filter(Job.user_id == user_id)
+
+    def expense_rows(user_id):
+        return db.session.query(*expense_columns).filter(Expense.user_id == user_id)
+
+    def receipt_rows(user_id):
+        return db.session.query(*receipt_columns).filter(Receipt.user_id == user_id)
+
+    def recurring_rows(user_id):
+        return db.session.query(*recurring_columns).outerjoin(Job, RecurringShift.job_id == Job.id).filter(
+            RecurringShift.user_id == user_id
+        )
+
+    def shifts_to_dicts(rows):
+        return [dict(zip(SHIFT_FIELDS, row)) for row in rows]
+
+    def jobs_to_dicts(rows):
+        jobs = [dict(zip(JOB_FIELDS, row)) for row in rows]
+        for job in jobs:
+            job['color'] = job['color'] or '#4f46e5'
+        return jobs
+
+    def expenses_to_dicts(rows):
+        return [dict(zip(EXPENSE_FIELDS, row)) for row in rows]
+
+    def receipts_to_dicts(rows):
+        receipts = []
+        by_id = {}
+        for row in rows:
+            receipt = dict(zip(RECEIPT_FIELDS, row))
+            receipt['note'] = receipt['note'] or ''
+            receipt['created_at'] = receipt['created_at'].isoformat()
+            receipt['items'] = []
+            receipts.append(receipt)
+            by_id[receipt['id']] = receipt
+        # Items for the whole page are fetched in a few IN (...) batches.
+        receipt_ids = list(by_id)
+        for offset in range(0, len(receipt_ids), RECEIPT_ITEM_BATCH):
+            items = db.session.query(*receipt_item_columns).filter(
+                ReceiptItem.receipt_id.in_(receipt_ids[offset:offset + RECEIPT_ITEM_BATCH])
+            ).order_by(ReceiptItem.id)
+            for item in items:
+                by_id[item[-1]]['items'].append(dict(zip(RECEIPT_ITEM_FIELDS, item)))
+        return receipts
+
+    def recurring_to_dicts(rows):
+        templates = []
+        for row in rows:
+            template = dict(zip(RECURRING_SHIFT_FIELDS, row))
+            template['weekdays'] = template['weekdays'].split(',')
+            template['rrule'] = format_weekly_rule(
+                row.interval_weeks, [WEEKDAY_CODES.index(code) for code in template['weekdays']], row.end_date
+            )
+            template['start_date'] = row.start_date.isoformat()
+            template['end_date'] = row.end_date.isoformat() if row.end_date else None
+            templates.append(template)
+        return templates
+
+    # Recurring shifts without an end date are only expanded this far past today.
+    RECURRING_HORIZON = timedelta(days=366)
+
+    def recurring_occurrences(templates, window_start, window_end):
+        """Date-ordered (day, job_id, template) occurrences of all templates in the window."""
+        def occurrences(template):
+            weekdays = [WEEKDAY_CODES.index(code) for code in template.weekdays.split(',')]
+            for day in expand_weekly(template.start_date, template.interval_weeks, weekdays,
+                                     template.end_date, window_start, window_end):
+                yield day, template.job_id, template
+        return heapq.merge(*[occurrences(template) for template in templates], key=lambda entry: entry[0])
+
+    def occurrence_to_dict(day, template):
+        shift = dict(zip(SHIFT_FIELDS, (
+            None, day.isoformat(), template.shift_type, template.start_time, template.end_time,
+            template.break_start, template.break_end, template.total_hours, template.hourly_wage,
+            template.currency, template.total_wage, template.job_id, template.job_name, template.job_color
+        )))
+        shift['recurring_id'] = template.id
+        return shift
+
+    # --- Passwords ---
+    password_pool = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                       thread_name_prefix='password-hash')
+    password_slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE'])
+
+    def run_password_hash(fn, *args, **kwargs):
+        """Run ``fn`` on the hashing pool and wait for it; PasswordHashBusy when the queue is full."""
+        if not password_slots.acquire(blocking=False):
+            raise PasswordHashBusy()
+        try:
+            future = password_pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            password_slots.release()
+            raise
+        future.add_done_callback(lambda _: password_slots.release())
+        return future.result()
+
+    @app.errorhandler(PasswordHashBusy)
+    def password_hash_busy(exc):
+        message = 'Too many sign-in attempts right now; try again shortly'
+        headers = {'Retry-After': '1'}
+        if request.endpoint in ('login', 'signup'):
+            # The HTML forms show it the way they show their other errors.
+            return render_template(f'{request.endpoint}.html', error=message), 503, headers
+        return jsonify({'error': message}), 503, headers
+
+    def hash_password(password):
+        return run_password_hash(
+            generate_password_hash, password,
+            method=app.config['PASSWORD_HASH_METHOD'], salt_length=app.config['PASSWORD_SALT_LENGTH']
+        )
+
+    # Hashing a throwaway password validates the configured method at boot and
+    # yields both the method prefix ("scrypt:32768:8:1") and the hash that
+    # unknown usernames are checked against.
+    dummy_password_hash = generate_password_hash(
+        os.urandom(16).hex(), method=app.config['PASSWORD_HASH_METHOD'],
+        salt_length=app.config['PASSWORD_SALT_LENGTH']
+    )
+    password_policy = dummy_password_hash.split('$', 1)[0]
+
+    def password_hash_outdated(stored):
+        method, _, rest = stored.partition('$')
+        salt = rest.partition('$')[0]
+        return method != password_policy or len(salt) != app.config['PASSWORD_SALT_LENGTH']
+
+    def verify_password(user, password):
+        """Check a password for ``user`` (which may be None) at the same cost either way.
+
+        ``user`` is a User or a CachedUser; for the latter the hash is read from
+        the database. A correct password stored under an older policy is
+        re-hashed; the caller's commit persists it.
+        """
+        if isinstance(user, CachedUser):
+            stored = db.session.query(User.password).filter(User.id == user.id).scalar()
+        else:
+            stored = user.password if user else None
+        valid = run_password_hash(check_password_hash, stored or dummy_password_hash, password)
+        if not (valid and stored):
+            return False
+        if password_hash_outdated(stored):
+            User.query.filter_by(id=user.id).update(
+                {'password': hash_password(password)}, synchronize_session=False
+            )
+            forget_user(user.id)
+        return True
+
+    # --- Sessions and user cache ---
+    user_cache = LRUCache(max_entries=app.config['USER_CACHE_MAX_ENTRIES'], ttl=app.config['USER_CACHE_TTL'])
+
+    def cached_user(user_id):
+        """The user's CachedUser record, served from this process for up to USER_CACHE_TTL."""
+        key = f'{user_id}:'
+        user = user_cache.get(key)
+        if user is None:
+            row = db.session.query(User.id, User.username, User.email).filter(
+                User.id == user_id
+            ).first()
+            if row is None:
+                return None
+            user = CachedUser(*row)
+            user_cache.set(key, user)
+        return user
+
+    def forget_user(user_id):
+        user_cache.delete_prefix(f'{user_id}:')
+
+    def revoke_sessions(user_id, keep_current=True):
+        """Log the user out everywhere (except, by default, this request's session)."""
+        if session_store is None:
+            return 0
+        keep = None
+        if keep_current and session.get('user_id') == user_id and session.token:
+            keep = ServerSessionInterface.session_id(session.token)
+        return session_store.delete_user(user_id, keep)
 
     # --- Routes ---
 
@@ -137,7 +1932,8 @@ def create_app():
             username = request.form['username'].strip()
             password = request.form['password']
             user = User.query.filter_by(username=username).first()
-            if user and check_password_hash(user.password, password):
+            if verify_password(user, password):
+                db.session.commit()  # keeps a policy upgrade made by verify_password
                 session['user_id'] = user.id
                 session['username'] = user.username
                 session['email'] = user.email
@@ -157,7 +1953,7 @@ def create_app():
                 return render_template('signup.html', error="Username already exists")
             if email and User.query.filter_by(email=email).first():
                 return render_template('signup.html', error="Email already exists")
-            new_user = User(username=username, email=email, password=generate_password_hash(password))
+            new_user = User(username=username, email=email, password=hash_password(password))
             db.session.add(new_user)
             db.session.commit()
             return redirect(url_for('login'))
@@ -174,16 +1970,23 @@ def create_app():
     def profile():
         if 'user_id' not in session:
             return redirect(url_for('login'))
-        user = User.query.get(session['user_id'])
-        return render_template('profile.html', user=user)
+        user = cached_user(session['user_id'])
+        if not user:
+            return redirect(url_for('logout'))
+        shifts = Shift.query.options(db.joinedload(Shift.job)).filter_by(user_id=user.id).all()
+        return render_template('profile.html', user=user, shifts=shifts)
 
     @app.route('/api/shifts', methods=['GET', 'POST'])
+    @conditional_get
     def api_shifts():
         if 'user_id' not in session:
             return jsonify({'error': 'Not logged in'}), 401
 
         if request.method == 'POST':
             data = request.get_json() or {}
+            invalid = non_string_field(data, SHIFT_TIME_FIELDS + ('date', 'shift_type', 'currency'))
+            if invalid:
+                return jsonify({'error': f'Invalid {invalid}'}), 400
             job_id = data.get('job_id')
             job = None
             if job_id is not None:
@@ -195,6 +1998,18 @@ def create_app():
                 if not job:
                     return jsonify({'error': 'Invalid job assignment'}), 400
 
+            total_hours = data.get('total_hours', '')
+            hourly_wage = data.get('hourly_wage', '')
+            total_wage = data.get('total_wage', '')
+            custom_pay = bool(job and data.get('custom_pay'))
+            if job and not custom_pay:
+                # Shifts tied to a job are priced from the job's rules, so a wage
+                # change can re-price them later (see recompute_job_wages).
+                pay = price_shift(job, data.get('start_time'), data.get('end_time'),
+                                  data.get('break_start'), data.get('break_end'))
+                if pay is not None:
+                    total_hours, hourly_wage, total_wage = (str(value) for value in pay)
+
             new_shift = Shift(
                 date=data.get('date', ''),
                 shift_type=data.get('shift_type', ''),
@@ -202,34 +2017,50 @@ def create_app():
                 end_time=data.get('end_time', ''),
                 break_start=data.get('break_start', ''),
                 break_end=data.get('break_end', ''),
-                total_hours=data.get('total_hours', ''),
-                hourly_wage=data.get('hourly_wage', ''),
+                total_hours=total_hours,
+                hourly_wage=hourly_wage,
                 currency=data.get('currency', ''),
-                total_wage=data.get('total_wage', ''),
+                total_wage=total_wage,
+                work_date=parse_date(data.get('date')),
+                wage_amount=parse_money(total_wage),
+                client_priced=custom_pay,
                 job_id=job.id if job else None,
                 user_id=session['user_id']
             )
             db.session.add(new_shift)
+            apply_rollup(new_shift.user_id, new_shift.work_date, 'income', new_shift.wage_amount,
+                         job_id=new_shift.job_id)
+            bump_data_version(session['user_id'])
             db.session.commit()
             return jsonify({'success': True, 'id': new_shift.id})
+        elif request.args.get('expand') == 'recurring':
+            # Concrete shifts plus recurring occurrences for a bounded window, by date.
+            window_start = parse_date(request.args.get('from'))
+            window_end = parse_date(request.args.get('to'))
+            if not window_start or not window_end or window_end < window_start:
+                return jsonify({'error': "expand=recurring needs valid 'from' and 'to' dates"}), 400
+            if window_end - window_start > RECURRING_HORIZON:
+                return jsonify({'error': 'Date window too large'}), 400
+            concrete = shift_rows(session['user_id']).add_columns(Shift.work_date).filter(
+                Shift.work_date.between(window_start, window_end)
+            ).order_by(Shift.work_date, Shift.id)
+            virtual = recurring_occurrences(recurring_rows(session['user_id']).all(), window_start, window_end)
+            shifts = []
+            for day, row, template in merge_shift_streams(
+                ((row.work_date, row.job_id, row) for row in concrete), virtual
+            ):
+                if template is None:
+                    shift = dict(zip(SHIFT_FIELDS, row))
+                    shift['recurring_id'] = None
+                else:
+                    shift = occurrence_to_dict(day, template)
+                shifts.append(shift)
+            return jsonify(shifts)
         else:
-            shifts = Shift.query.filter_by(user_id=session['user_id']).all()
-            return jsonify([{
-                'id': s.id,
-                'date': s.date,
-                'shift_type': s.shift_type,
-                'start_time': s.start_time,
-                'end_time': s.end_time,
-                'break_start': s.break_start,
-                'break_end': s.break_end,
-                'total_hours': s.total_hours,
-                'hourly_wage': s.hourly_wage,
-                'currency': s.currency,
-                'total_wage': s.total_wage,
-                'job_id': s.job_id,
-                'job_name': s.job.name if s.job else None,
-                'job_color': s.job.color if s.job else None
-            } for s in shifts])
+            shift_query, limit, error = windowed_query(shift_rows(session['user_id']), Shift.work_date, [Shift.id])
+            if error:
+                return jsonify({'error': error}), 400
+            return paged_json(shift_query.all(), limit, shifts_to_dicts, lambda s: [s.id])
 
     @app.route('/api/shifts/<int:shift_id>', methods=['DELETE'])
     def delete_shift(shift_id):
@@ -238,17 +2069,108 @@ def create_app():
         shift = Shift.query.filter_by(id=shift_id, user_id=session['user_id']).first()
         if not shift:
             return jsonify({'error': 'Shift not found'}), 404
+        apply_rollup(shift.user_id, shift.work_date, 'income', shift.wage_amount,
+                     entries=-1, job_id=shift.job_id)
+        db.session.add(Tombstone(user_id=shift.user_id, entity='shifts', entity_id=shift.id))
         db.session.delete(shift)
+        bump_data_version(session['user_id'])
+        db.session.commit()
+        return jsonify({'success': True})
+
+    @app.route('/api/recurring-shifts', methods=['GET', 'POST'])
+    @conditional_get
+    def api_recurring_shifts():
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            invalid = non_string_field(data, SHIFT_TIME_FIELDS + ('rrule', 'shift_type', 'currency'))
+            if invalid:
+                return jsonify({'error': f'Invalid {invalid}'}), 400
+            job = None
+            if data.get('job_id') is not None:
+                try:
+                    job_id = int(data.get('job_id'))
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'Invalid job id'}), 400
+                job = Job.query.filter_by(id=job_id, user_id=session['user_id']).first()
+                if not job:
+                    return jsonify({'error': 'Invalid job assignment'}), 400
+
+            if data.get('rrule'):
+                rule = parse_weekly_rule(data['rrule'])
+            else:
+                weekdays = data.get('weekdays') or []
+                if isinstance(weekdays, str):
+                    weekdays = weekdays.split(',')
+                rule = parse_weekly_rule(
+                    f"FREQ=WEEKLY;INTERVAL={data.get('interval_weeks') or 1};BYDAY={','.join(map(str, weekdays))}"
+                )
+                if rule and data.get('end_date'):
+                    rule['until'] = parse_date(data.get('end_date'))
+            if rule is None:
+                return jsonify({'error': 'Invalid recurrence rule'}), 400
+            start_date = parse_date(data.get('start_date'))
+            if start_date is None:
+                return jsonify({'error': 'Valid start_date required'}), 400
+
+            start_time = data.get('start_time', '')
+            end_time = data.get('end_time', '')
+            pay = price_shift(job, start_time, end_time, data.get('break_start'), data.get('break_end'),
+                              data.get('hourly_wage'), data.get('total_wage'))
+            if pay is None:
+                return jsonify({'error': 'Valid start_time and end_time required'}), 400
+            total_hours, hourly_wage, total_wage = pay
+
+            template = RecurringShift(
+                shift_type=data.get('shift_type', ''),
+                start_time=start_time,
+                end_time=end_time,
+                break_start=data.get('break_start', ''),
+                break_end=data.get('break_end', ''),
+                total_hours=str(total_hours),
+                hourly_wage=hourly_wage,
+                currency=data.get('currency') or (job.currency if job else ''),
+                total_wage=str(total_wage),
+                wage_amount=total_wage,
+                interval_weeks=rule['interval_weeks'],
+                weekdays=','.join(WEEKDAY_CODES[day] for day in rule['weekdays']),
+                start_date=start_date,
+                end_date=rule['until'],
+                job_id=job.id if job else None,
+                user_id=session['user_id']
+            )
+            db.session.add(template)
+            bump_data_version(session['user_id'])
+            db.session.commit()
+            return jsonify({'success': True, 'id': template.id}), 201
+
+        return jsonify(recurring_to_dicts(recurring_rows(session['user_id']).order_by(RecurringShift.id)))
+
+    @app.route('/api/recurring-shifts/<int:template_id>', methods=['DELETE'])
+    def delete_recurring_shift(template_id):
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        template = RecurringShift.query.filter_by(id=template_id, user_id=session['user_id']).first()
+        if not template:
+            return jsonify({'error': 'Recurring shift not found'}), 404
+        db.session.delete(template)
+        bump_data_version(session['user_id'])
         db.session.commit()
         return jsonify({'success': True})
 
     @app.route('/api/jobs', methods=['GET', 'POST'])
+    @conditional_get
     def api_jobs():
         if 'user_id' not in session:
             return jsonify({'error': 'Not logged in'}), 401
 
         if request.method == 'POST':
             data = request.get_json() or {}
+            invalid = non_string_field(data, ('name', 'currency', 'color'))
+            if invalid:
+                return jsonify({'error': f'Invalid {invalid}'}), 400
             name = (data.get('name') or '').strip()
             try:
                 hourly_wage = float(data.get('hourly_wage', 0))
@@ -259,15 +2181,22 @@ def create_app():
 
             if not name:
                 return jsonify({'error': 'Job name required'}), 400
+            rules, error = parse_wage_rules(data)
+            if error:
+                return jsonify({'error': error}), 400
 
             new_job = Job(
                 name=name,
                 hourly_wage=hourly_wage,
                 currency=currency,
                 color=color,
-                user_id=session['user_id']
+                user_id=session['user_id'],
+                **rules
             )
             db.session.add(new_job)
+            db.session.flush()
+            index_documents([job_document(new_job.id, new_job.user_id, new_job.name)])
+            bump_data_version(session['user_id'])
             db.session.commit()
             return jsonify({
                 'success': True,
@@ -280,14 +2209,55 @@ def create_app():
                 }
             }), 201
 
-        jobs = Job.query.filter_by(user_id=session['user_id']).order_by(Job.name.asc()).all()
-        return jsonify([{
-            'id': j.id,
-            'name': j.name,
-            'hourly_wage': j.hourly_wage,
-            'currency': j.currency,
-            'color': j.color or '#4f46e5'
-        } for j in jobs])
+        return jsonify(jobs_to_dicts(job_rows(session['user_id']).order_by(Job.name.asc())))
+
+    @app.route('/api/jobs/<int:job_id>', methods=['PUT', 'PATCH'])
+    def update_job(job_id):
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        job = Job.query.filter_by(id=job_id, user_id=session['user_id']).first()
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        data = request.get_json() or {}
+        invalid = non_string_field(data, ('name', 'currency', 'color'))
+        if invalid:
+            return jsonify({'error': f'Invalid {invalid}'}), 400
+        rules, error = parse_wage_rules(data)
+        if error:
+            return jsonify({'error': error}), 400
+        if 'hourly_wage' in data:
+            try:
+                rules['hourly_wage'] = float(data.get('hourly_wage') or 0)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Invalid hourly wage'}), 400
+        if 'name' in data:
+            name = (data.get('name') or '').strip()
+            if not name:
+                return jsonify({'error': 'Job name required'}), 400
+            shown_changed = name != job.name
+            job.name = name
+            index_documents([job_document(job.id, job.user_id, name)])
+        else:
+            shown_changed = False
+        for field in ('currency', 'color'):
+            if (data.get(field) or '').strip():
+                shown_changed = shown_changed or (field == 'color' and data[field].strip() != job.color)
+                setattr(job, field, data[field].strip())
+        if shown_changed:
+            # Shift payloads carry job_name/job_color, so /api/sync must resend them.
+            Shift.query.filter_by(user_id=job.user_id, job_id=job.id).update(
+                {'updated_at': datetime.utcnow()}, synchronize_session=False
+            )
+
+        repriced = 0
+        if any(getattr(job, field) != value for field, value in rules.items()):
+            for field, value in rules.items():
+                setattr(job, field, value)
+            repriced = recompute_job_wages(job)
+        bump_data_version(session['user_id'])
+        db.session.commit()
+        job_dict = jobs_to_dicts(job_rows(session['user_id']).filter(Job.id == job.id))[0]
+        return jsonify({'success': True, 'job': job_dict, 'repriced_shifts': repriced})
 
     @app.route('/api/jobs/<int:job_id>', methods=['DELETE'])
     def delete_job(job_id):
@@ -298,11 +2268,20 @@ def create_app():
             return jsonify({'error': 'Job not found'}), 404
 
         Shift.query.filter_by(job_id=job.id, user_id=session['user_id']).update({'job_id': None})
+        RecurringShift.query.filter_by(job_id=job.id, user_id=session['user_id']).update({'job_id': None})
+        job_rollups = DailyRollup.query.filter_by(user_id=session['user_id'], kind='income', job_id=job.id).all()
+        for row in job_rollups:
+            db.session.delete(row)
+            apply_rollup(row.user_id, row.day, 'income', row.amount, entries=row.entries)
+        db.session.add(Tombstone(user_id=job.user_id, entity='jobs', entity_id=job.id))
+        unindex_documents('jobs', [job.id])
         db.session.delete(job)
+        bump_data_version(session['user_id'])
         db.session.commit()
         return jsonify({'success': True})
 
     @app.route('/api/expenses', methods=['GET', 'POST'])
+    @conditional_get
     def api_expenses():
         if 'user_id' not in session:
             return jsonify({'error': 'Not logged in'}), 401
@@ -325,20 +2304,26 @@ def create_app():
                 category=category,
                 amount=amount,
                 description=description,
+                expense_date=parse_date(date),
                 user_id=session['user_id']
             )
             db.session.add(expense)
+            apply_rollup(expense.user_id, expense.expense_date, 'expense', expense.amount,
+                         category=expense.category)
+            db.session.flush()
+            index_documents([expense_document(expense.id, expense.user_id, expense.expense_date,
+                                              expense.category, expense.description)])
+            bump_data_version(session['user_id'])
             db.session.commit()
             return jsonify({'success': True, 'id': expense.id}), 201
 
-        expenses = Expense.query.filter_by(user_id=session['user_id']).order_by(Expense.date.desc()).all()
-        return jsonify([{
-            'id': e.id,
-            'date': e.date,
-            'category': e.category,
-            'amount': e.amount,
-            'description': e.description
-        } for e in expenses])
+        expense_query, limit, error = windowed_query(
+            expense_rows(session['user_id']), Expense.expense_date,
+            [Expense.date, Expense.id], descending=True
+        )
+        if error:
+            return jsonify({'error': error}), 400
+        return paged_json(expense_query.all(), limit, expenses_to_dicts, lambda e: [e.date, e.id])
 
     @app.route('/api/expenses/<int:expense_id>', methods=['DELETE'])
     def delete_expense(expense_id):
@@ -347,7 +2332,12 @@ def create_app():
         expense = Expense.query.filter_by(id=expense_id, user_id=session['user_id']).first()
         if not expense:
             return jsonify({'error': 'Expense not found'}), 404
+        apply_rollup(expense.user_id, expense.expense_date, 'expense', expense.amount,
+                     entries=-1, category=expense.category)
+        db.session.add(Tombstone(user_id=expense.user_id, entity='expenses', entity_id=expense.id))
+        unindex_documents('expenses', [expense.id])
         db.session.delete(expense)
+        bump_data_version(session['user_id'])
         db.session.commit()
         return jsonify({'success': True})
 
@@ -363,19 +2353,20 @@ def create_app():
         data = request.get_json() or {}
         new_email = (data.get('new_email') or '').strip()
         current_password = data.get('current_password') or ''
-        user = User.query.get(session['user_id'])
+        user = cached_user(session['user_id'])
         if not user:
             return jsonify({'error': 'User not found'}), 404
-        if not check_password_hash(user.password, current_password):
+        if not verify_password(user, current_password):
             return jsonify({'error': 'Current password is incorrect'}), 400
         if not _validate_email_format(new_email):
             return jsonify({'error': 'Invalid email format'}), 400
         email_exists = User.query.filter(User.email == new_email, User.id != user.id).first()
         if email_exists:
             return jsonify({'error': 'Email already in use'}), 400
-        user.email = new_email
+        User.query.filter_by(id=user.id).update({'email': new_email}, synchronize_session=False)
         db.session.commit()
-        session['email'] = user.email
+        forget_user(user.id)
+        session['email'] = new_email
         return jsonify({'success': True})
 
     @app.route('/account/change_password', methods=['POST'])
@@ -386,20 +2377,29 @@ def create_app():
         current_password = data.get('current_password') or ''
         new_password = data.get('new_password') or ''
         confirm_password = data.get('confirm_password') or ''
-        user = User.query.get(session['user_id'])
+        user = cached_user(session['user_id'])
         if not user:
             return jsonify({'error': 'User not found'}), 404
-        if not check_password_hash(user.password, current_password):
+        if not verify_password(user, current_password):
             return jsonify({'error': 'Current password is incorrect'}), 400
         if len(new_password) < 8:
             return jsonify({'error': 'Password must be at least 8 characters'}), 400
         if new_password != confirm_password:
             return jsonify({'error': 'Passwords do not match'}), 400
-        user.password = generate_password_hash(new_password)
+        User.query.filter_by(id=user.id).update({'password': hash_password(new_password)},
+                                                synchronize_session=False)
         db.session.commit()
+        forget_user(user.id)
+        revoke_sessions(user.id)
         return jsonify({'success': True})
 
+    budget_upsert = text(
+        "INSERT INTO budget (user_id, month, category, amount) VALUES (:user_id, :month, :category, :amount) "
+        "ON CONFLICT (user_id, month, category) DO UPDATE SET amount = excluded.amount"
+    )
+
     @app.route('/api/budgets', methods=['GET', 'POST'])
+    @conditional_get
     def api_budgets():
         if 'user_id' not in session:
             return jsonify({'error': 'Not logged in'}), 401
@@ -420,24 +2420,18 @@ def create_app():
             if amount < 0:
                 return jsonify({'error': 'Amount must be non-negative'}), 400
 
-            existing = Budget.query.filter_by(
+            # Upsert against the unique (user_id, month, category) index so two
+            # concurrent saves of the same budget cannot both insert.
+            db.session.execute(budget_upsert, {
+                'user_id': session['user_id'], 'month': month, 'category': category, 'amount': amount
+            })
+            bump_data_version(session['user_id'])
+            db.session.commit()
+            budget = Budget.query.filter_by(
                 user_id=session['user_id'],
                 month=month,
                 category=category
-            ).first()
-            if existing:
-                existing.amount = amount
-                db.session.commit()
-                budget = existing
-            else:
-                budget = Budget(
-                    month=month,
-                    category=category,
-                    amount=amount,
-                    user_id=session['user_id']
-                )
-                db.session.add(budget)
-                db.session.commit()
+            ).one()
 
             return jsonify({
                 'id': budget.id,
@@ -449,13 +2443,92 @@ def create_app():
         month = (request.args.get('month') or '').strip()
         if not month:
             month = datetime.utcnow().strftime('%Y-%m')
+        key = cache_key(session['user_id'], 'budgets', month)
+        cached = report_cache.get(key)
+        if cached is not None:
+            return jsonify(cached)
         budgets = Budget.query.filter_by(user_id=session['user_id'], month=month).all()
-        return jsonify([{
+        spent = {}
+        month_start = parse_date(f'{month}-01')
+        if month_start and budgets:
+            next_month = (month_start + timedelta(days=32)).replace(day=1)
+            spent_rows = db.session.query(DailyRollup.category, func.sum(DailyRollup.amount)).filter(
+                DailyRollup.user_id == session['user_id'],
+                DailyRollup.kind == 'expense',
+                DailyRollup.day >= month_start,
+                DailyRollup.day < next_month
+            ).group_by(DailyRollup.category).all()
+            spent = {category: float(total or 0) for category, total in spent_rows}
+        payload = [{
             'id': b.id,
             'month': b.month,
             'category': b.category,
-            'amount': b.amount
-        } for b in budgets])
+            'amount': b.amount,
+            'spent': spent.get(b.category, 0.0)
+        } for b in budgets]
+        report_cache.set(key, payload)
+        return jsonify(payload)
+
+    @app.route('/api/budgets/status')
+    @conditional_get
+    def api_budget_status():
+        """Budget vs. actual spending per category for one month."""
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        month = (request.args.get('month') or '').strip() or datetime.utcnow().strftime('%Y-%m')
+        month_start = parse_month(month)
+        if month_start is None:
+            return jsonify({'error': 'month must be YYYY-MM'}), 400
+        key = cache_key(session['user_id'], 'budget-status', month)
+        cached = report_cache.get(key)
+        if cached is not None:
+            return jsonify(cached)
+
+        # Budgets and the month's expense rollups are stacked with UNION ALL and
+        # summed per category, so budgeted and unbudgeted categories come back
+        # from one grouped query on the (user_id, kind, day) index.
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        budgeted = db.select(
+            Budget.category.label('category'), Budget.amount.label('budget'), db.literal(0).label('spent')
+        ).where(Budget.user_id == session['user_id'], Budget.month == month)
+        spending = db.select(
+            DailyRollup.category, db.literal(0), DailyRollup.amount
+        ).where(
+            DailyRollup.user_id == session['user_id'],
+            DailyRollup.kind == 'expense',
+            DailyRollup.day >= month_start,
+            DailyRollup.day < next_month
+        )
+        combined = budgeted.union_all(spending).subquery()
+        rows = db.session.execute(
+            db.select(combined.c.category, func.sum(combined.c.budget), func.sum(combined.c.spent))
+            .group_by(combined.c.category).order_by(combined.c.category)
+        ).all()
+
+        categories = []
+        for category, budget, spent in rows:
+            budget, spent = float(budget or 0), float(spent or 0)
+            categories.append({
+                'category': category,
+                'budget': budget,
+                'spent': spent,
+                'remaining': budget - spent,
+                'percent_used': round(spent / budget * 100, 1) if budget else None,
+            })
+        total_budget = sum(item['budget'] for item in categories)
+        total_spent = sum(item['spent'] for item in categories)
+        payload = {
+            'month': month,
+            'categories': categories,
+            'totals': {
+                'budget': total_budget,
+                'spent': total_spent,
+                'remaining': total_budget - total_spent,
+                'percent_used': round(total_spent / total_budget * 100, 1) if total_budget else None,
+            },
+        }
+        report_cache.set(key, payload)
+        return jsonify(payload)
 
     @app.route('/api/budgets/<int:budget_id>', methods=['DELETE'])
     def delete_budget(budget_id):
@@ -465,139 +2538,229 @@ def create_app():
         if not budget:
             return jsonify({'error': 'Budget not found'}), 404
         db.session.delete(budget)
+        bump_data_version(session['user_id'])
         db.session.commit()
         return jsonify({'success': True})
 
+    def parse_decimal(value, default=0.0):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return default
+
+    def parse_int(value, default=0):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    def build_receipt(data, user_id):
+        """Validate a receipt payload and compute line, subtotal, tax and grand totals.
+
+        Returns (receipt_values, item_values, error).
+        """
+        if not isinstance(data, dict):
+            return None, None, 'Receipt must be an object'
+        title = (data.get('title') or '').strip()
+        receipt_date = (data.get('date') or '').strip()
+        note = (data.get('note') or '').strip()
+        items_data = data.get('items') or []
+
+        if not items_data:
+            return None, None, 'At least one line item is required'
+
+        subtotal = 0.0
+        tax_total = 0.0
+        receipt_items = []
+        for raw_item in items_data:
+            if not isinstance(raw_item, dict):
+                return None, None, 'Invalid line item'
+            quantity = parse_int(raw_item.get('quantity'), 1)
+            quantity = max(quantity, 0)
+            unit_price = parse_decimal(raw_item.get('unit_price'), 0.0)
+            tax_rate = parse_decimal(raw_item.get('tax_rate'), 0.0)
+            line_base = quantity * unit_price
+            line_tax = line_base * (tax_rate / 100.0)
+            line_total = line_base + line_tax
+            subtotal += line_base
+            tax_total += line_tax
+            receipt_items.append({
+                'date': (raw_item.get('date') or '').strip(),
+                'category': (raw_item.get('category') or '').strip(),
+                'description': (raw_item.get('description') or '').strip(),
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'tax_rate': tax_rate,
+                'line_total': line_total
+            })
+
+        receipt_values = {
+            'title': title,
+            'date': receipt_date,
+            'subtotal': subtotal,
+            'tax_total': tax_total,
+            'grand_total': subtotal + tax_total,
+            'note': note,
+            'receipt_date': parse_date(receipt_date),
+            'user_id': user_id,
+            'filename': (title or 'receipt'),
+            'mime_type': '',
+            'image_data': '',
+            'ocr_text': '',
+            'suggested_category': '',
+            'suggested_amount': 0.0
+        }
+        return receipt_values, receipt_items, None
+
+    def write_receipts(pending):
+        """Insert (receipt_values, item_values) pairs; the caller commits.
+
+        Receipts are flushed together to obtain their ids, then every line item
+        goes in through a single executemany INSERT.
+        """
+        receipts = [Receipt(**values) for values, _ in pending]
+        db.session.add_all(receipts)
+        db.session.flush()
+        item_rows = []
+        rollup_totals = {}
+        for receipt, (values, items) in zip(receipts, pending):
+            for item in items:
+                item_rows.append(dict(item, receipt_id=receipt.id))
+                key = (receipt.user_id, parse_date(item['date']) or values['receipt_date'], item['category'])
+                total, entries = rollup_totals.get(key, (Decimal('0'), 0))
+                rollup_totals[key] = (total + (parse_money(item['line_total']) or Decimal('0')), entries + 1)
+        if item_rows:
+            db.session.execute(ReceiptItem.__table__.insert(), item_rows)
+        for (user_id, day, category), (total, entries) in rollup_totals.items():
+            apply_rollup(user_id, day, 'receipt', total, entries=entries, category=category)
+        index_documents([
+            receipt_document(receipt.id, receipt.user_id, values['receipt_date'], values['title'], values['note'], items)
+            for receipt, (values, items) in zip(receipts, pending)
+        ])
+        return [receipt.id for receipt in receipts]
+
     @app.route('/api/receipts', methods=['GET', 'POST'])
+    @conditional_get
     def api_receipts():
         if 'user_id' not in session:
             return jsonify({'error': 'Not logged in'}), 401
 
         if request.method == 'POST':
             data = request.get_json() or {}
-            title = (data.get('title') or '').strip()
-            receipt_date = (data.get('date') or '').strip()
-            note = (data.get('note') or '').strip()
-            items_data = data.get('items') or []
-
-            if not items_data:
-                return jsonify({'error': 'At least one line item is required'}), 400
+            receipt_values, receipt_items, error = build_receipt(data, session['user_id'])
+            if error:
+                return jsonify({'error': error}), 400
+            receipt_ids = write_receipts([(receipt_values, receipt_items)])
+            bump_data_version(session['user_id'])
+            db.session.commit()
+            return jsonify({'success': True, 'id': receipt_ids[0]}), 201
 
-            def parse_decimal(value, default=0.0):
-                try:
-                    return float(value)
-                except (TypeError, ValueError):
-                    return default
+        receipt_query, limit, error = windowed_query(
+            receipt_rows(session['user_id']), Receipt.receipt_date,
+            [Receipt.created_at, Receipt.id], descending=True
+        )
+        if error:
+            return jsonify({'error': error}), 400
+        return paged_json(receipt_query.all(), limit, receipts_to_dicts,
+                          lambda r: [r.created_at.isoformat(), r.id])
 
-            def parse_int(value, default=0):
-                try:
-                    return int(value)
-                except (TypeError, ValueError):
-                    return default
-
-            subtotal = 0.0
-            tax_total = 0.0
-            receipt_items = []
-            for raw_item in items_data:
-                quantity = parse_int(raw_item.get('quantity'), 1)
-                quantity = max(quantity, 0)
-                unit_price = parse_decimal(raw_item.get('unit_price'), 0.0)
-                tax_rate = parse_decimal(raw_item.get('tax_rate'), 0.0)
-                line_base = quantity * unit_price
-                line_tax = line_base * (tax_rate / 100.0)
-                line_total = line_base + line_tax
-                subtotal += line_base
-                tax_total += line_tax
-                receipt_items.append({
-                    'date': (raw_item.get('date') or '').strip(),
-                    'category': (raw_item.get('category') or '').strip(),
-                    'description': (raw_item.get('description') or '').strip(),
-                    'quantity': quantity,
-                    'unit_price': unit_price,
-                    'tax_rate': tax_rate,
-                    'line_total': line_total
-                })
+    RECEIPT_BATCH_LIMIT = 500
 
-            receipt = Receipt(
-                title=title,
-                date=receipt_date,
-                subtotal=subtotal,
-                tax_total=tax_total,
-                grand_total=subtotal + tax_total,
-                note=note,
-                user_id=session['user_id'],
-                filename=(title or 'receipt'),
-                mime_type='',
-                image_data='',
-                ocr_text='',
-                suggested_category='',
-                suggested_amount=0.0
-            )
-            db.session.add(receipt)
-            db.session.flush()
-            for item in receipt_items:
-                db.session.add(ReceiptItem(
-                    date=item['date'],
-                    category=item['category'],
-                    description=item['description'],
-                    quantity=item['quantity'],
-                    unit_price=item['unit_price'],
-                    tax_rate=item['tax_rate'],
-                    line_total=item['line_total'],
-                    receipt_id=receipt.id
-                ))
-            db.session.commit()
-            return jsonify({'success': True, 'id': receipt.id}), 201
-
-        receipts = Receipt.query.filter_by(user_id=session['user_id']).order_by(Receipt.created_at.desc()).all()
-        return jsonify([{
-            'id': r.id,
-            'title': r.title,
-            'date': r.date,
-            'subtotal': r.subtotal,
-            'tax_total': r.tax_total,
-            'grand_total': r.grand_total,
-            'note': r.note or '',
-            'created_at': r.created_at.isoformat(),
-            'items': [{
-                'id': item.id,
-                'date': item.date,
-                'category': item.category,
-                'description': item.description,
-                'quantity': item.quantity,
-                'unit_price': item.unit_price,
-                'tax_rate': item.tax_rate,
-                'line_total': item.line_total
-            } for item in r.items]
-        } for r in receipts])
+    @app.route('/api/receipts/batch', methods=['POST'])
+    def api_receipts_batch():
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('receipts')
+        if not isinstance(data, list) or not data:
+            return jsonify({'error': 'Expected a non-empty list of receipts'}), 400
+        if len(data) > RECEIPT_BATCH_LIMIT:
+            return jsonify({'error': f'At most {RECEIPT_BATCH_LIMIT} receipts per batch'}), 400
+
+        pending = []
+        errors = []
+        for index, raw in enumerate(data):
+            receipt_values, receipt_items, error = build_receipt(raw, session['user_id'])
+            if error:
+                errors.append({'index': index, 'error': error})
+            else:
+                pending.append((receipt_values, receipt_items))
+        if not pending:
+            # Nothing was written, so the data version (and every ETag) stays put.
+            return jsonify({'success': False, 'ids': [], 'errors': errors}), 400
+        receipt_ids = write_receipts(pending)
+        bump_data_version(session['user_id'])
+        db.session.commit()
+        return jsonify({'success': True, 'ids': receipt_ids, 'errors': errors}), 201
 
     @app.route('/api/receipts/<int:receipt_id>/pdf')
+    @conditional_get
     def api_receipt_pdf(receipt_id):
         if 'user_id' not in session:
             return jsonify({'error': 'Not logged in'}), 401
-        receipt = Receipt.query.filter_by(id=receipt_id, user_id=session['user_id']).first()
-        if not receipt:
+        receipts = receipts_to_dicts(receipt_rows(session['user_id']).filter(Receipt.id == receipt_id).all())
+        if not receipts:
             return jsonify({'error': 'Receipt not found'}), 404
-        return jsonify({
-            'id': receipt.id,
-            'title': receipt.title,
-            'date': receipt.date,
-            'subtotal': receipt.subtotal,
-            'tax_total': receipt.tax_total,
-            'grand_total': receipt.grand_total,
-            'note': receipt.note or '',
-            'created_at': receipt.created_at.isoformat(),
-            'items': [{
-                'id': item.id,
-                'date': item.date,
-                'category': item.category,
-                'description': item.description,
-                'quantity': item.quantity,
-                'unit_price': item.unit_price,
-                'tax_rate': item.tax_rate,
-                'line_total': item.line_total
-            } for item in receipt.items]
-        })
+        return jsonify(receipts[0])
+
+    RECEIPT_PDF_PRUNE_INTERVAL = 600  # seconds between opportunistic prunes per process
+    receipt_pdf_pruned_at = [0.0]
+
+    def prune_receipt_pdfs():
+        return prune_file_cache(
+            app.config['RECEIPT_PDF_CACHE_DIR'], app.config['RECEIPT_PDF_CACHE_MAX_MB'] * 1024 * 1024,
+            app.config['RECEIPT_PDF_CACHE_MAX_AGE_DAYS'] * 86400
+        )
+
+    @payflow_cli.command('prune-receipt-pdfs')
+    def prune_receipt_pdfs_command():
+        """Trim the receipt PDF cache to its age and size limits."""
+        print(f'Removed {prune_receipt_pdfs()} cached receipt PDFs.')
+
+    @app.route('/api/receipts/<int:receipt_id>/pdf/download')
+    def api_receipt_pdf_download(receipt_id):
+        """Serve the receipt as a server-rendered PDF.
+
+        Files are stored under a hash of everything they render, so a repeat
+        download only re-reads the receipt and sends the cached file; the hash
+        doubles as the ETag.
+        """
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        lang = request.args.get('lang', 'en')
+        if lang not in RECEIPT_PDF_LABELS:
+            return jsonify({'error': 'Language not supported for server-side PDFs'}), 406
+        currency = request.args.get('currency', '')[:8]
+        receipts = receipts_to_dicts(receipt_rows(session['user_id']).filter(Receipt.id == receipt_id).all())
+        if not receipts:
+            return jsonify({'error': 'Receipt not found'}), 404
+        font_path = app.config['RECEIPT_PDF_FONT']
+        digest = receipt_pdf_digest(receipts[0], lang, currency, font_path)
+        path = os.path.join(app.config['RECEIPT_PDF_CACHE_DIR'], digest[:2], f'{digest}.pdf')
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # mtime doubles as last use for pruning
+            except OSError:
+                pass
+        else:
+            content = render_receipt_pdf(receipts[0], lang, currency, font_path)
+            if content is None:
+                return jsonify({'error': 'PDF font unavailable'}), 503
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(partial, 'wb') as fh:
+                fh.write(content)
+            os.replace(partial, path)
+            if time.monotonic() - receipt_pdf_pruned_at[0] > RECEIPT_PDF_PRUNE_INTERVAL:
+                receipt_pdf_pruned_at[0] = time.monotonic()
+                prune_receipt_pdfs()
+        response = send_file(
+            path, mimetype='application/pdf', as_attachment=True,
+            download_name=f'receipt-{receipt_id}.pdf', etag=digest, conditional=True
+        )
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
     @app.route('/api/receipts/<int:receipt_id>', methods=['DELETE'])
     def delete_receipt(receipt_id):
@@ -606,38 +2769,32 @@ def create_app():
         receipt = Receipt.query.filter_by(id=receipt_id, user_id=session['user_id']).first()
         if not receipt:
             return jsonify({'error': 'Receipt not found'}), 404
+        for item in receipt.items:
+            day, category = receipt_item_rollup_key(receipt.date, item.date, item.category)
+            apply_rollup(receipt.user_id, day, 'receipt', item.line_total, entries=-1, category=category)
+        db.session.add(Tombstone(user_id=receipt.user_id, entity='receipts', entity_id=receipt.id))
+        unindex_documents('receipts', [receipt.id])
         db.session.delete(receipt)
+        bump_data_version(session['user_id'])
         db.session.commit()
         return jsonify({'success': True})
 
     @app.route('/api/report')
+    @conditional_get
     def api_report():
         if 'user_id' not in session:
             return jsonify({'error': 'Not logged in'}), 401
 
         start_raw = request.args.get('start')
         end_raw = request.args.get('end')
-        job_ids_raw = request.args.get('job_ids')
-
-        job_ids = []
-        if job_ids_raw:
-            try:
-                job_ids = [int(jid) for jid in job_ids_raw.split(',') if jid.strip()]
-            except ValueError:
-                job_ids = []
-
-        def parse_date(value):
-            if not value:
-                return None
-            for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
-                try:
-                    return datetime.strptime(value, fmt).date()
-                except ValueError:
-                    continue
-            return None
+        job_ids = parse_id_list(request.args.get('job_ids'))
 
         start_date = parse_date(start_raw)
         end_date = parse_date(end_raw)
+        key = cache_key(session['user_id'], 'report', start_date, end_date, ','.join(map(str, job_ids)))
+        cached = report_cache.get(key)
+        if cached is not None:
+            return jsonify(cached)
         today = date.today()
         week_start = today - timedelta(days=today.weekday())
         month_start = today.replace(day=1)
@@ -647,200 +2804,864 @@ def create_app():
             'month': month_start,
             'year': year_start,
         }
-        period_totals = {
-            key: {'income': 0.0, 'expense': 0.0}
-            for key in period_starts
-        }
 
-        def in_selected_range(dt_value):
-            if dt_value is None:
-                return not (start_date or end_date)
-            if start_date and dt_value < start_date:
-                return False
-            if end_date and dt_value > end_date:
-                return False
-            return True
-
-        def apply_period_income(amount, dt_value):
-            if dt_value is None or dt_value > today:
-                return
-            for key, threshold in period_starts.items():
-                if dt_value >= threshold:
-                    period_totals[key]['income'] += amount
-
-        def apply_period_expense(amount, dt_value):
-            if dt_value is None or dt_value > today:
-                return
-            for key, threshold in period_starts.items():
-                if dt_value >= threshold:
-                    period_totals[key]['expense'] += amount
-
-        shift_query = Shift.query.filter_by(user_id=session['user_id'])
+        def report_columns(date_col, amount_col, count_col):
+            # Rows with an unparseable date only count when no range is selected.
+            range_conditions = []
+            if start_date:
+                range_conditions.append(date_col >= start_date)
+            if end_date:
+                range_conditions.append(date_col <= end_date)
+            if range_conditions:
+                in_range = and_(*range_conditions)
+                columns = [
+                    func.sum(case((in_range, amount_col), else_=0)),
+                    func.sum(case((in_range, count_col), else_=0)),
+                ]
+            else:
+                columns = [func.sum(amount_col), func.sum(count_col)]
+            for threshold in period_starts.values():
+                columns.append(func.sum(case(
+                    (and_(date_col >= threshold, date_col <= today), amount_col),
+                    else_=0
+                )))
+            return columns
+
+        def collect(rows):
+            totals = {}
+            period_sums = {key: 0.0 for key in period_starts}
+            for row in rows:
+                label, amount, matched = row[0], row[1], row[2]
+                if matched:
+                    totals[label] = totals.get(label, 0.0) + float(amount or 0)
+                for key, value in zip(period_starts, row[3:]):
+                    period_sums[key] += float(value or 0)
+            return totals, period_sums
+
+        rollup_columns = report_columns(DailyRollup.day, DailyRollup.amount, DailyRollup.entries)
+        job_label = func.coalesce(Job.name, 'Unassigned')
+        income_query = db.session.query(job_label, *rollup_columns).outerjoin(
+            Job, DailyRollup.job_id == Job.id
+        ).filter(DailyRollup.user_id == session['user_id'], DailyRollup.kind == 'income')
         if job_ids:
-            shift_query = shift_query.filter(Shift.job_id.in_(job_ids))
-        all_shifts = shift_query.all()
+            income_query = income_query.filter(DailyRollup.job_id.in_(job_ids))
+        by_job, income_periods = collect(income_query.group_by(job_label).all())
 
-        income_total = 0.0
-        by_job = {}
-        filtered_shifts = []
-        for s in all_shifts:
-            shift_date = parse_date(s.date)
-            try:
-                wage = float(s.total_wage or 0)
-            except (TypeError, ValueError):
-                wage = 0.0
-            apply_period_income(wage, shift_date)
-            if not in_selected_range(shift_date):
-                continue
-            income_total += wage
-            filtered_shifts.append(s)
-            job_name = s.job.name if s.job else 'Unassigned'
-            by_job[job_name] = by_job.get(job_name, 0.0) + wage
-
-        expense_query = Expense.query.filter_by(user_id=session['user_id'])
-        all_expenses = expense_query.all()
-        expense_total = 0.0
-        by_category = {}
-        filtered_expenses = []
-        for e in all_expenses:
-            expense_date = parse_date(e.date)
-            amount = float(e.amount or 0)
-            apply_period_expense(amount, expense_date)
-            if not in_selected_range(expense_date):
-                continue
-            expense_total += amount
-            filtered_expenses.append(e)
-            by_category[e.category] = by_category.get(e.category, 0.0) + amount
+        # Recurring shifts are not stored, so their occurrences are expanded for the
+        # window this report covers. Without an end date they count up to today.
+        template_query = recurring_rows(session['user_id'])
+        if job_ids:
+            template_query = template_query.filter(RecurringShift.job_id.in_(job_ids))
+        templates = template_query.all()
+        if templates:
+            window_start = min(start_date or date.min, week_start, year_start)
+            window_end = min(max(end_date or today, today), today + RECURRING_HORIZON)
+            window_start = max(window_start, min(template.start_date for template in templates))
+            logged = db.session.query(Shift.work_date, Shift.job_id).filter(
+                Shift.user_id == session['user_id'], Shift.work_date.between(window_start, window_end)
+            ).order_by(Shift.work_date)
+            occurrences = merge_shift_streams(
+                ((day, job_id, None) for day, job_id in logged),
+                recurring_occurrences(templates, window_start, window_end)
+            )
+            for day, _, template in occurrences:
+                if template is None:
+                    continue
+                amount = float(template.wage_amount or 0)
+                in_range = (start_date is None or day >= start_date) and (day <= (end_date or today))
+                if in_range:
+                    label = template.job_name or 'Unassigned'
+                    by_job[label] = by_job.get(label, 0.0) + amount
+                for key, threshold in period_starts.items():
+                    if threshold <= day <= today:
+                        income_periods[key] += amount
+
+        expense_query = db.session.query(DailyRollup.category, *rollup_columns).filter(
+            DailyRollup.user_id == session['user_id'], DailyRollup.kind == 'expense'
+        )
+        by_category, expense_periods = collect(expense_query.group_by(DailyRollup.category).all())
 
-        for key in period_totals:
-            period = period_totals[key]
-            period['net'] = period['income'] - period['expense']
+        income_total = sum(by_job.values(), 0.0)
+        expense_total = sum(by_category.values(), 0.0)
+        period_totals = {
+            key: {
+                'income': income_periods[key],
+                'expense': expense_periods[key],
+                'net': income_periods[key] - expense_periods[key],
+            }
+            for key in period_starts
+        }
 
-        return jsonify({
+        payload = {
             'income_total': income_total,
             'expense_total': expense_total,
             'net': income_total - expense_total,
             'by_job': by_job,
             'by_category': by_category,
             'periods': period_totals
-        })
+        }
+        report_cache.set(key, payload)
+        return jsonify(payload)
+
+    CALENDAR_PREVIEW_SHIFTS = 2
+    CALENDAR_PREVIEW_EXPENSES = 4
+
+    @app.route('/api/calendar')
+    @conditional_get
+    def api_calendar():
+        """Per-day shift and expense summaries for one month of the calendar view."""
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        month = (request.args.get('month') or '').strip() or date.today().strftime('%Y-%m')
+        month_start = parse_month(month)
+        if month_start is None:
+            return jsonify({'error': 'month must be YYYY-MM'}), 400
+        key = cache_key(session['user_id'], 'calendar', month)
+        cached = report_cache.get(key)
+        if cached is not None:
+            return jsonify(cached)
+        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+        days = {}
+
+        def bucket(day):
+            return days.setdefault(day.isoformat(), {
+                'shift_count': 0, 'hours': 0.0, 'income': 0.0, 'currency': None, 'job_colors': [],
+                'shifts': [], 'expense_count': 0, 'expense_total': 0.0, 'expense_categories': [],
+            })
+
+        concrete = db.session.query(
+            Shift.work_date, Shift.job_id, Shift.start_time, Shift.end_time, Shift.total_hours,
+            Shift.total_wage, Shift.currency, Job.name, Job.color
+        ).outerjoin(Job, Shift.job_id == Job.id).filter(
+            Shift.user_id == session['user_id'], Shift.work_date.between(month_start, month_end)
+        ).order_by(Shift.work_date, Shift.id)
+        virtual = recurring_occurrences(recurring_rows(session['user_id']).all(), month_start, month_end)
+        for day, row, template in merge_shift_streams(
+            ((row.work_date, row.job_id, row) for row in concrete), virtual
+        ):
+            shift = row if template is None else template
+            color = (row.color if template is None else template.job_color) or '#4f46e5'
+            name = row.name if template is None else template.job_name
+            cell = bucket(day)
+            cell['shift_count'] += 1
+            cell['hours'] += float(parse_money(shift.total_hours) or 0)
+            cell['income'] += float(parse_money(shift.total_wage) or 0)
+            cell['currency'] = cell['currency'] or shift.currency or None
+            if color not in cell['job_colors']:
+                cell['job_colors'].append(color)
+            if len(cell['shifts']) < CALENDAR_PREVIEW_SHIFTS:
+                cell['shifts'].append({
+                    'job_name': name, 'job_color': color,
+                    'start_time': shift.start_time, 'end_time': shift.end_time,
+                })
+
+        expense_rows_in_month = db.session.query(Expense.expense_date, Expense.category, Expense.amount).filter(
+            Expense.user_id == session['user_id'], Expense.expense_date.between(month_start, month_end)
+        ).order_by(Expense.expense_date, Expense.id)
+        for day, category, amount in expense_rows_in_month:
+            cell = bucket(day)
+            cell['expense_count'] += 1
+            cell['expense_total'] += float(amount or 0)
+            if len(cell['expense_categories']) < CALENDAR_PREVIEW_EXPENSES:
+                cell['expense_categories'].append(category)
+
+        for cell in days.values():
+            for field in ('hours', 'income', 'expense_total'):
+                cell[field] = round(cell[field], 2)
+        payload = {'month': month, 'days': days}
+        report_cache.set(key, payload)
+        return jsonify(payload)
+
+    @app.route('/api/search')
+    @conditional_get
+    def api_search():
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        # Word characters only, so user input never reaches the FTS query syntax.
+        terms = re.findall(r'\w+', request.args.get('q') or '')[:8]
+        if not terms:
+            return jsonify({'error': 'Search query required'}), 400
+        entity = (request.args.get('type') or '').strip() or None
+        if entity and entity not in SEARCH_ENTITIES:
+            return jsonify({'error': 'Invalid type'}), 400
+        bounds = {}
+        for name in ('from', 'to'):
+            raw = (request.args.get(name) or '').strip()
+            bounds[name] = parse_date(raw) if raw else None
+            if raw and bounds[name] is None:
+                return jsonify({'error': f"Invalid '{name}' date"}), 400
+        try:
+            limit = min(max(int(request.args.get('limit') or SEARCH_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        offset = 0
+        cursor_raw = (request.args.get('cursor') or '').strip()
+        if cursor_raw:
+            values = decode_cursor(cursor_raw)
+            if not values or not isinstance(values[0], int) or values[0] < 0:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            offset = values[0]
+
+        hits = search_documents(session['user_id'], terms, entity, bounds['from'], bounds['to'], limit + 1, offset)
+        response = jsonify([{
+            'type': hit.entity,
+            'id': int(hit.entity_id),
+            'date': hit.day.isoformat() if isinstance(hit.day, date) else hit.day,
+            'snippet': hit.snippet,
+            'score': float(hit.score),
+        } for hit in hits[:limit]])
+        if len(hits) > limit:
+            response.headers['X-Next-Cursor'] = encode_cursor([offset + limit])
+        return response
+
+    EXPORT_BATCH_SIZE = 500
+
+    def export_datasets(user_id, start_date, end_date, job_ids):
+        """Header row and a row query for each exportable dataset."""
+        def in_range(query, date_col):
+            if start_date:
+                query = query.filter(date_col >= start_date)
+            if end_date:
+                query = query.filter(date_col <= end_date)
+            return query
+
+        shifts = in_range(db.session.query(
+            Shift.date, Job.name, Shift.shift_type, Shift.start_time, Shift.end_time,
+            Shift.break_start, Shift.break_end, Shift.total_hours, Shift.hourly_wage,
+            Shift.currency, Shift.total_wage
+        ).outerjoin(Job, Shift.job_id == Job.id).filter(Shift.user_id == user_id), Shift.work_date)
+        if job_ids:
+            shifts = shifts.filter(Shift.job_id.in_(job_ids))
+
+        expenses = in_range(db.session.query(
+            Expense.date, Expense.category, Expense.amount, Expense.description
+        ).filter(Expense.user_id == user_id), Expense.expense_date)
+
+        budgets = db.session.query(Budget.month, Budget.category, Budget.amount).filter(Budget.user_id == user_id)
+        if start_date:
+            budgets = budgets.filter(Budget.month >= start_date.strftime('%Y-%m'))
+        if end_date:
+            budgets = budgets.filter(Budget.month <= end_date.strftime('%Y-%m'))
+
+        receipt_items = in_range(db.session.query(
+            Receipt.title, Receipt.date, ReceiptItem.date, ReceiptItem.category, ReceiptItem.description,
+            ReceiptItem.quantity, ReceiptItem.unit_price, ReceiptItem.tax_rate, ReceiptItem.line_total
+        ).join(Receipt, ReceiptItem.receipt_id == Receipt.id).filter(Receipt.user_id == user_id),
+            Receipt.receipt_date)
+
+        return {
+            'shifts': (['Date', 'Job', 'Shift Type', 'Start', 'End', 'Break Start', 'Break End',
+                        'Total Hours', 'Hourly Wage', 'Currency', 'Total Wage'],
+                       shifts.order_by(Shift.id)),
+            'expenses': (['Date', 'Category', 'Amount', 'Description'],
+                         expenses.order_by(Expense.date, Expense.id)),
+            'budgets': (['Month', 'Category', 'Amount'],
+                        budgets.order_by(Budget.month, Budget.category)),
+            'receipt_items': (['Receipt', 'Receipt Date', 'Item Date', 'Category', 'Description',
+                               'Quantity', 'Unit Price', 'Tax Rate', 'Line Total'],
+                              receipt_items.order_by(Receipt.id, ReceiptItem.id)),
+        }
 
     @app.route('/api/export')
     def export_csv():
         if 'user_id' not in session:
             return redirect(url_for('login'))
-        shifts = Shift.query.filter_by(user_id=session['user_id']).all()
-
-        si = io.StringIO()
-        cw = csv.writer(si)
-        cw.writerow(['Date', 'Job', 'Shift Type', 'Start', 'End', 'Break Start', 'Break End',
-                     'Total Hours', 'Hourly Wage', 'Currency', 'Total Wage'])
-        for s in shifts:
-            job_name = s.job.name if s.job else ''
-            cw.writerow([
-                s.date,
-                job_name,
-                s.shift_type,
-                s.start_time,
-                s.end_time,
-                s.break_start,
-                s.break_end,
-                s.total_hours,
-                s.hourly_wage,
-                s.currency,
-                s.total_wage
-            ])
-
-        mem = io.BytesIO()
-        mem.write(si.getvalue().encode('utf-8'))
-        mem.seek(0)
-        return send_file(
-            mem,
+        dataset = (request.args.get('dataset') or 'shifts').strip()
+        datasets = export_datasets(
+            session['user_id'],
+            parse_date(request.args.get('start')),
+            parse_date(request.args.get('end')),
+            parse_id_list(request.args.get('job_ids'))
+        )
+        if dataset not in datasets:
+            return jsonify({'error': 'Unknown dataset'}), 400
+        header, query = datasets[dataset]
+
+        def generate():
+            # Rows are fetched in server-side batches and flushed as CSV chunks,
+            # so memory stays flat regardless of history size.
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(header)
+            pending = 0
+            for row in query.yield_per(EXPORT_BATCH_SIZE):
+                writer.writerow(['' if value is None else value for value in row])
+                pending += 1
+                if pending >= EXPORT_BATCH_SIZE:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+                    pending = 0
+            yield buffer.getvalue()
+
+        return Response(
+            stream_with_context(generate()),
             mimetype='text/csv; charset=utf-8',
-            as_attachment=True,
-            download_name='my_shifts.csv'
+            headers={'Content-Disposition': f'attachment; filename=my_{dataset}.csv'}
         )
 
+    IMPORT_CHUNK_SIZE = 500
+    IMPORT_MAX_ERRORS = 1000
+    # CSV headers written by export_csv, mapped back to field names.
+    IMPORT_CSV_COLUMNS = {
+        'shifts': {
+            'Date': 'date', 'Job': 'job', 'Shift Type': 'shift_type', 'Start': 'start_time',
+            'End': 'end_time', 'Break Start': 'break_start', 'Break End': 'break_end',
+            'Total Hours': 'total_hours', 'Hourly Wage': 'hourly_wage', 'Currency': 'currency',
+            'Total Wage': 'total_wage'
+        },
+        'expenses': {'Date': 'date', 'Category': 'category', 'Amount': 'amount', 'Description': 'description'},
+    }
+    SHIFT_TEXT_FIELDS = ('date', 'shift_type', 'start_time', 'end_time', 'break_start', 'break_end',
+                         'total_hours', 'hourly_wage', 'currency', 'total_wage')
+
+    def import_field(raw, name):
+        value = raw.get(name)
+        return '' if value is None else str(value).strip()
+
+    def too_long(model, values):
+        for name, value in values.items():
+            length = getattr(model.__table__.c[name].type, 'length', None)
+            if length and isinstance(value, str) and len(value) > length:
+                return f"'{name}' is longer than {length} characters"
+        return None
+
+    def import_shift_row(raw, jobs_by_name, job_ids):
+        work_date = parse_date(import_field(raw, 'date'))
+        if work_date is None:
+            return None, 'Invalid or missing date'
+        job_id = None
+        if import_field(raw, 'job_id'):
+            try:
+                job_id = int(import_field(raw, 'job_id'))
+            except ValueError:
+                return None, 'Invalid job id'
+            if job_id not in job_ids:
+                return None, 'Invalid job assignment'
+        elif import_field(raw, 'job'):
+            job_id = jobs_by_name.get(import_field(raw, 'job'))
+            if job_id is None:
+                return None, f"Unknown job '{import_field(raw, 'job')}'"
+        values = {name: import_field(raw, name) for name in SHIFT_TEXT_FIELDS}
+        wage_amount = parse_money(values['total_wage'])
+        if values['total_wage'] and wage_amount is None:
+            return None, 'Invalid total wage'
+        error = too_long(Shift, values)
+        if error:
+            return None, error
+        values.update(work_date=work_date, wage_amount=wage_amount, job_id=job_id)
+        return values, None
+
+    def import_expense_row(raw):
+        expense_date = parse_date(import_field(raw, 'date'))
+        try:
+            amount = float(import_field(raw, 'amount') or 0)
+        except ValueError:
+            amount = 0.0
+        if expense_date is None or amount <= 0:
+            return None, 'Date and positive amount are required'
+        values = {
+            'date': import_field(raw, 'date'),
+            'category': import_field(raw, 'category') or 'General',
+            'description': import_field(raw, 'description'),
+        }
+        error = too_long(Expense, values)
+        if error:
+            return None, error
+        values.update(amount=amount, expense_date=expense_date)
+        return values, None
+
+    def price_import_shifts(user_id, rows):
+        """Price imported job shifts from their job's rules, as POST /api/shifts does.
+
+        Rows are priced one compute_pay_batch pass per job; rows whose times do
+        not parse keep the CSV values.
+        """
+        by_job = {}
+        for row in rows:
+            if row['job_id'] is not None:
+                by_job.setdefault(row['job_id'], []).append(row)
+        if not by_job:
+            return
+        jobs = Job.query.filter(Job.user_id == user_id, Job.id.in_(list(by_job))).all()
+        for job in jobs:
+            job_rows = by_job[job.id]
+            rate = f'{float(job.hourly_wage):g}'
+            priced = compute_pay_batch(
+                [(row['start_time'], row['end_time'], row['break_start'], row['break_end']) for row in job_rows],
+                job.hourly_wage, **job_wage_rules(job)
+            )
+            for row, pay in zip(job_rows, priced):
+                if pay is not None:
+                    row.update(total_hours=str(pay[0]), hourly_wage=rate,
+                               total_wage=str(pay[1]), wage_amount=pay[1])
+
+    def insert_import_chunk(dataset, user_id, rows):
+        """Bulk insert one chunk and fold it into daily_rollup in the same transaction."""
+        model = Shift if dataset == 'shifts' else Expense
+        if dataset == 'shifts':
+            price_import_shifts(user_id, rows)
+        last_id = db.session.query(func.max(model.id)).scalar() or 0
+        db.session.execute(model.__table__.insert(), rows)
+        if dataset == 'expenses':
+            index_documents(expense_documents_since(user_id, last_id))
+        totals = {}
+        for row in rows:
+            if dataset == 'shifts':
+                key = ('income', row['work_date'], row['job_id'], None)
+                amount = row['wage_amount'] or Decimal('0')
+            else:
+                key = ('expense', row['expense_date'], None, row['category'])
+                amount = Decimal(str(row['amount']))
+            total, entries = totals.get(key, (Decimal('0'), 0))
+            totals[key] = (total + amount, entries + 1)
+        for (kind, day, job_id, category), (total, entries) in totals.items():
+            apply_rollup(user_id, day, kind, total, entries=entries, job_id=job_id, category=category)
+        bump_data_version(user_id)
+        db.session.commit()
+
+    @app.route('/api/import', methods=['POST'])
+    def api_import():
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+
+        dataset = (request.args.get('dataset') or request.form.get('dataset') or 'shifts').strip()
+        upload = request.files.get('file')
+        if upload:
+            if dataset not in IMPORT_CSV_COLUMNS:
+                return jsonify({'error': 'Unknown dataset'}), 400
+            columns = IMPORT_CSV_COLUMNS[dataset]
+            stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            rows = (
+                {columns.get(key.strip(), key.strip()): value for key, value in record.items() if key}
+                for record in csv.DictReader(stream)
+            )
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                dataset = payload.get('dataset') or dataset
+                if not isinstance(dataset, str):
+                    return jsonify({'error': 'Unknown dataset'}), 400
+                dataset = dataset.strip()
+                payload = payload.get('rows')
+            if not isinstance(payload, list):
+                return jsonify({'error': 'Expected a CSV file or a JSON array of rows'}), 400
+            if dataset not in IMPORT_CSV_COLUMNS:
+                return jsonify({'error': 'Unknown dataset'}), 400
+            rows = iter(payload)
+
+        user_id = session['user_id']
+        jobs_by_name = {}
+        job_ids = set()
+        if dataset == 'shifts':
+            for job_id, name in db.session.query(Job.id, Job.name).filter(Job.user_id == user_id).order_by(Job.id):
+                jobs_by_name.setdefault(name, job_id)
+                job_ids.add(job_id)
+
+        imported = 0
+        error_count = 0
+        errors = []
+        chunk = []
+        index = 0
+        try:
+            for index, raw in enumerate(rows, start=1):
+                if not isinstance(raw, dict):
+                    values, error = None, 'Row must be an object'
+                elif dataset == 'shifts':
+                    values, error = import_shift_row(raw, jobs_by_name, job_ids)
+                else:
+                    values, error = import_expense_row(raw)
+                if error:
+                    error_count += 1
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append({'row': index, 'error': error})
+                    continue
+                values['user_id'] = user_id
+                chunk.append(values)
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    insert_import_chunk(dataset, user_id, chunk)
+                    imported += len(chunk)
+                    chunk = []
+        except (UnicodeDecodeError, csv.Error) as exc:
+            db.session.rollback()
+            return jsonify({
+                'error': f'Unreadable CSV after row {index}: {exc}',
+                'imported': imported,
+                'error_count': error_count,
+                'errors': errors
+            }), 400
+        if chunk:
+            insert_import_chunk(dataset, user_id, chunk)
+            imported += len(chunk)
+
+        return jsonify({
+            'success': True,
+            'dataset': dataset,
+            'imported': imported,
+            'error_count': error_count,
+            'errors': errors
+        })
+
+    SYNC_OVERLAP = timedelta(seconds=5)
+    SYNC_TOMBSTONE_RETENTION = timedelta(days=30)
+
+    @app.route('/api/sync')
+    @conditional_get
+    def api_sync():
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        user_id = session['user_id']
+        now = datetime.utcnow()
+
+        since = None
+        since_raw = (request.args.get('since') or '').strip()
+        if since_raw:
+            values = decode_cursor(since_raw)
+            try:
+                since = datetime.fromisoformat(values[0])
+            except (TypeError, ValueError, IndexError):
+                return jsonify({'error': 'Invalid sync token'}), 400
+        # Tokens older than the tombstone retention window get a full snapshot.
+        full = since is None or since < now - SYNC_TOMBSTONE_RETENTION
+
+        def changed(query, model):
+            return query if full else query.filter(model.updated_at > since)
+
+        shifts = changed(shift_rows(user_id), Shift)
+        jobs = changed(job_rows(user_id), Job)
+        expenses = changed(expense_rows(user_id), Expense)
+        receipts = changed(receipt_rows(user_id), Receipt)
+        deleted = {'shifts': [], 'jobs': [], 'expenses': [], 'receipts': []}
+        if not full:
+            tombstones = db.session.query(Tombstone.entity, Tombstone.entity_id).filter(
+                Tombstone.user_id == user_id, Tombstone.deleted_at > since
+            )
+            for entity, entity_id in tombstones:
+                deleted.setdefault(entity, []).append(entity_id)
+
+        return jsonify({
+            # The token trails the clock a little so rows committed by
+            # concurrent writers around "now" are sent again next time.
+            'token': encode_cursor([(now - SYNC_OVERLAP).isoformat()]),
+            'full': full,
+            'shifts': shifts_to_dicts(shifts.order_by(Shift.id)),
+            'jobs': jobs_to_dicts(jobs.order_by(Job.name.asc())),
+            'expenses': expenses_to_dicts(expenses.order_by(Expense.date.desc(), Expense.id.desc())),
+            'receipts': receipts_to_dicts(receipts.order_by(Receipt.created_at.desc(), Receipt.id.desc())),
+            'deleted': deleted
+        })
+
     # Health check (optional for Render)
     @app.route('/health')
     def health():
         return 'ok', 200
 
-    with app.app_context():
-        db.create_all()
+    @app.route('/health/cache')
+    @internal_only
+    def cache_stats():
+        return jsonify(report_cache.stats())
+
+    @app.route('/health/db')
+    @internal_only
+    def db_pool_stats():
+        """Connection pool usage for this worker, for sizing workers against the pool."""
+        pool = db.engine.pool
+        stats = {'dialect': db.engine.dialect.name, 'pool': type(pool).__name__, 'status': pool.status()}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)()
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as conn:
+                stats['journal_mode'] = conn.exec_driver_sql('PRAGMA journal_mode').scalar()
+        return jsonify(stats)
+
+    def backfill_typed_columns(batch_size=1000):
+        # Populate work_date/wage_amount/expense_date from the legacy string columns.
+        # The UPDATEs go through bare table clauses: the model tables would add
+        # updated_at (onupdate), which only exists from migration 5 on.
+        shift_rows = db.session.query(Shift.id, Shift.date, Shift.total_wage).filter(
+            ((Shift.work_date.is_(None)) & (Shift.date.isnot(None)) & (Shift.date != ''))
+            | ((Shift.wage_amount.is_(None)) & (Shift.total_wage.isnot(None)) & (Shift.total_wage != ''))
+        ).all()
+        shift_updates = []
+        for shift_id, raw_date, raw_wage in shift_rows:
+            work_date = parse_date(raw_date)
+            wage_amount = parse_money(raw_wage)
+            if work_date is None and wage_amount is None:
+                continue
+            shift_updates.append({'b_id': shift_id, 'b_date': work_date, 'b_wage': wage_amount})
+        shift_table = db.table('shift', db.column('id'), db.column('work_date'), db.column('wage_amount'))
+        stmt = shift_table.update().where(shift_table.c.id == bindparam('b_id')).values(
+            work_date=func.coalesce(shift_table.c.work_date, bindparam('b_date', type_=db.Date)),
+            wage_amount=func.coalesce(shift_table.c.wage_amount, bindparam('b_wage', type_=db.Numeric(12, 2)))
+        )
+        for offset in range(0, len(shift_updates), batch_size):
+            db.session.execute(stmt, shift_updates[offset:offset + batch_size])
+
+        for model, typed_name in ((Expense, 'expense_date'), (Receipt, 'receipt_date')):
+            typed_col = getattr(model, typed_name)
+            rows = db.session.query(model.id, model.date).filter(
+                typed_col.is_(None), model.date.isnot(None), model.date != ''
+            ).all()
+            updates = [
+                {'b_id': row_id, 'b_date': parsed}
+                for row_id, parsed in ((row_id, parse_date(raw)) for row_id, raw in rows)
+                if parsed is not None
+            ]
+            typed_table = db.table(model.__tablename__, db.column('id'), db.column(typed_name))
+            stmt = typed_table.update().where(typed_table.c.id == bindparam('b_id')).values(
+                {typed_name: bindparam('b_date', type_=db.Date)}
+            )
+            for offset in range(0, len(updates), batch_size):
+                db.session.execute(stmt, updates[offset:offset + batch_size])
+        db.session.commit()
+
+    # --- Schema migrations ---
+    # Each migration runs once per database and is recorded in schema_migrations,
+    # so boots after the first skip the column introspection entirely.
+    migrations = []
+
+    def migration(version):
+        def register(fn):
+            migrations.append((version, fn))
+            return fn
+        return register
+
+    def add_missing_columns(table, column_defs):
         inspector = inspect(db.engine)
-        if 'shift' in inspector.get_table_names():
-            shift_columns = {col['name'] for col in inspector.get_columns('shift')}
-            if 'job_id' not in shift_columns:
-                with db.engine.connect() as conn:
-                    conn.execute(text('ALTER TABLE shift ADD COLUMN job_id INTEGER'))
-                    conn.commit()
-        if 'job' in inspector.get_table_names():
-            job_columns = {col['name'] for col in inspector.get_columns('job')}
-            if 'color' not in job_columns:
+        if table not in inspector.get_table_names():
+            return
+        existing = {col['name'] for col in inspector.get_columns(table)}
+        for col_name, ddl in column_defs.items():
+            if col_name not in existing:
                 with db.engine.connect() as conn:
-                    conn.execute(text("ALTER TABLE job ADD COLUMN color VARCHAR(20) DEFAULT '#4f46e5'"))
+                    conn.execute(text(ddl))
                     conn.commit()
-        if 'user' in inspector.get_table_names():
-            user_columns = inspector.get_columns('user')
-            user_column_names = {col['name'] for col in user_columns}
-            if 'email' not in user_column_names:
-                try:
-                    with db.engine.connect() as conn:
-                        conn.execute(text('ALTER TABLE "user" ADD COLUMN email VARCHAR(150)'))
-                        conn.commit()
-                except Exception as exc:
-                    print(f"[WARN] Unable to add email column to user table: {exc}")
-            password_column = next((col for col in user_columns if col['name'] == 'password'), None)
-            if password_column:
-                password_type = str(password_column.get('type', '')).lower()
-                if 'text' not in password_type:
-                    try:
-                        with db.engine.connect() as conn:
-                            conn.execute(text('ALTER TABLE "user" ALTER COLUMN password TYPE TEXT'))
-                            conn.commit()
-                    except Exception as exc:
-                        print(f"[WARN] Unable to widen user.password column: {exc}")
-        if 'receipt' in inspector.get_table_names():
-            receipt_columns = {col['name'] for col in inspector.get_columns('receipt')}
-            column_defs = {
-                'title': "ALTER TABLE receipt ADD COLUMN title VARCHAR(150)",
-                'date': "ALTER TABLE receipt ADD COLUMN date VARCHAR(50)",
-                'subtotal': "ALTER TABLE receipt ADD COLUMN subtotal FLOAT DEFAULT 0",
-                'tax_total': "ALTER TABLE receipt ADD COLUMN tax_total FLOAT DEFAULT 0",
-                'grand_total': "ALTER TABLE receipt ADD COLUMN grand_total FLOAT DEFAULT 0",
-                'note': "ALTER TABLE receipt ADD COLUMN note TEXT DEFAULT ''"
-            }
-            for col_name, ddl in column_defs.items():
-                if col_name not in receipt_columns:
-                    try:
-                        with db.engine.connect() as conn:
-                            conn.execute(text(ddl))
-                            conn.commit()
-                    except Exception as exc:
-                        print(f"[WARN] Unable to add column '{col_name}' to receipt table: {exc}")
+
+    def create_model_indexes(*models):
+        # Indexes on columns a later migration adds are left for that migration.
+        inspector = inspect(db.engine)
+        for model in models:
+            existing = {col['name'] for col in inspector.get_columns(model.__tablename__)}
+            for index in model.__table__.indexes:
+                if all(col.name in existing for col in index.columns):
+                    index.create(bind=db.engine, checkfirst=True)
+
+    @migration(1)
+    def legacy_columns():
+        add_missing_columns('shift', {'job_id': 'ALTER TABLE shift ADD COLUMN job_id INTEGER'})
+        add_missing_columns('job', {'color': "ALTER TABLE job ADD COLUMN color VARCHAR(20) DEFAULT '#4f46e5'"})
+        add_missing_columns('user', {'email': 'ALTER TABLE "user" ADD COLUMN email VARCHAR(150)'})
+        user_columns = inspect(db.engine).get_columns('user')
+        password_column = next((col for col in user_columns if col['name'] == 'password'), None)
+        if password_column and 'text' not in str(password_column.get('type', '')).lower():
             try:
                 with db.engine.connect() as conn:
-                    conn.execute(text("UPDATE receipt SET filename = COALESCE(filename, 'receipt')"))
-                    conn.execute(text("UPDATE receipt SET mime_type = COALESCE(mime_type, '')"))
-                    conn.execute(text("UPDATE receipt SET image_data = COALESCE(image_data, '')"))
-                    conn.execute(text("UPDATE receipt SET ocr_text = COALESCE(ocr_text, '')"))
-                    conn.execute(text("UPDATE receipt SET suggested_category = COALESCE(suggested_category, '')"))
-                    conn.execute(text("UPDATE receipt SET suggested_amount = COALESCE(suggested_amount, 0)"))
-                    conn.execute(text("UPDATE receipt SET note = COALESCE(note, '')"))
+                    conn.execute(text('ALTER TABLE "user" ALTER COLUMN password TYPE TEXT'))
                     conn.commit()
             except Exception as exc:
-                print(f"[WARN] Unable to normalize legacy receipt columns: {exc}")
+                print(f"[WARN] Unable to widen user.password column: {exc}")
+        add_missing_columns('receipt', {
+            'title': "ALTER TABLE receipt ADD COLUMN title VARCHAR(150)",
+            'date': "ALTER TABLE receipt ADD COLUMN date VARCHAR(50)",
+            'subtotal': "ALTER TABLE receipt ADD COLUMN subtotal FLOAT DEFAULT 0",
+            'tax_total': "ALTER TABLE receipt ADD COLUMN tax_total FLOAT DEFAULT 0",
+            'grand_total': "ALTER TABLE receipt ADD COLUMN grand_total FLOAT DEFAULT 0",
+            'note': "ALTER TABLE receipt ADD COLUMN note TEXT DEFAULT ''"
+        })
+        with db.engine.connect() as conn:
+            conn.execute(text(
+                "UPDATE receipt SET filename = COALESCE(filename, 'receipt'), "
+                "mime_type = COALESCE(mime_type, ''), image_data = COALESCE(image_data, ''), "
+                "ocr_text = COALESCE(ocr_text, ''), suggested_category = COALESCE(suggested_category, ''), "
+                "suggested_amount = COALESCE(suggested_amount, 0), note = COALESCE(note, '') "
+                "WHERE filename IS NULL OR mime_type IS NULL OR image_data IS NULL OR ocr_text IS NULL "
+                "OR suggested_category IS NULL OR suggested_amount IS NULL OR note IS NULL"
+            ))
+            conn.commit()
+
+    @migration(2)
+    def typed_date_and_money_columns():
+        add_missing_columns('shift', {
+            'work_date': 'ALTER TABLE shift ADD COLUMN work_date DATE',
+            'wage_amount': 'ALTER TABLE shift ADD COLUMN wage_amount NUMERIC(12, 2)'
+        })
+        add_missing_columns('expense', {'expense_date': 'ALTER TABLE expense ADD COLUMN expense_date DATE'})
+        add_missing_columns('receipt', {'receipt_date': 'ALTER TABLE receipt ADD COLUMN receipt_date DATE'})
+        backfill_typed_columns()
+
+    @migration(3)
+    def daily_rollups():
+        # user.data_version only arrives with migration 6.
+        rebuild_rollups(bump_versions=False)
+
+    @migration(4)
+    def access_path_indexes():
+        # Collapse duplicate budgets (last write wins) before the unique index goes on.
+        keep = db.select(func.max(Budget.id)).group_by(Budget.user_id, Budget.month, Budget.category)
+        Budget.query.filter(Budget.id.notin_(keep)).delete(synchronize_session=False)
+        db.session.commit()
+        create_model_indexes(Job, Shift, Expense, Budget, Receipt, ReceiptItem)
+
+    @migration(5)
+    def sync_columns():
+        now = datetime.utcnow()
+        models = (Job, Shift, Expense, Receipt)
+        # All ALTERs first: they run on their own connection, which SQLite would
+        # block while the session holds the write lock from the backfill below.
+        for model in models:
+            table = model.__tablename__
+            add_missing_columns(table, {'updated_at': f'ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP'})
+        for model in models:
+            stamped = db.table(model.__tablename__, db.column('updated_at'))
+            db.session.execute(stamped.update().where(stamped.c.updated_at.is_(None)).values(updated_at=now))
+        db.session.commit()
+        create_model_indexes(Job, Shift, Expense, Receipt, Tombstone)
+
+    @migration(6)
+    def user_data_version():
+        add_missing_columns('user', {
+            'data_version': 'ALTER TABLE "user" ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'
+        })
+
+    @migration(7)
+    def recurring_shifts():
+        RecurringShift.__table__.create(bind=db.engine, checkfirst=True)
+
+    @migration(8)
+    def job_wage_rules_columns():
+        add_missing_columns('job', {
+            'night_start': 'ALTER TABLE job ADD COLUMN night_start VARCHAR(10)',
+            'night_end': 'ALTER TABLE job ADD COLUMN night_end VARCHAR(10)',
+            'night_multiplier': 'ALTER TABLE job ADD COLUMN night_multiplier FLOAT',
+            'overtime_threshold': 'ALTER TABLE job ADD COLUMN overtime_threshold FLOAT',
+            'overtime_multiplier': 'ALTER TABLE job ADD COLUMN overtime_multiplier FLOAT',
+        })
+
+    @migration(9)
+    def search_index():
+        create_search_index()
+        rebuild_search_index()
+
+    @migration(10)
+    def user_sessions():
+        UserSession.__table__.create(bind=db.engine, checkfirst=True)
+
+    @migration(11)
+    def daily_rollup_unique_key():
+        # Rebuilding first collapses any duplicate rows left by concurrent
+        # read-modify-write updates, so the unique index can be created.
+        rebuild_rollups()
+        db.session.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS uq_daily_rollup_key ON daily_rollup ({ROLLUP_KEY})'))
+
+    @migration(12)
+    def shift_client_priced_column():
+        add_missing_columns('shift', {
+            'client_priced': 'ALTER TABLE shift ADD COLUMN client_priced BOOLEAN NOT NULL DEFAULT FALSE',
+        })
+
+    @payflow_cli.command('recompute-wages')
+    def recompute_wages_command():
+        """Re-price every job's shifts from the job's current rate and rules."""
+        total = 0
+        for job in Job.query.order_by(Job.id).all():
+            total += recompute_job_wages(job)
+            # Report and budget ETags and cache keys carry the data version.
+            bump_data_version(job.user_id)
+            db.session.commit()
+        print(f'Re-priced {total} shifts.')
+
+    @payflow_cli.command('prune-tombstones')
+    def prune_tombstones_command():
+        """Delete sync tombstones older than the retention window."""
+        cutoff = datetime.utcnow() - SYNC_TOMBSTONE_RETENTION
+        removed = Tombstone.query.filter(Tombstone.deleted_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        print(f'Removed {removed} tombstones.')
+
+    @payflow_cli.command('sweep-sessions')
+    def sweep_sessions_command():
+        """Delete expired server-side sessions."""
+        if session_store is None:
+            print('SESSION_BACKEND is cookie; nothing to sweep.')
+            return
+        print(f'Removed {session_store.sweep(datetime.utcnow())} expired sessions.')
+
+    class SchemaMigration(db.Model):
+        __tablename__ = 'schema_migrations'
+        version = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(100), nullable=False)
+        applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def run_migrations():
+        applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+        for version, fn in sorted(migrations, key=lambda item: item[0]):
+            if version in applied:
+                continue
+            try:
+                fn()
+            except Exception as exc:
+                # Later migrations may depend on this one, and code expecting
+                # the new schema must not serve on a half-migrated database.
+                db.session.rollback()
+                print(f"[ERROR] Migration {version:04d} {fn.__name__} failed: {exc}")
+                raise
+            db.session.add(SchemaMigration(version=version, name=fn.__name__))
+            db.session.commit()
+            print(f"[INFO] Applied migration {version:04d} {fn.__name__}")
+
+    schema_version = max(version for version, _ in migrations)
+
+    def current_schema_version():
+        try:
+            return db.session.query(func.max(SchemaMigration.version)).scalar() or 0
+        except Exception:
+            db.session.rollback()
+            return 0
+
+    def migrate():
+        db.create_all()
+        run_migrations()
+
+    @payflow_cli.command('migrate')
+    def migrate_command():
+        """Create tables and apply pending schema migrations."""
+        try:
+            migrate()
+        except Exception as exc:
+            # A non-zero exit fails the release step, so the new code is not deployed.
+            raise click.ClickException(f'Schema migration failed: {exc}') from exc
+        print(f'Schema is at version {current_schema_version()} (expected {schema_version}).')
+
+    app.cli.add_command(payflow_cli)
+
+    # Worker boot only reads the version marker; the heavy lifting lives in
+    # `flask payflow migrate` so restarts stay cheap regardless of table size.
+    with app.app_context():
+        if current_schema_version() < schema_version:
+            if app.config['AUTO_MIGRATE']:
+                # A failure propagates so the worker does not boot on a half-migrated schema.
+                migrate()
+            else:
+                print(f"[WARN] Database schema is behind (expected version {schema_version}); "
+                      "run `flask --app app payflow migrate`.")
 
     # Expose db and models if needed elsewhere
     app.db = db
     app.User = User
     app.Shift = Shift
+    app.RecurringShift = RecurringShift
     app.Job = Job
     app.Expense = Expense
     app.Budget = Budget
     app.Receipt = Receipt
     app.ReceiptItem = ReceiptItem
+    app.DailyRollup = DailyRollup
+    app.UserSession = UserSession
+    app.report_cache = report_cache
+    app.rebuild_rollups = rebuild_rollups
+    app.rebuild_search_index = rebuild_search_index
     return app
 
 
@@ -0,0 +1,331 @@
+"""Benchmark the PayFlow API against a synthetic data set.
+
+Each data size runs in its own process: a temporary SQLite file is created,
+the app is imported against it, one user is seeded with jobs, shifts,
+expenses, budgets and receipts, and every scenario is driven through the
+Flask test client. Results (p50/p95 latency, queries per request and peak
+RSS) are written as JSON so two runs can be diffed.
+
+    python bench.py --sizes 1000,10000,100000 --output bench.json
+    python bench.py --compare old.json new.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, event, insert, update
+
+CATEGORIES = ('food', 'rent', 'transport', 'utilities', 'entertainment', 'other')
+WORDS = ('coffee', 'lunch', 'train', 'bus', 'rent', 'book', 'movie', 'phone',
+         'electricity', 'groceries', 'snacks', 'taxi', 'gift', 'gym')
+SHIFT_TIMES = (('09:00', '17:00'), ('10:00', '15:00'), ('18:00', '23:00'), ('22:00', '06:00'))
+INSERT_BATCH = 5000
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def bulk_insert(app, model, rows):
+    db = app.db
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(model), rows[start:start + INSERT_BATCH])
+    db.session.commit()
+
+
+def seed(app, client, rows, seed_value=1):
+    """Create one user and ``rows`` shifts and expenses (plus jobs, budgets and
+    receipts in proportion). Returns the user id."""
+    rng = random.Random(seed_value)
+    client.post('/signup', data={'username': 'bench', 'password': 'bench-password'})
+    client.post('/login', data={'username': 'bench', 'password': 'bench-password'})
+
+    with app.app_context():
+        user_id = app.User.query.filter_by(username='bench').one().id
+        now = datetime.utcnow()
+        today = date.today()
+        span = max(365, rows // 20)
+
+        def random_day():
+            return today - timedelta(days=rng.randint(0, span))
+
+        job_count = max(3, min(20, rows // 500))
+        bulk_insert(app, app.Job, [{
+            'name': f'Job {n}', 'hourly_wage': rng.choice((1000, 1100, 1250, 1500)),
+            'currency': '¥', 'color': f'#{rng.randrange(0x1000000):06x}',
+            'updated_at': now, 'user_id': user_id,
+        } for n in range(job_count)])
+        jobs = app.db.session.query(app.Job.id, app.Job.hourly_wage).filter_by(user_id=user_id).all()
+
+        shifts = []
+        for _ in range(rows):
+            day = random_day()
+            job_id, wage = rng.choice(jobs)
+            start, end = rng.choice(SHIFT_TIMES)
+            total = int(wage * 8)
+            shifts.append({
+                'date': day.isoformat(), 'work_date': day, 'shift_type': 'regular',
+                'start_time': start, 'end_time': end, 'break_start': '', 'break_end': '',
+                'total_hours': '8.00', 'hourly_wage': str(int(wage)), 'currency': '¥',
+                'total_wage': str(total), 'wage_amount': total,
+                'job_id': job_id, 'user_id': user_id, 'updated_at': now,
+            })
+        bulk_insert(app, app.Shift, shifts)
+
+        expenses = []
+        for _ in range(rows):
+            day = random_day()
+            expenses.append({
+                'date': day.isoformat(), 'expense_date': day, 'category': rng.choice(CATEGORIES),
+                'amount': float(rng.randint(100, 20000)),
+                'description': ' '.join(rng.sample(WORDS, 2)),
+                'user_id': user_id, 'updated_at': now,
+            })
+        bulk_insert(app, app.Expense, expenses)
+
+        months = sorted({(today - timedelta(days=30 * n)).strftime('%Y-%m') for n in range(12)})
+        bulk_insert(app, app.Budget, [{
+            'month': month, 'category': category, 'amount': float(rng.randint(10, 100) * 1000),
+            'user_id': user_id,
+        } for month in months for category in CATEGORIES])
+
+        receipt_count = max(10, rows // 10)
+        receipts = []
+        for n in range(receipt_count):
+            day = random_day()
+            receipts.append({
+                'title': f'Receipt {n}', 'date': day.isoformat(), 'receipt_date': day,
+                'subtotal': 0.0, 'tax_total': 0.0, 'grand_total': 0.0,
+                'created_at': now, 'updated_at': now, 'user_id': user_id,
+            })
+        bulk_insert(app, app.Receipt, receipts)
+        receipt_rows = app.db.session.query(app.Receipt.id, app.Receipt.date).filter_by(user_id=user_id).all()
+        items = []
+        totals = {}
+        for receipt_id, receipt_date in receipt_rows:
+            for _ in range(3):
+                quantity = rng.randint(1, 3)
+                unit_price = float(rng.randint(100, 3000))
+                line_total = round(quantity * unit_price * 1.1, 2)
+                items.append({
+                    'date': receipt_date, 'category': rng.choice(CATEGORIES),
+                    'description': rng.choice(WORDS), 'quantity': quantity,
+                    'unit_price': unit_price, 'tax_rate': 10.0, 'line_total': line_total,
+                    'receipt_id': receipt_id,
+                })
+                totals[receipt_id] = totals.get(receipt_id, 0.0) + line_total
+        bulk_insert(app, app.ReceiptItem, items)
+        receipt_table = app.Receipt.__table__
+        app.db.session.execute(update(receipt_table).where(
+            receipt_table.c.id == bindparam('receipt_id')
+        ).values(subtotal=bindparam('total'), grand_total=bindparam('total')),
+            [{'receipt_id': rid, 'total': total} for rid, total in totals.items()])
+        app.db.session.commit()
+
+        app.rebuild_rollups(user_id)
+        app.rebuild_search_index(user_id)
+    return user_id
+
+
+def read_scenarios(month):
+    return [
+        ('GET /api/report', '/api/report'),
+        ('GET /api/report (90 days)', f'/api/report?start={(date.today() - timedelta(days=90)).isoformat()}'),
+        ('GET /api/shifts', '/api/shifts'),
+        ('GET /api/shifts?limit=100', '/api/shifts?limit=100'),
+        ('GET /api/expenses', '/api/expenses'),
+        ('GET /api/expenses?limit=100', '/api/expenses?limit=100'),
+        ('GET /api/receipts?limit=100', '/api/receipts?limit=100'),
+        ('GET /api/jobs', '/api/jobs'),
+        ('GET /api/budgets', '/api/budgets'),
+        ('GET /api/budgets/status', f'/api/budgets/status?month={month}'),
+        ('GET /api/calendar', f'/api/calendar?month={month}'),
+        ('GET /api/search', '/api/search?q=coffee'),
+        ('GET /api/sync', '/api/sync'),
+        ('GET /api/export shifts', '/api/export?dataset=shifts'),
+        ('GET /api/export expenses', '/api/export?dataset=expenses'),
+    ]
+
+
+def write_scenarios(job_id, month):
+    today = date.today().isoformat()
+    return [
+        ('POST /api/shifts', 'POST', '/api/shifts', {
+            'date': today, 'job_id': job_id, 'start_time': '09:00', 'end_time': '17:00',
+            'shift_type': 'regular'}),
+        ('POST /api/expenses', 'POST', '/api/expenses', {
+            'date': today, 'category': 'food', 'amount': 1200, 'description': 'bench lunch'}),
+        ('POST /api/receipts', 'POST', '/api/receipts', {
+            'title': 'Bench', 'date': today, 'items': [
+                {'category': 'food', 'description': 'coffee', 'quantity': 2,
+                 'unit_price': 400, 'tax_rate': 8},
+                {'category': 'other', 'description': 'book', 'quantity': 1,
+                 'unit_price': 1800, 'tax_rate': 10}]}),
+        ('POST /api/budgets', 'POST', '/api/budgets', {
+            'month': month, 'category': 'food', 'amount': 50000}),
+    ]
+
+
+def measure(app, call, iterations, warmup):
+    counter = {'queries': 0}
+
+    def count(*args):
+        counter['queries'] += 1
+
+    db = app.db
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(warmup):
+            call()
+        timings = []
+        queries = []
+        status = None
+        for _ in range(iterations):
+            counter['queries'] = 0
+            started = time.perf_counter()
+            status = call()
+            timings.append((time.perf_counter() - started) * 1000.0)
+            queries.append(counter['queries'])
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return {
+        'status': status,
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+    }
+
+
+def run_size(rows, iterations, warmup, cache_backend):
+    workdir = tempfile.mkdtemp(prefix='payflow-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.sqlite3')
+    os.environ['CACHE_BACKEND'] = cache_backend
+    os.environ.setdefault('RECEIPT_PDF_CACHE_DIR', os.path.join(workdir, 'receipt_pdfs'))
+    try:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import app as payflow
+
+        app = payflow.app
+        client = app.test_client()
+        started = time.perf_counter()
+        seed(app, client, rows)
+        seed_seconds = round(time.perf_counter() - started, 2)
+
+        with app.app_context():
+            job_id = app.db.session.query(app.Job.id).order_by(app.Job.id).first()[0]
+        month = date.today().strftime('%Y-%m')
+        results = {}
+
+        for name, url in read_scenarios(month):
+            def call(url=url):
+                response = client.get(url)
+                response.get_data()  # drain streamed bodies such as the CSV export
+                return response.status_code
+            results[name] = measure(app, call, iterations, warmup)
+
+        for name, method, url, payload in write_scenarios(job_id, month):
+            def call(method=method, url=url, payload=payload):
+                return client.open(url, method=method, json=payload).status_code
+            results[name] = measure(app, call, iterations, warmup)
+
+        def delete_expense():
+            created = client.post('/api/expenses', json={
+                'date': date.today().isoformat(), 'category': 'food', 'amount': 1})
+            return client.delete(f"/api/expenses/{created.get_json()['id']}").status_code
+        results['POST+DELETE /api/expenses'] = measure(app, delete_expense, iterations, warmup)
+
+        return {
+            'rows': rows,
+            'seed_seconds': seed_seconds,
+            'peak_rss_mb': peak_rss_mb(),
+            'scenarios': results,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(old_path, new_path):
+    with open(old_path) as fh:
+        old = {run['rows']: run for run in json.load(fh)['runs']}
+    with open(new_path) as fh:
+        new = {run['rows']: run for run in json.load(fh)['runs']}
+    for rows in sorted(set(old) & set(new)):
+        print(f'== {rows} rows: peak RSS {old[rows]["peak_rss_mb"]} -> {new[rows]["peak_rss_mb"]} MB')
+        for name, after in new[rows]['scenarios'].items():
+            before = old[rows]['scenarios'].get(name)
+            if not before:
+                continue
+            change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            print(f'{name:34} p95 {before["p95_ms"]:9.2f} -> {after["p95_ms"]:9.2f} ms ({change:+6.1f}%)  '
+                  f'queries {before["queries_per_request"]:g} -> {after["queries_per_request"]:g}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated row counts for shifts and expenses (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--cache', default='none', choices=('none', 'memory'),
+                        help='report cache backend while measuring (default: %(default)s)')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='print the p95 difference between two result files and exit')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    runs = []
+    # A fresh interpreter per size keeps peak RSS and the app's caches per size.
+    context = multiprocessing.get_context('spawn')
+    for rows in sizes:
+        print(f'[INFO] Benchmarking {rows} rows...')
+        with context.Pool(1) as pool:
+            run = pool.apply(run_size, (rows, args.iterations, args.warmup, args.cache))
+        for name, result in run['scenarios'].items():
+            print(f"  {name:34} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"queries {result['queries_per_request']:g}")
+        print(f"  seeded in {run['seed_seconds']}s, peak RSS {run['peak_rss_mb']} MB")
+        runs.append(run)
+
+    with open(args.output, 'w') as fh:
+        json.dump({
+            'created_at': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'cache': args.cache,
+            'runs': runs,
+        }, fh, indent=2)
+    print(f'[INFO] Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
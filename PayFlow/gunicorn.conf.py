@@ -0,0 +1,61 @@
+"""Gunicorn settings for PayFlow (loaded automatically from the working directory).
+
+Every value can be overridden from the environment:
+
+    WEB_CONCURRENCY       worker processes (default: sized from CPUs and the DB pool)
+    GUNICORN_THREADS      threads per gthread worker (default 4)
+    GUNICORN_WORKER_CLASS gthread (default), sync or gevent
+    DB_MAX_CONNECTIONS    connections the database accepts from this service;
+                          caps workers so their pools never exceed it
+    PORT                  listen port (Render/Heroku set this)
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Import the app (and run create_app's boot-time migration check) once in the
+# master; workers fork with the code already loaded.
+preload_app = True
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Each thread can hold one pooled connection at a time, so a worker never
+# needs more threads than its pool can hand out.
+_pool_capacity = int(os.getenv('DB_POOL_SIZE', '5')) + int(os.getenv('DB_MAX_OVERFLOW', '10'))
+threads = min(int(os.getenv('GUNICORN_THREADS', '4')), _pool_capacity)
+if worker_class == 'gevent':
+    # Greenlets, not threads; psycopg2 additionally needs psycogreen patched in.
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '100'))
+
+
+def _default_workers():
+    workers = multiprocessing.cpu_count() * 2 + 1
+    max_connections = int(os.getenv('DB_MAX_CONNECTIONS', '0') or 0)
+    if max_connections:
+        workers = min(workers, max_connections // _pool_capacity)
+    return max(workers, 1)
+
+
+workers = int(os.getenv('WEB_CONCURRENCY', '0') or 0) or _default_workers()
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks (e.g. the in-process report cache
+# under an unusual key mix) cannot grow without bound.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # The master opened connections while preloading (migration check); a
+    # socket shared across forks corrupts the protocol stream, so each worker
+    # drops the inherited pool without closing the parent's connections.
+    from app import app
+
+    with app.app_context():
+        app.db.engine.dispose(close=False)
@@ -0,0 +1,230 @@
+"""Drive a running PayFlow server with N concurrent simulated users.
+
+Each user signs up, logs in, creates a job and then loops over a weighted
+mix of report reads, shift posts, shift list reads and re-logins until the
+duration is up. Only the standard library is used: requests go over plain
+asyncio streams with keep-alive, one connection per user.
+
+    gunicorn -c gunicorn.conf.py app:app &
+    python loadtest.py --url http://127.0.0.1:8000 --users 50 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+# (operation, weight) for each step of a user's loop.
+SCENARIO = (
+    ('report', 50),
+    ('post_shift', 30),
+    ('list_shifts', 15),
+    ('login', 5),
+)
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """Minimal HTTP/1.1 client: one keep-alive connection with a cookie jar."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, content_type=None):
+        for attempt in (0, 1):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                return await self._send(method, path, body, content_type)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _send(self, method, path, body, content_type):
+        headers = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive']
+        if self.cookies:
+            headers.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        payload = body or b''
+        if body is not None:
+            headers += [f'Content-Type: {content_type}', f'Content-Length: {len(payload)}']
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = (await self.reader.readuntil(b'\r\n')).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'set-cookie':
+                cookie_name, _, cookie_value = value.split(';', 1)[0].partition('=')
+                self.cookies[cookie_name] = cookie_value
+            response_headers[name] = value
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        else:
+            data = await self.reader.readexactly(int(response_headers.get('content-length', '0')))
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+class Stats:
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+
+    def record(self, operation, seconds, ok):
+        self.timings.setdefault(operation, []).append(seconds)
+        if not ok:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def timed(stats, operation, conn, method, path, body=None, content_type=None, expect=(200, 201, 302)):
+    started = time.perf_counter()
+    try:
+        status, data = await conn.request(method, path, body, content_type)
+        ok = status in expect
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        status, data, ok = None, b'', False
+    stats.record(operation, time.perf_counter() - started, ok)
+    return status, data
+
+
+def form(**fields):
+    return urlencode(fields).encode(), 'application/x-www-form-urlencoded'
+
+
+def as_json(value):
+    return json.dumps(value).encode(), 'application/json'
+
+
+async def user_session(host, port, deadline, stats, rng):
+    conn = Connection(host, port)
+    username = f'load-{uuid.uuid4().hex[:12]}'
+    password = 'load-test-password'
+    try:
+        await timed(stats, 'signup', conn, 'POST', '/signup', *form(username=username, password=password))
+        await timed(stats, 'login', conn, 'POST', '/login', *form(username=username, password=password))
+        status, data = await timed(stats, 'post_job', conn, 'POST', '/api/jobs',
+                                   *as_json({'name': 'Load test', 'hourly_wage': 1200}))
+        job_id = json.loads(data)['job']['id'] if status == 201 else None
+
+        operations = [name for name, _ in SCENARIO]
+        weights = [weight for _, weight in SCENARIO]
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            if operation == 'report':
+                await timed(stats, operation, conn, 'GET', '/api/report')
+            elif operation == 'post_shift':
+                day = date.today() - timedelta(days=rng.randint(0, 365))
+                await timed(stats, operation, conn, 'POST', '/api/shifts', *as_json({
+                    'date': day.isoformat(), 'job_id': job_id, 'shift_type': 'regular',
+                    'start_time': '09:00', 'end_time': '17:00',
+                }))
+            elif operation == 'list_shifts':
+                await timed(stats, operation, conn, 'GET', '/api/shifts?limit=50')
+            else:
+                await timed(stats, operation, conn, 'POST', '/login', *form(username=username, password=password))
+    finally:
+        await conn.close()
+
+
+async def run(url, users, duration, ramp, seed):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    stats = Stats()
+    rng = random.Random(seed)
+    started = time.monotonic()
+    deadline = started + ramp + duration
+    tasks = []
+    for n in range(users):
+        tasks.append(asyncio.create_task(
+            user_session(host, port, deadline, stats, random.Random(rng.random()))))
+        if ramp:
+            await asyncio.sleep(ramp / users)
+    await asyncio.gather(*tasks)
+    return stats, time.monotonic() - started
+
+
+def summarize(stats, elapsed, users):
+    total = sum(len(samples) for samples in stats.timings.values())
+    summary = {
+        'users': users,
+        'elapsed_seconds': round(elapsed, 2),
+        'requests': total,
+        'errors': sum(stats.errors.values()),
+        'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'operations': {},
+    }
+    for operation, samples in sorted(stats.timings.items()):
+        summary['operations'][operation] = {
+            'requests': len(samples),
+            'errors': stats.errors.get(operation, 0),
+            'p50_ms': round(percentile(samples, 50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds at full load')
+    parser.add_argument('--ramp', type=float, default=5.0, help='seconds to start all users')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the summary as JSON')
+    args = parser.parse_args(argv)
+
+    stats, elapsed = asyncio.run(run(args.url, args.users, args.duration, args.ramp, args.seed))
+    summary = summarize(stats, elapsed, args.users)
+    print(f"{summary['requests']} requests in {summary['elapsed_seconds']}s "
+          f"({summary['throughput_rps']} req/s, {summary['errors']} errors) with {args.users} users")
+    for operation, result in summary['operations'].items():
+        print(f"  {operation:12} n={result['requests']:6}  p50 {result['p50_ms']:8.2f} ms  "
+              f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(summary, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
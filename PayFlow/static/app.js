@@ -22,10 +22,14 @@ let jobs = [];         // server-based jobs
 let expenses = [];     // server-based expenses
 let budgets = [];      // monthly budgets
 let receipts = [];     // stored receipts
+let syncToken = null;  // last /api/sync token; null until the first full sync
+let syncQueued = null;  // sync not yet sent; callers arriving now share it
+let syncRunning = Promise.resolve();  // settles when the last sent sync is merged
 let receiptDraftItems = []; // builder line items
 let currentBudgetMonth = null;
 let calendarState = {
-  current: new Date()
+  current: new Date(),
+  requestId: 0  // guards against an older month's response landing after a newer one
 };
 let lastReportPeriods = null;
 let lastReportCurrency = null;
@@ -1017,6 +1021,68 @@ function ensureAuth(res) {
   return true;
 }
 
+// ==============================
+// Delta sync
+// ==============================
+const compareBy = (...keys) => (a, b) => {
+  for (const [key, direction] of keys) {
+    const left = a[key];
+    const right = b[key];
+    if (left === right) continue;
+    if (left === null || left === undefined) return -direction;
+    if (right === null || right === undefined) return direction;
+    return (left < right ? -1 : 1) * direction;
+  }
+  return 0;
+};
+
+function mergeSyncedRows(current, changed, deletedIds, full, compare) {
+  let rows = full ? [] : current.slice();
+  if (deletedIds && deletedIds.length) {
+    const gone = new Set(deletedIds);
+    rows = rows.filter(row => !gone.has(row.id));
+  }
+  if (changed && changed.length) {
+    const byId = new Map(rows.map(row => [row.id, row]));
+    changed.forEach(row => byId.set(row.id, row));
+    rows = Array.from(byId.values());
+  }
+  return rows.sort(compare);
+}
+
+// Calls made before the queued request is sent share it, so a page load (every
+// loader asking at once) makes one /api/sync request. A call made after it was
+// sent queues the next one, since the request in flight may predate the
+// caller's own write; requests never overlap, so tokens are applied in order.
+function syncData() {
+  if (!syncQueued) {
+    syncQueued = syncRunning.then(() => {
+      syncQueued = null;
+      return fetchSync();
+    });
+    syncRunning = syncQueued.catch(() => {});
+  }
+  return syncQueued;
+}
+
+// Pulls only rows changed since the last sync and merges them into the local
+// collections, keeping the same ordering the list endpoints use.
+async function fetchSync() {
+  const url = new URL('/api/sync', window.location.origin);
+  if (syncToken) url.searchParams.set('since', syncToken);
+  const res = await fetch(url.toString(), { credentials: 'same-origin' });
+  if (!ensureAuth(res)) return 'unauthorized';
+  if (!res.ok) return 'error';
+  const data = await res.json();
+  const deleted = data.deleted || {};
+  shiftHistory = mergeSyncedRows(shiftHistory, data.shifts, deleted.shifts, data.full, compareBy(['id', 1]));
+  jobs = mergeSyncedRows(jobs, data.jobs, deleted.jobs, data.full, compareBy(['name', 1], ['id', 1]));
+  expenses = mergeSyncedRows(expenses, data.expenses, deleted.expenses, data.full, compareBy(['date', -1], ['id', -1]));
+  receipts = mergeSyncedRows(receipts, data.receipts, deleted.receipts, data.full, compareBy(['created_at', -1], ['id', -1]));
+  syncToken = data.token;
+  return 'ok';
+}
+
 // ==============================
 // Init
 // ==============================
@@ -1034,11 +1100,10 @@ document.addEventListener('DOMContentLoaded', async function () {
   currentBudgetMonth = getMonthKey(calendarState.current);
   const budgetMonthInput = document.getElementById('budgetMonth');
   if (budgetMonthInput) budgetMonthInput.value = currentBudgetMonth;
-  await loadJobs();             // load jobs first
-  await loadShifts();           // then shifts
-  await loadExpenses();         // then expenses
+  // One shared /api/sync fills every collection; the loaders then render in
+  // this order (jobs first, so shift rows can show job names).
+  await Promise.all([loadJobs(), loadShifts(), loadExpenses(), loadReceipts()]);
   await loadBudgets(currentBudgetMonth);
-  await loadReceipts();
   updateHistorySummary();
   renderCalendar();
 });
@@ -1462,18 +1527,12 @@ function setCurrentDate() {
 // Jobs (CRUD)
 // ==============================
 async function loadJobs() {
-  const res = await fetch('/api/jobs', { credentials: 'same-origin' });
-  if (!ensureAuth(res)) {
+  if (await syncData() === 'unauthorized') {
     jobs = [];
     renderJobsTable();
     populateJobSelects();
     return;
   }
-  if (res.ok) {
-    jobs = await res.json();
-  } else {
-    jobs = [];
-  }
   renderJobsTable();
   populateJobSelects();
 }
@@ -1586,18 +1645,12 @@ async function deleteJob(id) {
 // Shifts (History)
 // ==============================
 async function loadShifts() {
-  const res = await fetch('/api/shifts', { credentials: 'same-origin' });
-  if (!ensureAuth(res)) {
+  if (await syncData() === 'unauthorized') {
     shiftHistory = [];
     renderHistoryTable();
     updateHistorySummary();
     return;
   }
-  if (res.ok) {
-    shiftHistory = await res.json();
-  } else {
-    shiftHistory = [];
-  }
   renderHistoryTable();
   updateHistorySummary();
   renderCalendar();
@@ -1685,7 +1738,76 @@ function changeCalendarMonth(offset) {
   renderCalendar();
 }
 
-function renderCalendar() {
+// Per-day summaries for a month, in the /api/calendar shape. Built from the
+// locally synced arrays only when the server cannot be reached (offline PWA).
+function localCalendarMonth(monthKey) {
+  const days = {};
+  const bucket = (dateIso) => {
+    if (!days[dateIso]) {
+      days[dateIso] = {
+        shift_count: 0, hours: 0, income: 0, currency: null, job_colors: [], shifts: [],
+        expense_count: 0, expense_total: 0, expense_categories: []
+      };
+    }
+    return days[dateIso];
+  };
+  shiftHistory.filter(s => (s.date || '').startsWith(monthKey)).forEach(shift => {
+    const cell = bucket(shift.date);
+    const color = shift.job_color || '#4f46e5';
+    cell.shift_count += 1;
+    cell.hours += parseFloat(shift.total_hours) || 0;
+    cell.income += parseFloat(shift.total_wage) || 0;
+    cell.currency = cell.currency || shift.currency || null;
+    if (!cell.job_colors.includes(color)) cell.job_colors.push(color);
+    if (cell.shifts.length < 2) {
+      cell.shifts.push({ job_name: shift.job_name, job_color: color, start_time: shift.start_time, end_time: shift.end_time });
+    }
+  });
+  expenses.filter(e => (e.date || '').startsWith(monthKey)).forEach(expense => {
+    const cell = bucket(expense.date);
+    cell.expense_count += 1;
+    cell.expense_total += Number(expense.amount) || 0;
+    if (cell.expense_categories.length < 4) cell.expense_categories.push(expense.category);
+  });
+  return { month: monthKey, days };
+}
+
+async function fetchCalendarMonth(monthKey) {
+  try {
+    const res = await fetch(`/api/calendar?month=${monthKey}`, { credentials: 'same-origin' });
+    if (!ensureAuth(res)) return null;
+    if (res.ok) return await res.json();
+  } catch (err) {
+    console.warn('[Calendar] Falling back to local data.', err);
+  }
+  return localCalendarMonth(monthKey);
+}
+
+async function fetchCalendarDay(dateIso) {
+  try {
+    const [shiftRes, expenseRes] = await Promise.all([
+      fetch(`/api/shifts?expand=recurring&from=${dateIso}&to=${dateIso}`, { credentials: 'same-origin' }),
+      fetch(`/api/expenses?from=${dateIso}&to=${dateIso}`, { credentials: 'same-origin' })
+    ]);
+    if (!ensureAuth(shiftRes) || !ensureAuth(expenseRes)) return null;
+    if (shiftRes.ok && expenseRes.ok) {
+      return { shifts: await shiftRes.json(), expenses: await expenseRes.json() };
+    }
+  } catch (err) {
+    console.warn('[Calendar] Falling back to local data.', err);
+  }
+  return {
+    shifts: shiftHistory.filter(s => s.date === dateIso),
+    expenses: expenses.filter(e => e.date === dateIso)
+  };
+}
+
+async function openCalendarDay(dateIso) {
+  const day = await fetchCalendarDay(dateIso);
+  if (day) showCalendarDetails(dateIso, day.shifts, day.expenses);
+}
+
+async function renderCalendar() {
   const grid = document.getElementById('calendarGrid');
   const legend = document.getElementById('calendarLegend');
   if (!grid || !legend) return;
@@ -1707,6 +1829,10 @@ function renderCalendar() {
   const firstWeekday = new Date(current.getFullYear(), current.getMonth(), 1).getDay();
   const daysInMonth = new Date(current.getFullYear(), current.getMonth() + 1, 0).getDate();
 
+  const requestId = ++calendarState.requestId;
+  const month = await fetchCalendarMonth(getMonthKey(current));
+  if (!month || requestId !== calendarState.requestId) return;
+
   grid.innerHTML = '';
 
   const addPlaceholder = () => {
@@ -1722,8 +1848,7 @@ function renderCalendar() {
 
   for (let day = 1; day <= daysInMonth; day += 1) {
     const dateIso = `${current.getFullYear()}-${String(current.getMonth() + 1).padStart(2, '0')}-${String(day).padStart(2, '0')}`;
-    const dayShifts = shiftHistory.filter(s => s.date === dateIso);
-    const dayExpenses = expenses.filter(e => e.date === dateIso);
+    const summary = month.days[dateIso] || { shift_count: 0, expense_count: 0, shifts: [], expense_categories: [] };
 
     const cell = document.createElement('div');
     cell.className = 'calendar-cell border border-gray-200 rounded bg-white p-2 min-h-[110px] flex flex-col gap-2 cursor-pointer hover:shadow-sm transition';
@@ -1733,7 +1858,7 @@ function renderCalendar() {
     if (dateIso === todayIso) {
       cell.classList.add('ring', 'ring-blue-200');
     }
-    if (dayShifts.length === 0 && dayExpenses.length === 0) {
+    if (summary.shift_count === 0 && summary.expense_count === 0) {
       cell.classList.add('calendar-cell--empty');
     }
 
@@ -1743,20 +1868,19 @@ function renderCalendar() {
     dayNumber.textContent = day;
     header.appendChild(dayNumber);
 
-    if (dayShifts.length > 0) {
-      const wageTotal = dayShifts.reduce((acc, s) => acc + (parseFloat(s.total_wage) || 0), 0);
+    if (summary.shift_count > 0) {
       const wageDisplay = document.createElement('span');
       wageDisplay.className = 'text-xs font-semibold text-blue-600';
-      const symbol = dayShifts[0]?.currency || getCurrencySymbol();
-      wageDisplay.textContent = `${symbol}${Math.round(wageTotal).toLocaleString()}`;
+      const symbol = summary.currency || getCurrencySymbol();
+      wageDisplay.textContent = `${symbol}${Math.round(summary.income).toLocaleString()}`;
       header.appendChild(wageDisplay);
     }
     cell.appendChild(header);
 
-    if (dayShifts.length > 0) {
+    if (summary.shift_count > 0) {
       const shiftList = document.createElement('div');
       shiftList.className = 'flex flex-col gap-1';
-      dayShifts.slice(0, 2).forEach(shift => {
+      summary.shifts.forEach(shift => {
         const shiftChip = document.createElement('div');
         shiftChip.className = 'text-xs text-white rounded px-2 py-1';
         shiftChip.style.background = shift.job_color || '#4f46e5';
@@ -1764,37 +1888,37 @@ function renderCalendar() {
         shiftChip.textContent = `${jobName} • ${shift.start_time} - ${shift.end_time}`;
         shiftList.appendChild(shiftChip);
       });
-      if (dayShifts.length > 2) {
+      if (summary.shift_count > summary.shifts.length) {
         const extra = document.createElement('span');
         extra.className = 'text-[11px] text-gray-500';
-        extra.textContent = `+${dayShifts.length - 2} more`;
+        extra.textContent = `+${summary.shift_count - summary.shifts.length} more`;
         shiftList.appendChild(extra);
       }
       cell.appendChild(shiftList);
     }
 
-    if (dayExpenses.length > 0) {
+    if (summary.expense_count > 0) {
       const iconRow = document.createElement('div');
       iconRow.className = 'flex flex-wrap gap-1 text-lg';
-      dayExpenses.slice(0, 4).forEach(expense => {
+      summary.expense_categories.forEach(category => {
         const icon = document.createElement('span');
-        icon.textContent = expenseCategoryIcons[expense.category] || expenseCategoryIcons.other;
+        icon.textContent = expenseCategoryIcons[category] || expenseCategoryIcons.other;
         iconRow.appendChild(icon);
       });
-      if (dayExpenses.length > 4) {
+      if (summary.expense_count > summary.expense_categories.length) {
         const extra = document.createElement('span');
         extra.className = 'text-xs text-gray-500';
-        extra.textContent = `+${dayExpenses.length - 4}`;
+        extra.textContent = `+${summary.expense_count - summary.expense_categories.length}`;
         iconRow.appendChild(extra);
       }
       cell.appendChild(iconRow);
     }
 
-    cell.addEventListener('click', () => showCalendarDetails(dateIso, dayShifts, dayExpenses));
+    cell.addEventListener('click', () => openCalendarDay(dateIso));
     cell.addEventListener('keypress', (evt) => {
       if (evt.key === 'Enter' || evt.key === ' ') {
         evt.preventDefault();
-        showCalendarDetails(dateIso, dayShifts, dayExpenses);
+        openCalendarDay(dateIso);
       }
     });
 
@@ -1901,8 +2025,7 @@ function handleCalendarDetailsAction(event) {
 // Expenses (CRUD + Dashboard)
 // ==============================
 async function loadExpenses() {
-  const res = await fetch('/api/expenses', { credentials: 'same-origin' });
-  if (!ensureAuth(res)) {
+  if (await syncData() === 'unauthorized') {
     expenses = [];
     renderExpensesTable();
     updateExpenseDashboard();
@@ -1911,11 +2034,6 @@ async function loadExpenses() {
     updateBudgetAlerts();
     return;
   }
-  if (res.ok) {
-    expenses = await res.json();
-  } else {
-    expenses = [];
-  }
   renderExpensesTable();
   updateExpenseDashboard();
   renderCalendar();
@@ -2404,17 +2522,11 @@ async function downloadReceiptBuilderPdf() {
 }
 
 async function loadReceipts() {
-  const res = await fetch('/api/receipts', { credentials: 'same-origin' });
-  if (!ensureAuth(res)) {
+  if (await syncData() === 'unauthorized') {
     receipts = [];
     renderSavedReceipts();
     return;
   }
-  if (res.ok) {
-    receipts = await res.json();
-  } else {
-    receipts = [];
-  }
   renderSavedReceipts();
 }
 
@@ -2465,7 +2577,34 @@ function handleSavedReceiptsClick(event) {
   }
 }
 
+async function downloadServerReceiptPdf(receiptId) {
+  // The server renders (and caches) the PDF with a subset font, so the client
+  // skips downloading the full CJK font. Unsupported languages or a missing
+  // server font fall back to the jsPDF renderer.
+  const url = new URL(`${location.origin}/api/receipts/${receiptId}/pdf/download`);
+  url.searchParams.set('lang', settings.language || 'en');
+  url.searchParams.set('currency', getCurrencySymbol());
+  try {
+    const res = await fetch(url.toString(), { credentials: 'same-origin' });
+    if (!ensureAuth(res)) return true;
+    if (!res.ok) return false;
+    const blob = await res.blob();
+    const link = document.createElement('a');
+    link.href = URL.createObjectURL(blob);
+    link.download = `receipt-${receiptId}.pdf`;
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    setTimeout(() => URL.revokeObjectURL(link.href), 1000);
+    return true;
+  } catch (err) {
+    console.warn('[PDF] Server-side PDF failed; rendering in the browser.', err);
+    return false;
+  }
+}
+
 async function downloadSavedReceipt(receiptId) {
+  if (await downloadServerReceiptPdf(receiptId)) return;
   const res = await fetch(`/api/receipts/${receiptId}/pdf`, { credentials: 'same-origin' });
   if (!ensureAuth(res)) return;
   if (!res.ok) {
@@ -2770,11 +2909,24 @@ function calculateWage() {
       hourly_wage: hourlyWage,
       currency,
       total_wage: Math.round(totalWage),
-      job_id: jobId
+      job_id: jobId,
+      custom_pay: hasCustomPaySettings()
     });
   }
 }
 
+// True when the user's own pay settings changed the total. The server then
+// keeps this total for job shifts instead of pricing them from the job.
+function hasCustomPaySettings() {
+  return Boolean(
+    advancedSettings.enableNightShift ||
+    advancedSettings.enableOvertime ||
+    parseFloat(advancedSettings.mealAllowance || 0) > 0 ||
+    parseFloat(advancedSettings.transportAllowance || 0) > 0 ||
+    parseFloat(advancedSettings.weekendBonus || 0) > 0
+  );
+}
+
 function timeToMinutes(t) {
   const [h, m] = t.split(':').map(Number);
   return h * 60 + m;
@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py builds a module-level app on import; point it at a throwaway database
+# and a cheap hash so importing it here never touches db.sqlite3.
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='payflow-tests-'), 'import.db')
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as payflow  # noqa: E402
+
+# Any request issuing more statements than this fails the test (see
+# enforce_query_budget), so N+1 regressions show up here first.
+QUERY_BUDGET = 20
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'payflow.db'}"
+
+
+@pytest.fixture
+def make_app(database_url, monkeypatch):
+    """Build a fresh app on this test's database (after any setup the test did on it)."""
+    apps = []
+
+    def factory(**env):
+        monkeypatch.setenv('DATABASE_URL', database_url)
+        monkeypatch.setenv('QUERY_BUDGET', str(QUERY_BUDGET))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        app = payflow.create_app()
+        app.config['TESTING'] = True
+        apps.append(app)
+        return app
+
+    yield factory
+    for app in apps:
+        with app.app_context():
+            app.db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+def _log_in(app, username='alice', password='correct horse'):
+    client = app.test_client()
+    client.post('/signup', data={'username': username, 'password': password})
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def login():
+    """Sign up and log in a user on ``app``; returns their test client."""
+    return _log_in
+
+
+@pytest.fixture
+def client(app):
+    return _log_in(app)
+
+
+@pytest.fixture
+def job(client):
+    response = client.post('/api/jobs', json={'name': 'Cafe', 'hourly_wage': 1000})
+    assert response.status_code == 201
+    return response.get_json()['job']
@@ -0,0 +1,92 @@
+"""Budget writes and the budget-vs-actual status endpoint."""
+import threading
+from datetime import date
+
+MONTH = date.today().strftime('%Y-%m')
+TODAY = date.today().isoformat()
+
+
+def test_saving_a_budget_twice_updates_it(app, client):
+    first = client.post('/api/budgets', json={'month': MONTH, 'category': 'food', 'amount': 1000}).get_json()
+    second = client.post('/api/budgets', json={'month': MONTH, 'category': 'food', 'amount': 1500}).get_json()
+    assert second['id'] == first['id']
+    assert second['amount'] == 1500
+    with app.app_context():
+        assert app.Budget.query.count() == 1
+
+
+def test_concurrent_saves_of_one_budget_do_not_fail(app, client):
+    client.post('/api/budgets', json={'month': MONTH, 'category': 'warmup', 'amount': 1})
+    cookies = {cookie.key: cookie.value for cookie in client._cookies.values()}
+    statuses = []
+
+    def save(amount):
+        worker = app.test_client()
+        for name, value in cookies.items():
+            worker.set_cookie(name, value)
+        statuses.append(worker.post('/api/budgets', json={
+            'month': MONTH, 'category': 'rent', 'amount': amount
+        }).status_code)
+
+    threads = [threading.Thread(target=save, args=(amount,)) for amount in range(100, 900, 100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * len(threads)
+    with app.app_context():
+        assert app.Budget.query.filter_by(category='rent').count() == 1
+
+
+def status(client, month='2024-03'):
+    response = client.get('/api/budgets/status', query_string={'month': month})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_status_compares_budgets_with_spending(client):
+    client.post('/api/budgets', json={'month': '2024-03', 'category': 'food', 'amount': 1000})
+    client.post('/api/budgets', json={'month': '2024-03', 'category': 'rent', 'amount': 5000})
+    client.post('/api/budgets', json={'month': '2024-04', 'category': 'food', 'amount': 99})
+    for day, category, amount in (('2024-03-01', 'food', 300), ('2024-03-31', 'food', 450),
+                                  ('2024-03-15', 'travel', 200), ('2024-04-01', 'food', 7000),
+                                  ('2024-02-29', 'food', 7000)):
+        client.post('/api/expenses', json={'date': day, 'category': category, 'amount': amount})
+
+    payload = status(client)
+    assert payload['month'] == '2024-03'
+    assert payload['categories'] == [
+        {'category': 'food', 'budget': 1000.0, 'spent': 750.0, 'remaining': 250.0, 'percent_used': 75.0},
+        {'category': 'rent', 'budget': 5000.0, 'spent': 0.0, 'remaining': 5000.0, 'percent_used': 0.0},
+        # Spending without a budget still shows up, with no percentage.
+        {'category': 'travel', 'budget': 0.0, 'spent': 200.0, 'remaining': -200.0, 'percent_used': None},
+    ]
+    assert payload['totals'] == {'budget': 6000.0, 'spent': 950.0, 'remaining': 5050.0, 'percent_used': 15.8}
+
+
+def test_status_follows_expense_changes(client):
+    client.post('/api/budgets', json={'month': '2024-03', 'category': 'food', 'amount': 1000})
+    expense_id = client.post('/api/expenses', json={
+        'date': '2024-03-10', 'category': 'food', 'amount': 400}).get_json()['id']
+    assert status(client)['totals']['spent'] == 400
+
+    client.delete(f'/api/expenses/{expense_id}')
+    assert status(client)['categories'] == [
+        {'category': 'food', 'budget': 1000.0, 'spent': 0.0, 'remaining': 1000.0, 'percent_used': 0.0}]
+
+
+def test_status_for_an_empty_month(client):
+    assert status(client, '2030-01') == {'month': '2030-01', 'categories': [], 'totals': {
+        'budget': 0, 'spent': 0, 'remaining': 0, 'percent_used': None}}
+
+
+def test_status_defaults_to_this_month_and_is_per_user(app, client, login):
+    client.post('/api/budgets', json={'month': MONTH, 'category': 'food', 'amount': 100})
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 40})
+    assert client.get('/api/budgets/status').get_json()['totals']['spent'] == 40
+    assert login(app, 'bob').get('/api/budgets/status').get_json()['categories'] == []
+
+
+def test_status_rejects_a_bad_month(client):
+    assert client.get('/api/budgets/status?month=March').status_code == 400
+    assert client.get('/api/budgets/status?month=2024-13').status_code == 400
@@ -0,0 +1,82 @@
+"""Per-day month summaries for the calendar view (/api/calendar)."""
+
+
+def calendar(client, month='2024-03'):
+    response = client.get('/api/calendar', query_string={'month': month})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def add_job(client, name, color):
+    return client.post('/api/jobs', json={'name': name, 'hourly_wage': 1000, 'color': color}).get_json()['job']['id']
+
+
+def add_shift(client, day, job_id, start='09:00', end='17:00'):
+    response = client.post('/api/shifts', json={'date': day, 'job_id': job_id, 'start_time': start, 'end_time': end})
+    assert response.status_code == 200, response.get_json()
+
+
+def test_summarises_shifts_and_expenses_per_day(client):
+    cafe = add_job(client, 'Cafe', '#ff0000')
+    bar = add_job(client, 'Bar', '#00ff00')
+    add_shift(client, '2024-03-05', cafe, '08:00', '12:00')
+    add_shift(client, '2024-03-05', bar, '18:00', '22:00')
+    add_shift(client, '2024-03-05', cafe, '13:00', '15:00')
+    for category in ('food', 'food', 'travel', 'rent', 'fun'):
+        client.post('/api/expenses', json={'date': '2024-03-05', 'category': category, 'amount': 100})
+    client.post('/api/expenses', json={'date': '2024-03-20', 'category': 'food', 'amount': 250.5})
+
+    days = calendar(client)['days']
+    assert sorted(days) == ['2024-03-05', '2024-03-20']
+    busy = days['2024-03-05']
+    assert busy['shift_count'] == 3
+    assert busy['hours'] == 10
+    assert busy['income'] == 10000
+    assert busy['job_colors'] == ['#ff0000', '#00ff00']
+    # Only a preview of each list is sent; the counts carry the rest.
+    assert busy['shifts'] == [
+        {'job_name': 'Cafe', 'job_color': '#ff0000', 'start_time': '08:00', 'end_time': '12:00'},
+        {'job_name': 'Bar', 'job_color': '#00ff00', 'start_time': '18:00', 'end_time': '22:00'},
+    ]
+    assert busy['expense_count'] == 5
+    assert busy['expense_total'] == 500
+    assert busy['expense_categories'] == ['food', 'food', 'travel', 'rent']
+
+    quiet = days['2024-03-20']
+    assert (quiet['shift_count'], quiet['shifts'], quiet['expense_total']) == (0, [], 250.5)
+
+
+def test_month_bounds(client, job):
+    for day in ('2024-02-29', '2024-03-01', '2024-03-31', '2024-04-01'):
+        add_shift(client, day, job['id'])
+    assert sorted(calendar(client)['days']) == ['2024-03-01', '2024-03-31']
+    assert sorted(calendar(client, '2024-02')['days']) == ['2024-02-29']
+
+
+def test_includes_recurring_occurrences(client, job):
+    response = client.post('/api/recurring-shifts', json={
+        'job_id': job['id'], 'start_date': '2024-03-01', 'end_date': '2024-03-14', 'weekdays': ['MO'],
+        'start_time': '09:00', 'end_time': '17:00'})
+    assert response.status_code == 201, response.get_json()
+    # A logged shift replaces that day's occurrence rather than doubling it.
+    add_shift(client, '2024-03-11', job['id'], '10:00', '14:00')
+
+    days = calendar(client)['days']
+    assert sorted(days) == ['2024-03-04', '2024-03-11']
+    assert days['2024-03-04']['shift_count'] == 1
+    assert days['2024-03-04']['shifts'][0]['start_time'] == '09:00'
+    assert days['2024-03-11']['shift_count'] == 1
+    assert days['2024-03-11']['income'] == 4000
+
+
+def test_writes_refresh_the_cached_month(client, job):
+    assert calendar(client)['days'] == {}
+    add_shift(client, '2024-03-05', job['id'])
+    assert calendar(client)['days']['2024-03-05']['shift_count'] == 1
+
+
+def test_is_per_user_and_validates_month(app, client, job, login):
+    add_shift(client, '2024-03-05', job['id'])
+    assert calendar(login(app, 'bob'))['days'] == {}
+    assert client.get('/api/calendar?month=2024-3x').status_code == 400
+    assert app.test_client().get('/api/calendar').status_code == 401
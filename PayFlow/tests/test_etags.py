@@ -0,0 +1,91 @@
+"""Conditional GETs: ETags derived from the user's data version."""
+from datetime import date
+
+import pytest
+
+TODAY = date.today().isoformat()
+MONTH = TODAY[:7]
+READ_APIS = ('/api/shifts', '/api/recurring-shifts', '/api/jobs', '/api/expenses', f'/api/budgets?month={MONTH}',
+             f'/api/budgets/status?month={MONTH}', '/api/receipts', '/api/report', f'/api/calendar?month={MONTH}',
+             '/api/search?q=tea', '/api/sync')
+
+
+def revalidate(client, path):
+    first = client.get(path)
+    assert first.status_code == 200, path
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    return etag, client.get(path, headers={'If-None-Match': etag})
+
+
+@pytest.mark.parametrize('path', READ_APIS)
+def test_unchanged_data_answers_304(client, path):
+    etag, again = revalidate(client, path)
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert again.data == b''
+
+
+def add_job(client):
+    return client.post('/api/jobs', json={'name': 'Cafe', 'hourly_wage': 1000})
+
+
+WRITES = {
+    'shift': lambda client: client.post('/api/shifts', json={'date': TODAY, 'total_wage': '100'}),
+    'expense': lambda client: client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 5}),
+    'job': add_job,
+    'budget': lambda client: client.post('/api/budgets', json={'month': MONTH, 'category': 'food', 'amount': 9}),
+    'receipt': lambda client: client.post('/api/receipts', json={'title': 'Tea', 'date': TODAY, 'items': [
+        {'description': 'Tea', 'quantity': 1, 'unit_price': 100, 'tax_rate': 8}]}),
+    'recurring': lambda client: client.post('/api/recurring-shifts', json={
+        'start_date': TODAY, 'weekdays': ['MO'], 'start_time': '09:00', 'end_time': '17:00', 'total_wage': '1'}),
+    'import': lambda client: client.post('/api/import', json={'dataset': 'expenses', 'rows': [
+        {'date': TODAY, 'amount': 1}]}),
+}
+
+
+@pytest.mark.parametrize('write', sorted(WRITES))
+def test_every_write_changes_the_etag(client, write):
+    etag = client.get('/api/report').headers['ETag']
+    response = WRITES[write](client)
+    assert response.status_code in (200, 201), response.get_json()
+    again = client.get('/api/report', headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != etag
+
+
+def test_job_update_changes_the_etag(client):
+    job_id = add_job(client).get_json()['job']['id']
+    etag = client.get('/api/jobs').headers['ETag']
+    client.put(f'/api/jobs/{job_id}', json={'hourly_wage': 1200})
+    again = client.get('/api/jobs', headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.get_json()[0]['hourly_wage'] == 1200
+
+
+def test_deletes_change_the_etag(client):
+    shift_id = WRITES['shift'](client).get_json()['id']
+    etag = client.get('/api/shifts').headers['ETag']
+    client.delete(f'/api/shifts/{shift_id}')
+    again = client.get('/api/shifts', headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.get_json() == []
+
+
+def test_rejected_write_keeps_the_etag(client):
+    etag = client.get('/api/report').headers['ETag']
+    assert client.post('/api/expenses', json={'date': TODAY, 'amount': -1}).status_code == 400
+    assert client.get('/api/report', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etags_are_per_user(app, client, login):
+    etag = client.get('/api/shifts').headers['ETag']
+    other = login(app, username='bob')
+    response = other.get('/api/shifts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_logged_out_reads_are_not_conditional(app):
+    response = app.test_client().get('/api/shifts', headers={'If-None-Match': '*'})
+    assert response.status_code == 401
@@ -0,0 +1,25 @@
+"""Health and operational endpoints."""
+import pytest
+
+
+def test_health_is_public(app):
+    assert app.test_client().get('/health').status_code == 200
+
+
+def test_pool_stats_are_off_without_a_token(app):
+    assert app.test_client().get('/health/db').status_code == 404
+
+
+@pytest.mark.parametrize('header, status', [
+    (None, 403),
+    ('Bearer wrong', 403),
+    ('Basic s3cret', 403),
+    ('Bearer s3cret', 200),
+])
+def test_pool_stats_need_the_metrics_token(make_app, header, status):
+    app = make_app(METRICS_TOKEN='s3cret')
+    headers = {'Authorization': header} if header else {}
+    response = app.test_client().get('/health/db', headers=headers)
+    assert response.status_code == status
+    if status == 200:
+        assert response.get_json()['dialect'] == 'sqlite'
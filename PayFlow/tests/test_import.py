@@ -0,0 +1,33 @@
+"""Bulk import of shifts and expenses from CSV uploads and JSON batches."""
+import io
+from datetime import date
+
+import pytest
+
+TODAY = date.today().isoformat()
+
+
+def test_csv_upload_imports_expenses(client):
+    csv_body = f'Date,Category,Amount,Description\n{TODAY},food,500,Lunch\nbad,food,1,\n{TODAY},rent,0,\n'
+    response = client.post('/api/import', data={
+        'dataset': 'expenses', 'file': (io.BytesIO(csv_body.encode()), 'expenses.csv'),
+    }, content_type='multipart/form-data')
+    result = response.get_json()
+    assert result['imported'] == 1
+    assert [error['row'] for error in result['errors']] == [2, 3]
+    assert client.get('/api/report').get_json()['by_category'] == {'food': 500.0}
+
+
+def test_json_rows_must_be_objects(client):
+    result = client.post('/api/import', json={'dataset': 'expenses', 'rows': [
+        {'date': TODAY, 'amount': 100}, 'not a row',
+    ]}).get_json()
+    assert result['imported'] == 1
+    assert result['errors'] == [{'row': 2, 'error': 'Row must be an object'}]
+
+
+@pytest.mark.parametrize('dataset', [5, ['shifts'], {'name': 'shifts'}, 'budgets'])
+def test_unknown_dataset(client, dataset):
+    response = client.post('/api/import', json={'dataset': dataset, 'rows': []})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown dataset'}
@@ -0,0 +1,121 @@
+"""Upgrading a database created by the original (pre-migration) schema."""
+import sqlite3
+from datetime import date
+from decimal import Decimal
+
+from werkzeug.security import generate_password_hash
+
+# Tables exactly as the first release created them.
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL PRIMARY KEY, username VARCHAR(150) NOT NULL UNIQUE,
+    email VARCHAR(150) UNIQUE, password TEXT NOT NULL
+);
+CREATE TABLE job (
+    id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(150) NOT NULL, hourly_wage FLOAT NOT NULL,
+    currency VARCHAR(10) NOT NULL, color VARCHAR(20) NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES user (id)
+);
+CREATE TABLE expense (
+    id INTEGER NOT NULL PRIMARY KEY, date VARCHAR(50) NOT NULL, category VARCHAR(100) NOT NULL,
+    amount FLOAT NOT NULL, description VARCHAR(255), user_id INTEGER NOT NULL REFERENCES user (id)
+);
+CREATE TABLE budget (
+    id INTEGER NOT NULL PRIMARY KEY, month VARCHAR(7) NOT NULL, category VARCHAR(100) NOT NULL,
+    amount FLOAT NOT NULL, user_id INTEGER NOT NULL REFERENCES user (id)
+);
+CREATE TABLE receipt (
+    id INTEGER NOT NULL PRIMARY KEY, title VARCHAR(150), date VARCHAR(50), subtotal FLOAT,
+    tax_total FLOAT, grand_total FLOAT, note TEXT DEFAULT '', created_at DATETIME,
+    user_id INTEGER NOT NULL REFERENCES user (id), filename VARCHAR(255) DEFAULT 'receipt' NOT NULL,
+    mime_type VARCHAR(50) DEFAULT '' NOT NULL, image_data TEXT DEFAULT '', ocr_text TEXT DEFAULT '',
+    suggested_category VARCHAR(100) DEFAULT '', suggested_amount FLOAT DEFAULT '0'
+);
+CREATE TABLE shift (
+    id INTEGER NOT NULL PRIMARY KEY, date VARCHAR(50), shift_type VARCHAR(50), start_time VARCHAR(10),
+    end_time VARCHAR(10), break_start VARCHAR(10), break_end VARCHAR(10), total_hours VARCHAR(10),
+    hourly_wage VARCHAR(10), currency VARCHAR(10), total_wage VARCHAR(10),
+    job_id INTEGER REFERENCES job (id), user_id INTEGER REFERENCES user (id)
+);
+CREATE TABLE receipt_item (
+    id INTEGER NOT NULL PRIMARY KEY, date VARCHAR(50), category VARCHAR(50), description VARCHAR(200),
+    quantity INTEGER, unit_price FLOAT, tax_rate FLOAT, line_total FLOAT,
+    receipt_id INTEGER REFERENCES receipt (id)
+);
+"""
+
+
+def create_baseline_database(database_url):
+    today = date.today()
+    this_month = today.replace(day=1)
+    conn = sqlite3.connect(database_url[len('sqlite:///'):])
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO user (id, username, email, password) VALUES (1, 'legacy', NULL, ?)",
+                 (generate_password_hash('old password', 'pbkdf2:sha256:1000'),))
+    conn.execute("INSERT INTO job VALUES (1, 'Cafe', 1000, '¥', '#4f46e5', 1)")
+    conn.executemany(
+        "INSERT INTO shift (date, shift_type, start_time, end_time, break_start, break_end, total_hours, "
+        "hourly_wage, currency, total_wage, job_id, user_id) VALUES (?, 'regular', '09:00', '17:00', '', '', "
+        "'8', '1000', '¥', ?, ?, 1)",
+        [
+            (this_month.isoformat(), '8000', 1),
+            (this_month.strftime('%Y/%m/%d'), '1500.5', None),  # legacy slash date
+            ('not a date', '700', 1),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO expense (date, category, amount, description, user_id) VALUES (?, ?, ?, '', 1)",
+        [(this_month.isoformat(), 'food', 1200.0), (this_month.isoformat(), 'bills', 300.5)],
+    )
+    conn.execute("INSERT INTO receipt (id, title, date, subtotal, tax_total, grand_total, created_at, user_id) "
+                 "VALUES (1, 'Market', ?, 100, 8, 108, ?, 1)", (this_month.isoformat(), f'{this_month} 10:00:00'))
+    conn.execute("INSERT INTO receipt_item (date, category, description, quantity, unit_price, tax_rate, "
+                 "line_total, receipt_id) VALUES (?, 'food', 'Rice', 1, 100, 8, 108, 1)",
+                 (this_month.isoformat(),))
+    conn.commit()
+    conn.close()
+
+
+def rollup_snapshot(app):
+    rollup = app.DailyRollup
+    return sorted(
+        repr((row.user_id, row.day, row.kind, row.job_id, row.category, Decimal(row.amount), row.entries))
+        for row in rollup.query
+    )
+
+
+def test_upgrades_baseline_database(database_url, make_app):
+    create_baseline_database(database_url)
+    app = make_app()
+
+    with app.app_context():
+        shifts = app.Shift.query.order_by(app.Shift.id).all()
+        assert [s.work_date for s in shifts] == [date.today().replace(day=1)] * 2 + [None]
+        assert [s.wage_amount for s in shifts[:2]] == [Decimal('8000'), Decimal('1500.5')]
+        assert app.Expense.query.filter(app.Expense.expense_date.is_(None)).count() == 0
+        # The incrementally built rollups must match a rebuild from the rows.
+        migrated = rollup_snapshot(app)
+        assert migrated
+        app.rebuild_rollups()
+        assert rollup_snapshot(app) == migrated
+
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'legacy', 'password': 'old password'}).status_code == 302
+    report = client.get('/api/report').get_json()
+    # The undated shift still counts towards the all-time totals, as it did before.
+    assert report['by_job'] == {'Cafe': 8700.0, 'Unassigned': 1500.5}
+    assert report['by_category'] == {'bills': 300.5, 'food': 1200.0}
+    assert report['periods']['month'] == {'income': 9500.5, 'expense': 1500.5, 'net': 8000.0}
+    assert len(client.get('/api/shifts').get_json()) == 3
+    assert client.get('/api/receipts').get_json()[0]['items'][0]['description'] == 'Rice'
+
+
+def test_migrations_are_idempotent(database_url, make_app):
+    create_baseline_database(database_url)
+    with make_app().app_context() as ctx:
+        first = ctx.app.db.session.execute(ctx.app.db.text('SELECT version FROM schema_migrations')).scalars().all()
+    app = make_app()
+    with app.app_context():
+        again = app.db.session.execute(app.db.text('SELECT version FROM schema_migrations')).scalars().all()
+        assert again == first
+        assert app.Shift.query.count() == 3
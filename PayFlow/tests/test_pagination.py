@@ -0,0 +1,94 @@
+"""Keyset pagination of the list endpoints (limit/cursor and X-Next-Cursor)."""
+from datetime import date, timedelta
+
+import pytest
+
+import app as payflow
+
+
+def add_shifts(client, count, job_id=None):
+    today = date.today()
+    for n in range(count):
+        response = client.post('/api/shifts', json={
+            'date': (today - timedelta(days=n)).isoformat(), 'job_id': job_id,
+            'start_time': '09:00', 'end_time': '17:00', 'total_wage': '8000',
+        })
+        assert response.status_code == 200
+
+
+def walk(client, path, limit):
+    pages = []
+    cursor = None
+    while True:
+        query = f'{path}?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(query)
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return pages
+
+
+def test_shift_pages_cover_every_shift_once(client, job):
+    add_shifts(client, 7, job['id'])
+    pages = walk(client, '/api/shifts', 3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [shift['id'] for page in pages for shift in page]
+    assert ids == sorted(ids)
+    assert ids == [shift['id'] for shift in client.get('/api/shifts').get_json()]
+    assert {shift['job_name'] for page in pages for shift in page} == {'Cafe'}
+
+
+def test_exact_page_has_no_next_cursor(client):
+    add_shifts(client, 4)
+    response = client.get('/api/shifts?limit=4')
+    assert len(response.get_json()) == 4
+    assert 'X-Next-Cursor' not in response.headers
+
+
+def test_receipts_page_newest_first(client):
+    for n in range(5):
+        response = client.post('/api/receipts', json={
+            'title': f'Receipt {n}', 'date': date.today().isoformat(),
+            'items': [{'description': 'Tea', 'quantity': 1, 'unit_price': 100 + n, 'tax_rate': 8}],
+        })
+        assert response.status_code == 201
+    pages = walk(client, '/api/receipts', 2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    titles = [receipt['title'] for page in pages for receipt in page]
+    assert titles == [f'Receipt {n}' for n in reversed(range(5))]
+    assert all(receipt['items'] for page in pages for receipt in page)
+
+
+def test_date_window_and_bad_parameters(client):
+    add_shifts(client, 5)
+    since = (date.today() - timedelta(days=1)).isoformat()
+    assert len(client.get(f'/api/shifts?from={since}').get_json()) == 2
+    for query in ('limit=0', 'limit=abc', 'cursor=garbage', 'from=31/31/2020'):
+        response = client.get(f'/api/shifts?{query}')
+        assert response.status_code == 400, query
+
+
+@pytest.mark.parametrize('path, values', [
+    ('/api/shifts', ['a']),
+    ('/api/shifts', [True]),
+    ('/api/shifts', [1.5]),
+    ('/api/receipts', [1, 2]),
+    ('/api/receipts', ['yesterday', 2]),
+    ('/api/receipts', ['2024-01-01T00:00:00', '2']),
+    ('/api/expenses', [None, 3]),
+    ('/api/expenses', ['2024-01-01', [3]]),
+])
+def test_cursor_values_must_match_the_sort_columns(client, path, values):
+    response = client.get(f'{path}?limit=2&cursor={payflow.encode_cursor(values)}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+def test_expense_pages_newest_first(client):
+    for n in range(5):
+        day = (date.today() - timedelta(days=n)).isoformat()
+        client.post('/api/expenses', json={'date': day, 'category': 'food', 'amount': 100 + n})
+    pages = walk(client, '/api/expenses', 2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [expense['amount'] for page in pages for expense in page] == [100, 101, 102, 103, 104]
@@ -0,0 +1,99 @@
+"""Password hashing policy, rehash on login and the bounded hashing queue."""
+import threading
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app as payflow
+
+
+def stored_hash(app, username='alice'):
+    with app.app_context():
+        return app.User.query.filter_by(username=username).one().password
+
+
+def set_hash(app, password_hash, username='alice'):
+    with app.app_context():
+        app.User.query.filter_by(username=username).update({'password': password_hash})
+        app.db.session.commit()
+
+
+def test_outdated_method_is_rehashed_on_login(app, login):
+    login(app)
+    set_hash(app, generate_password_hash('correct horse', 'pbkdf2:sha256:500'))
+    assert login(app) is not None
+    assert stored_hash(app).startswith('pbkdf2:sha256:1000$')
+
+
+def test_salt_length_change_triggers_rehash(make_app, login):
+    app = make_app()
+    login(app)
+    assert len(stored_hash(app).split('$')[1]) == 16
+    longer = make_app(PASSWORD_SALT_LENGTH=24)
+    login(longer)
+    assert len(stored_hash(longer).split('$')[1]) == 24
+
+
+def test_wrong_password_is_not_rehashed(app, login):
+    login(app)
+    old = generate_password_hash('correct horse', 'pbkdf2:sha256:500')
+    set_hash(app, old)
+    response = app.test_client().post('/login', data={'username': 'alice', 'password': 'wrong'})
+    assert b'Invalid credentials' in response.data
+    assert stored_hash(app) == old
+
+
+@pytest.fixture
+def busy_app(make_app, login, monkeypatch):
+    """An app whose single hashing slot is held by a login that waits for ``release``."""
+    app = make_app(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=1)
+    client = login(app)
+    release = threading.Event()
+    entered = threading.Event()
+    real_check = payflow.check_password_hash
+
+    def slow_check(*args):
+        entered.set()
+        release.wait(5)
+        return real_check(*args)
+
+    monkeypatch.setattr(payflow, 'check_password_hash', slow_check)
+    blocked = threading.Thread(target=lambda: app.test_client().post(
+        '/login', data={'username': 'alice', 'password': 'correct horse'}))
+    blocked.start()
+    assert entered.wait(5)
+    yield app, client, release
+    release.set()
+    blocked.join()
+
+
+def test_full_queue_rerenders_the_login_form(busy_app):
+    app, _, _ = busy_app
+    response = app.test_client().post('/login', data={'username': 'alice', 'password': 'correct horse'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.mimetype == 'text/html'
+    assert b'Too many sign-in attempts' in response.data
+
+
+def test_full_queue_answers_api_callers_with_json(busy_app):
+    _, client, _ = busy_app
+    response = client.post('/account/change_password', json={
+        'current_password': 'correct horse', 'new_password': 'new password', 'confirm_password': 'new password',
+    })
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json() == {'error': 'Too many sign-in attempts right now; try again shortly'}
+
+
+def test_queue_frees_up_after_the_burst(busy_app):
+    app, _, release = busy_app
+    release.set()
+    deadline = time.monotonic() + 5
+    while True:
+        response = app.test_client().post('/login', data={'username': 'alice', 'password': 'correct horse'})
+        if response.status_code != 503 or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    assert response.status_code == 302
@@ -0,0 +1,114 @@
+"""Server-side pricing of job shifts."""
+from datetime import date
+
+import pytest
+
+TODAY = date.today().isoformat()
+
+
+def post_shift(client, **fields):
+    payload = {'date': TODAY, 'start_time': '09:00', 'end_time': '17:00',
+               'break_start': '12:00', 'break_end': '13:00', 'total_wage': '99999'}
+    payload.update(fields)
+    response = client.post('/api/shifts', json=payload)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['id']
+
+
+def shifts_by_id(client):
+    return {shift['id']: shift for shift in client.get('/api/shifts').get_json()}
+
+
+def test_job_shift_is_priced_from_the_job(client, job):
+    shift_id = post_shift(client, job_id=job['id'], total_hours='1', hourly_wage='1')
+    shift = shifts_by_id(client)[shift_id]
+    assert float(shift['total_hours']) == 7
+    assert float(shift['total_wage']) == 7000
+    assert client.get('/api/report').get_json()['by_job'] == {'Cafe': 7000.0}
+
+
+def test_unassigned_and_custom_pay_shifts_keep_the_client_total(client, job):
+    unassigned = post_shift(client, total_wage='1234')
+    custom = post_shift(client, job_id=job['id'], total_wage='4321', custom_pay=True)
+    shifts = shifts_by_id(client)
+    assert float(shifts[unassigned]['total_wage']) == 1234
+    assert float(shifts[custom]['total_wage']) == 4321
+
+
+def test_night_and_overtime_rules(client):
+    response = client.post('/api/jobs', json={
+        'name': 'Bar', 'hourly_wage': 1000, 'night_start': '22:00', 'night_end': '05:00',
+        'night_multiplier': 1.25, 'overtime_threshold': 8, 'overtime_multiplier': 1.5,
+    })
+    job_id = response.get_json()['job']['id']
+    night = post_shift(client, job_id=job_id, start_time='22:00', end_time='06:00',
+                       break_start='02:00', break_end='03:00')
+    long_day = post_shift(client, job_id=job_id, start_time='08:00', end_time='19:00')
+    shifts = shifts_by_id(client)
+    # 22-02 and 03-05 at the night rate, 05-06 at the base rate.
+    assert float(shifts[night]['total_wage']) == 6 * 1250 + 1000
+    # 10 hours worked: 8 at the base rate, 2 at the overtime rate.
+    assert float(shifts[long_day]['total_wage']) == 8 * 1000 + 2 * 1500
+
+
+def test_wage_change_reprices_job_shifts(client, job):
+    priced = post_shift(client, job_id=job['id'])
+    custom = post_shift(client, job_id=job['id'], total_wage='500', custom_pay=True)
+    response = client.put(f"/api/jobs/{job['id']}", json={'hourly_wage': 1200})
+    assert response.get_json()['repriced_shifts'] == 1
+    shifts = shifts_by_id(client)
+    assert float(shifts[priced]['total_wage']) == 8400
+    assert float(shifts[custom]['total_wage']) == 500
+    assert client.get('/api/report').get_json()['by_job'] == {'Cafe': 8900.0}
+
+
+def test_invalid_wage_rules_are_rejected(client, job):
+    response = client.put(f"/api/jobs/{job['id']}", json={'night_start': '25:00'})
+    assert response.status_code == 400
+
+
+def test_import_prices_job_shifts(client, job):
+    response = client.post('/api/import', json={'dataset': 'shifts', 'rows': [
+        {'date': TODAY, 'job': 'Cafe', 'start_time': '09:00', 'end_time': '17:00',
+         'break_start': '12:00', 'break_end': '13:00', 'total_wage': '999'},
+        {'date': TODAY, 'start_time': '09:00', 'end_time': '17:00', 'total_wage': '999'},
+        {'date': TODAY, 'job': 'Nowhere'},
+    ]})
+    result = response.get_json()
+    assert result['imported'] == 2
+    assert result['errors'] == [{'row': 3, 'error': "Unknown job 'Nowhere'"}]
+    wages = sorted(float(shift['total_wage']) for shift in client.get('/api/shifts').get_json())
+    assert wages == [999, 7000]
+    assert client.get('/api/report').get_json()['by_job'] == {'Cafe': 7000.0, 'Unassigned': 999.0}
+
+
+def test_recompute_command_invalidates_reports(app, client, job):
+    shift_id = post_shift(client, job_id=job['id'])
+    first = client.get('/api/report')
+    assert first.get_json()['by_job'] == {'Cafe': 7000.0}
+    with app.app_context():
+        app.Job.query.filter_by(id=job['id']).update({'hourly_wage': 2000})
+        app.db.session.commit()
+    result = app.test_cli_runner().invoke(args=['payflow', 'recompute-wages'])
+    assert result.exit_code == 0, result.output
+    response = client.get('/api/report', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.get_json()['by_job'] == {'Cafe': 14000.0}
+    assert float(shifts_by_id(client)[shift_id]['total_wage']) == 14000
+
+
+@pytest.mark.parametrize('path, method, body', [
+    ('/api/shifts', 'post', {'date': TODAY, 'start_time': 900, 'end_time': '17:00'}),
+    ('/api/shifts', 'post', {'date': TODAY, 'start_time': '09:00', 'end_time': ['17:00']}),
+    ('/api/shifts', 'post', {'date': 20240101, 'start_time': '09:00', 'end_time': '17:00'}),
+    ('/api/recurring-shifts', 'post', {'start_date': TODAY, 'weekdays': ['MO'], 'start_time': 9, 'end_time': '17:00'}),
+    ('/api/jobs', 'post', {'name': 5, 'hourly_wage': 1000}),
+    ('/api/jobs', 'post', {'name': 'Bar', 'color': 5}),
+    ('/api/jobs/{job}', 'put', {'color': 5}),
+    ('/api/jobs/{job}', 'put', {'currency': ['¥']}),
+    ('/api/jobs/{job}', 'put', {'night_start': 22}),
+])
+def test_non_string_fields_are_rejected(client, job, path, method, body):
+    response = getattr(client, method)(path.format(job=job['id']), json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Invalid')
@@ -0,0 +1,85 @@
+"""Opt-in request profiling (PROFILING=1)."""
+import threading
+import time
+
+import pytest
+
+import app as payflow
+
+PROFILED = {'PROFILING': '1', 'PROFILE_SLOW_MS': '100000', 'PROFILE_SAMPLE_RATE': '1', 'METRICS_TOKEN': 's3cret'}
+
+
+def test_server_timing_and_metrics(make_app, login):
+    app = make_app(**PROFILED)
+    client = login(app)
+    response = client.get('/api/shifts')
+    assert response.headers['Server-Timing'].startswith('app;dur=')
+    assert client.get('/metrics').status_code == 403
+    metrics = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert metrics.status_code == 200
+    assert b'api_shifts' in metrics.data
+
+
+def test_concurrent_sampled_requests_take_turns(make_app, login, monkeypatch):
+    app = make_app(**PROFILED)
+    client = login(app)
+    cookies = {cookie.key: cookie.value for cookie in client._cookies.values()}
+    active = []
+    overlaps = []
+    real_profile = payflow.cProfile.Profile
+
+    class Profile(real_profile):
+        # Mimics Python 3.12+, where a second active profiler raises.
+        def enable(self, *args, **kwargs):
+            if active:
+                overlaps.append(True)
+                raise ValueError('Another profiling tool is already active')
+            active.append(self)
+            time.sleep(0.01)
+            return super().enable(*args, **kwargs)
+
+        def disable(self):
+            if self in active:
+                active.remove(self)
+            return super().disable()
+
+    monkeypatch.setattr(payflow.cProfile, 'Profile', Profile)
+    statuses = []
+
+    def fetch():
+        worker = app.test_client()
+        for name, value in cookies.items():
+            worker.set_cookie(name, value)
+        for _ in range(5):
+            statuses.append(worker.get('/api/shifts').status_code)
+
+    threads = [threading.Thread(target=fetch) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 30
+    assert overlaps == []
+    assert not payflow.PROFILER_LOCK.locked()
+
+
+def test_profiler_conflict_skips_sampling(make_app, login, monkeypatch):
+    app = make_app(**PROFILED)
+    client = login(app)
+
+    class Busy(payflow.cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(payflow.cProfile, 'Profile', Busy)
+    assert client.get('/api/shifts').status_code == 200
+    assert not payflow.PROFILER_LOCK.locked()
+
+
+def test_lock_is_released_when_the_handler_raises(make_app, login):
+    app = make_app(**PROFILED)
+    client = login(app)
+    app.config['QUERY_BUDGET'] = 1
+    with pytest.raises(RuntimeError):
+        client.get('/api/shifts')
+    assert not payflow.PROFILER_LOCK.locked()
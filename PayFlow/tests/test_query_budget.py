@@ -0,0 +1,61 @@
+"""List endpoints must issue a fixed number of queries, however many rows they return."""
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+LIST_ENDPOINTS = ('/api/shifts', '/api/shifts?limit=50', '/api/receipts', '/api/receipts?limit=50',
+                  '/api/expenses', '/api/report', '/api/sync', '/api/export?dataset=shifts')
+
+
+@contextmanager
+def count_queries(app):
+    counter = {'n': 0}
+
+    def before_cursor_execute(*args):
+        counter['n'] += 1
+
+    with app.app_context():
+        engine = app.db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def add_rows(client, count, offset=0):
+    jobs = [client.post('/api/jobs', json={'name': f'Job {offset + n}', 'hourly_wage': 1000}).get_json()['job']['id']
+            for n in range(3)]
+    for n in range(count):
+        day = (date.today() - timedelta(days=offset + n)).isoformat()
+        client.post('/api/shifts', json={'date': day, 'job_id': jobs[n % 3],
+                                         'start_time': '09:00', 'end_time': '17:00'})
+        client.post('/api/expenses', json={'date': day, 'category': 'food', 'amount': 100 + n})
+        client.post('/api/receipts', json={'title': f'R{n}', 'date': day, 'items': [
+            {'description': 'Tea', 'quantity': 1, 'unit_price': 100, 'tax_rate': 8},
+            {'description': 'Rice', 'quantity': 2, 'unit_price': 300, 'tax_rate': 8},
+        ]})
+
+
+def queries_for(app, client, path):
+    with count_queries(app) as counter:
+        response = client.get(path)
+        response.get_data()  # drain streamed responses
+    assert response.status_code == 200, path
+    return counter['n']
+
+
+@pytest.mark.parametrize('path', LIST_ENDPOINTS)
+def test_query_count_does_not_grow_with_rows(app, client, path):
+    add_rows(client, 2)
+    few = queries_for(app, client, path)
+    add_rows(client, 20, offset=2)
+    assert queries_for(app, client, path) == few
+
+
+def test_budget_overrun_fails_under_testing(app, client):
+    app.config['QUERY_BUDGET'] = 1
+    with pytest.raises(RuntimeError, match='budget 1'):
+        client.get('/api/shifts')
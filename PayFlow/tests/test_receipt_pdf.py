@@ -0,0 +1,39 @@
+"""Server-rendered receipt PDFs and the font they need."""
+from datetime import date
+
+import pytest
+
+MISSING_FONT = '/nonexistent/NotoSansJP-Regular.ttf'
+
+
+def add_receipt(client, description):
+    response = client.post('/api/receipts', json={
+        'title': 'Market', 'date': date.today().isoformat(),
+        'items': [{'description': description, 'quantity': 1, 'unit_price': 100, 'tax_rate': 8}],
+    })
+    return response.get_json()['id']
+
+
+def test_missing_font_only_warns_by_default(make_app, tmp_path, capsys):
+    app = make_app(RECEIPT_PDF_FONT=MISSING_FONT, RECEIPT_PDF_CACHE_DIR=tmp_path / 'pdfs')
+    assert 'is missing' in capsys.readouterr().out
+    assert app.config['RECEIPT_PDF_FONT_REQUIRED'] is False
+
+
+def test_required_font_stops_boot(make_app):
+    with pytest.raises(RuntimeError, match='is missing'):
+        make_app(RECEIPT_PDF_FONT=MISSING_FONT, RECEIPT_PDF_FONT_REQUIRED='1')
+
+
+def test_without_font_latin_receipts_render_and_others_fall_back(make_app, login, tmp_path):
+    app = make_app(RECEIPT_PDF_FONT=MISSING_FONT, RECEIPT_PDF_CACHE_DIR=tmp_path / 'pdfs')
+    client = login(app)
+    latin_url = f"/api/receipts/{add_receipt(client, 'Tea')}/pdf/download?lang=en"
+    latin = client.get(latin_url)
+    assert latin.status_code == 200
+    assert latin.data.startswith(b'%PDF')
+    # The client renders the PDF itself on a 503.
+    japanese = client.get(f"/api/receipts/{add_receipt(client, 'お茶')}/pdf/download?lang=en")
+    assert japanese.status_code == 503
+    cached = client.get(latin_url, headers={'If-None-Match': latin.headers['ETag']})
+    assert cached.status_code == 304
@@ -0,0 +1,91 @@
+"""Recurring shift templates and their server-side expansion."""
+from datetime import date
+
+import pytest
+
+import app as payflow
+
+
+def add_template(client, job_id=None, **fields):
+    payload = {'start_date': '2024-01-01', 'weekdays': ['MO'], 'start_time': '09:00', 'end_time': '17:00',
+               'total_wage': '100', 'job_id': job_id}
+    payload.update(fields)
+    response = client.post('/api/recurring-shifts', json=payload)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+
+def expand(client, start='2024-01-01', end='2024-01-31'):
+    response = client.get(f'/api/shifts?expand=recurring&from={start}&to={end}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_parse_weekly_rule():
+    assert payflow.parse_weekly_rule('RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TH,MO;UNTIL=20241231') == {
+        'interval_weeks': 2, 'weekdays': [0, 3], 'until': date(2024, 12, 31)}
+    for rule in ('FREQ=DAILY', 'FREQ=WEEKLY;BYDAY=XX', 'FREQ=WEEKLY;INTERVAL=0;BYDAY=MO', ''):
+        assert payflow.parse_weekly_rule(rule) is None, rule
+
+
+def test_every_other_week_keeps_its_phase():
+    days = list(payflow.expand_weekly(date(2024, 1, 1), 2, [0], None, date(2024, 3, 1), date(2024, 3, 31)))
+    assert days == [date(2024, 3, 11), date(2024, 3, 25)]
+
+
+def test_expansion_over_a_window(client):
+    template_id = add_template(client, rrule='FREQ=WEEKLY;BYDAY=MO,TH')
+    shifts = expand(client)
+    assert [shift['date'] for shift in shifts] == [
+        '2024-01-01', '2024-01-04', '2024-01-08', '2024-01-11', '2024-01-15',
+        '2024-01-18', '2024-01-22', '2024-01-25', '2024-01-29']
+    assert {(shift['id'], shift['recurring_id']) for shift in shifts} == {(None, template_id)}
+
+
+def test_interval_and_end_date(client):
+    add_template(client, weekdays=['MO', 'TH'], interval_weeks=2, end_date='2024-01-20')
+    assert [shift['date'] for shift in expand(client)] == ['2024-01-01', '2024-01-04', '2024-01-15', '2024-01-18']
+
+
+def test_logged_shift_replaces_that_days_occurrence(client, job):
+    add_template(client, job['id'])
+    client.post('/api/shifts', json={'date': '2024-01-08', 'job_id': job['id'],
+                                     'start_time': '10:00', 'end_time': '14:00'})
+    client.post('/api/shifts', json={'date': '2024-01-15', 'start_time': '10:00', 'end_time': '14:00'})
+    shifts = expand(client)
+    by_day = {}
+    for shift in shifts:
+        by_day.setdefault(shift['date'], []).append(shift['recurring_id'] is None)
+    # Same job that day: the logged shift wins. Another job: both are listed.
+    assert by_day['2024-01-08'] == [True]
+    assert sorted(by_day['2024-01-15']) == [False, True]
+    assert len(shifts) == 6
+
+
+def test_report_counts_past_occurrences(client, job):
+    add_template(client, job['id'], end_date='2024-01-31')
+    # Five Mondays in January 2024, each priced from the job: 8 hours at 1000.
+    assert client.get('/api/report').get_json()['by_job'] == {'Cafe': 40000.0}
+    january = client.get('/api/report?start=2024-01-08&end=2024-01-20').get_json()
+    assert january['by_job'] == {'Cafe': 16000.0}
+
+
+def test_deleting_a_template_stops_its_occurrences(client):
+    template_id = add_template(client)
+    assert client.delete(f'/api/recurring-shifts/{template_id}').status_code == 200
+    assert expand(client) == []
+    assert client.get('/api/recurring-shifts').get_json() == []
+
+
+@pytest.mark.parametrize('query', ['expand=recurring', 'expand=recurring&from=2024-01-01&to=2025-06-01',
+                                   'expand=recurring&from=2024-02-01&to=2024-01-01'])
+def test_expansion_needs_a_bounded_window(client, query):
+    assert client.get(f'/api/shifts?{query}').status_code == 400
+
+
+@pytest.mark.parametrize('fields', [{'rrule': 'FREQ=DAILY'}, {'weekdays': []}, {'start_date': 'soon'},
+                                    {'start_time': '25:00'}])
+def test_invalid_templates_are_rejected(client, fields):
+    payload = {'start_date': '2024-01-01', 'weekdays': ['MO'], 'start_time': '09:00', 'end_time': '17:00'}
+    payload.update(fields)
+    assert client.post('/api/recurring-shifts', json=payload).status_code == 400
@@ -0,0 +1,52 @@
+"""The per-user report/budget response cache and its invalidation."""
+from datetime import date
+
+TODAY = date.today().isoformat()
+MONTH = TODAY[:7]
+TOKEN = {'Authorization': 'Bearer s3cret'}
+
+
+def cache_stats(client):
+    return client.get('/health/cache', headers=TOKEN).get_json()
+
+
+def test_repeat_report_is_served_from_the_cache(make_app, login):
+    app = make_app(METRICS_TOKEN='s3cret')
+    client = login(app)
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 300})
+    first = client.get('/api/report').get_json()
+    hits = cache_stats(client)['hits']
+    assert client.get('/api/report').get_json() == first
+    assert cache_stats(client)['hits'] == hits + 1
+
+
+def test_writes_invalidate_cached_reports_and_budgets(client):
+    client.post('/api/budgets', json={'month': MONTH, 'category': 'food', 'amount': 1000})
+    assert client.get('/api/report').get_json()['expense_total'] == 0
+    assert client.get(f'/api/budgets?month={MONTH}').get_json()[0]['spent'] == 0
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 300})
+    assert client.get('/api/report').get_json()['expense_total'] == 300
+    assert client.get(f'/api/budgets?month={MONTH}').get_json()[0]['spent'] == 300
+
+
+def test_other_workers_do_not_serve_stale_entries(make_app, login):
+    """Each process has its own cache; the data version in the key covers the others."""
+    first = make_app()
+    second = make_app()
+    client = login(first)
+    other = second.test_client()
+    for cookie in client._cookies.values():
+        other.set_cookie(cookie.key, cookie.value)
+    assert other.get('/api/report').get_json()['expense_total'] == 0  # cached in the second app
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 300})
+    assert other.get('/api/report').get_json()['expense_total'] == 300
+
+
+def test_reports_are_cached_per_user(app, client, login):
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 300})
+    assert client.get('/api/report').get_json()['expense_total'] == 300
+    assert login(app, username='bob').get('/api/report').get_json()['expense_total'] == 0
+
+
+def test_cache_stats_need_the_metrics_token(app):
+    assert app.test_client().get('/health/cache').status_code == 404
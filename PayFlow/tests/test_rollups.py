@@ -0,0 +1,117 @@
+"""The daily_rollup table behind /api/report and budget status."""
+import threading
+from datetime import date
+
+TODAY = date.today().isoformat()
+
+
+def add_shift(client, total_wage, job_id=None):
+    response = client.post('/api/shifts', json={
+        'date': TODAY, 'job_id': job_id, 'start_time': '09:00', 'end_time': '17:00', 'total_wage': total_wage,
+    })
+    return response.get_json()['id']
+
+
+def test_rebuild_command_invalidates_reports(app, client):
+    shift_id = add_shift(client, '8000')
+    first = client.get('/api/report')
+    assert first.get_json()['income_total'] == 8000
+    etag = first.headers['ETag']
+
+    # A change the rollups missed (e.g. a manual fix in the database) ...
+    with app.app_context():
+        app.Shift.query.filter_by(id=shift_id).update({'wage_amount': 9000, 'total_wage': '9000'})
+        app.db.session.commit()
+    # ... is picked up by the rebuild, and neither the ETag nor the cache hides it.
+    result = app.test_cli_runner().invoke(args=['payflow', 'rebuild-rollups'])
+    assert result.exit_code == 0, result.output
+    response = client.get('/api/report', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['income_total'] == 9000
+
+
+def rollup_rows(app):
+    with app.app_context():
+        return sorted((
+            (row.day.isoformat() if row.day else None, row.kind, row.job_id, row.category,
+             float(row.amount), row.entries)
+            for row in app.DailyRollup.query
+        ), key=repr)
+
+
+def snapshot_matches_rebuild(app):
+    before = rollup_rows(app)
+    with app.app_context():
+        app.rebuild_rollups()
+    return before == rollup_rows(app)
+
+
+def test_writes_add_to_one_row_per_key(app, client, job):
+    # Job shifts are priced from the job: 8 hours at 1000.
+    add_shift(client, '1', job['id'])
+    add_shift(client, '1', job['id'])
+    add_shift(client, '500')
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 300})
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 200})
+    assert rollup_rows(app) == [
+        (TODAY, 'expense', None, 'food', 500.0, 2),
+        (TODAY, 'income', job['id'], None, 16000.0, 2),
+        (TODAY, 'income', None, None, 500.0, 1),
+    ]
+    assert snapshot_matches_rebuild(app)
+
+
+def test_deleting_the_last_entry_removes_the_row(app, client):
+    first = add_shift(client, '8000')
+    second = add_shift(client, '2000')
+    client.delete(f'/api/shifts/{first}')
+    assert rollup_rows(app) == [(TODAY, 'income', None, None, 2000.0, 1)]
+    client.delete(f'/api/shifts/{second}')
+    assert rollup_rows(app) == []
+    assert client.get('/api/report').get_json()['income_total'] == 0
+
+
+def test_undated_rows_share_one_rollup(app, client):
+    add_shift(client, '100')
+    client.post('/api/shifts', json={'date': 'someday', 'total_wage': '40'})
+    client.post('/api/shifts', json={'date': '', 'total_wage': '60'})
+    assert rollup_rows(app) == [(TODAY, 'income', None, None, 100.0, 1), (None, 'income', None, None, 100.0, 2)]
+    assert snapshot_matches_rebuild(app)
+
+
+def test_job_deletion_moves_income_to_unassigned(app, client, job):
+    add_shift(client, '8000', job['id'])
+    add_shift(client, '500')
+    client.delete(f"/api/jobs/{job['id']}")
+    assert rollup_rows(app) == [(TODAY, 'income', None, None, 8500.0, 2)]
+    assert client.get('/api/report').get_json()['by_job'] == {'Unassigned': 8500.0}
+    assert snapshot_matches_rebuild(app)
+
+
+def test_receipt_items_roll_up_by_category(app, client):
+    client.post('/api/receipts', json={'title': 'Market', 'date': TODAY, 'items': [
+        {'category': 'food', 'description': 'Rice', 'quantity': 2, 'unit_price': 300, 'tax_rate': 0},
+        {'category': 'food', 'description': 'Tea', 'quantity': 1, 'unit_price': 100, 'tax_rate': 0},
+        {'category': 'home', 'description': 'Soap', 'quantity': 1, 'unit_price': 250, 'tax_rate': 0},
+    ]})
+    rows = [row for row in rollup_rows(app) if row[1] == 'receipt']
+    assert rows == [(TODAY, 'receipt', None, 'food', 700.0, 2), (TODAY, 'receipt', None, 'home', 250.0, 1)]
+    assert snapshot_matches_rebuild(app)
+
+
+def test_concurrent_writers_do_not_lose_updates(app, client):
+    cookies = {cookie.key: cookie.value for cookie in client._cookies.values()}
+
+    def post_expenses():
+        worker = app.test_client()
+        for name, value in cookies.items():
+            worker.set_cookie(name, value)
+        for _ in range(10):
+            worker.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 10})
+
+    threads = [threading.Thread(target=post_expenses) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert rollup_rows(app) == [(TODAY, 'expense', None, 'food', 400.0, 40)]
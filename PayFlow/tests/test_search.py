@@ -0,0 +1,110 @@
+"""Full-text search over expenses, receipts and jobs (/api/search)."""
+import pytest
+
+
+def add_expense(client, description, day='2024-03-10', category='food'):
+    response = client.post('/api/expenses', json={
+        'date': day, 'category': category, 'amount': 500, 'description': description})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def search(client, query, **params):
+    response = client.get('/api/search', query_string={'q': query, **params})
+    assert response.status_code == 200, response.get_json()
+    return [(hit['type'], hit['id']) for hit in response.get_json()]
+
+
+def test_finds_each_entity(client, job):
+    expense_id = add_expense(client, 'Lunch with colleagues')
+    response = client.post('/api/receipts', json={'title': 'Market', 'date': '2024-03-11', 'items': [
+        {'description': 'Organic bananas', 'quantity': 1, 'unit_price': 200, 'tax_rate': 8}]})
+    receipt_id = response.get_json()['id']
+
+    assert search(client, 'colleagues') == [('expenses', expense_id)]
+    assert search(client, 'bananas') == [('receipts', receipt_id)]
+    assert search(client, 'cafe') == [('jobs', job['id'])]
+
+    hit = client.get('/api/search?q=lunch').get_json()[0]
+    assert hit['date'] == '2024-03-10'
+    assert 'Lunch' in hit['snippet']
+
+
+def test_type_and_date_filters(client, job):
+    march = add_expense(client, 'Cafe breakfast', '2024-03-10')
+    april = add_expense(client, 'Cafe dinner', '2024-04-10')
+
+    assert sorted(search(client, 'cafe')) == sorted([('expenses', march), ('expenses', april), ('jobs', job['id'])])
+    assert sorted(search(client, 'cafe', type='expenses')) == sorted([('expenses', march), ('expenses', april)])
+    assert search(client, 'cafe', type='expenses', **{'from': '2024-04-01'}) == [('expenses', april)]
+    assert search(client, 'cafe', type='expenses', to='2024-03-31') == [('expenses', march)]
+
+
+def test_results_are_per_user(app, client, login):
+    add_expense(client, 'Secret stash')
+    other = login(app, 'bob')
+    assert search(other, 'secret') == []
+
+
+def test_deletes_and_renames_update_the_index(client, job):
+    expense_id = add_expense(client, 'Parking ticket')
+    assert client.delete(f'/api/expenses/{expense_id}').status_code == 200
+    assert search(client, 'parking') == []
+
+    client.put(f"/api/jobs/{job['id']}", json={'name': 'Bakery'})
+    assert search(client, 'cafe') == []
+    assert search(client, 'bakery') == [('jobs', job['id'])]
+
+    client.delete(f"/api/jobs/{job['id']}")
+    assert search(client, 'bakery') == []
+
+
+def test_imported_expenses_are_searchable(client):
+    response = client.post('/api/import', json={'dataset': 'expenses', 'rows': [
+        {'date': '2024-03-10', 'category': 'travel', 'amount': 900, 'description': 'Train to Osaka'}]})
+    assert response.status_code == 200, response.get_json()
+    assert [kind for kind, _ in search(client, 'osaka')] == ['expenses']
+
+
+def test_pagination(client):
+    ids = {add_expense(client, f'Taxi ride {n}') for n in range(5)}
+    seen, cursor = [], None
+    while True:
+        params = {'q': 'taxi', 'limit': 2}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/api/search', query_string=params)
+        page = response.get_json()
+        assert len(page) <= 2
+        seen += [hit['id'] for hit in page]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(ids)
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'q': '!!!'},
+    {'q': 'taxi', 'type': 'shifts'},
+    {'q': 'taxi', 'from': 'yesterday'},
+    {'q': 'taxi', 'limit': 'lots'},
+    {'q': 'taxi', 'cursor': 'not-a-cursor'},
+])
+def test_rejects_bad_parameters(client, params):
+    assert client.get('/api/search', query_string=params).status_code == 400
+
+
+def test_requires_login(app):
+    assert app.test_client().get('/api/search?q=taxi').status_code == 401
+
+
+def test_rebuild_matches_incremental_index(app, client, job):
+    add_expense(client, 'Cafe latte')
+    client.post('/api/receipts', json={'title': 'Cafe receipt', 'date': '2024-03-11', 'items': [
+        {'description': 'Latte', 'quantity': 2, 'unit_price': 450, 'tax_rate': 8}]})
+    before = sorted(search(client, 'cafe') + search(client, 'latte'))
+
+    result = app.test_cli_runner().invoke(args=['payflow', 'rebuild-search'])
+    assert result.exit_code == 0, result.output
+    assert sorted(search(client, 'cafe') + search(client, 'latte')) == before
@@ -0,0 +1,89 @@
+"""Server-side sessions: revocation on password change, logout and expiry sweeps."""
+from datetime import datetime, timedelta
+
+
+def copy_session(app, client):
+    other = app.test_client()
+    for cookie in client._cookies.values():
+        other.set_cookie(cookie.key, cookie.value)
+    return other
+
+
+def change_password(client, current='correct horse', new='battery staple'):
+    return client.post('/account/change_password', json={
+        'current_password': current, 'new_password': new, 'confirm_password': new})
+
+
+def test_password_change_revokes_other_sessions(app, client, login):
+    laptop = login(app)
+    bob = login(app, 'bob')
+
+    assert change_password(client).status_code == 200
+    assert client.get('/api/shifts').status_code == 200
+    assert laptop.get('/api/shifts').status_code == 401
+    assert bob.get('/api/shifts').status_code == 200
+    login(app, password='battery staple')
+
+
+def test_revocation_reaches_other_app_instances(make_app, login):
+    first = make_app()
+    client = login(first)
+    second = make_app()
+    phone = copy_session(second, login(second))
+    assert phone.get('/api/shifts').status_code == 200
+
+    assert change_password(client).status_code == 200
+    assert phone.get('/api/shifts').status_code == 401
+    assert copy_session(second, client).get('/api/shifts').status_code == 200
+
+
+def test_stale_user_cache_cannot_reuse_the_old_password(make_app, login):
+    first, second = make_app(), make_app()
+    client = login(first)
+    other = login(second)
+    assert other.get('/profile').status_code == 200  # caches alice in the second app
+
+    assert change_password(client).status_code == 200
+    other = login(second, password='battery staple')
+    assert change_password(other, current='correct horse', new='another secret').status_code == 400
+    assert change_password(other, current='battery staple', new='another secret').status_code == 200
+
+
+def test_logout_invalidates_the_token(app, client):
+    stolen = copy_session(app, client)
+    client.get('/logout')
+    assert client.get('/api/shifts').status_code == 401
+    assert stolen.get('/api/shifts').status_code == 401
+
+
+def test_login_issues_a_fresh_token(app, client):
+    before = {cookie.value for cookie in client._cookies.values()}
+    client.get('/logout')
+    client.post('/login', data={'username': 'alice', 'password': 'correct horse'})
+    after = {cookie.value for cookie in client._cookies.values()}
+    assert after and not after & before
+
+
+def test_sweep_removes_expired_sessions(app, client, login):
+    login(app, 'bob')
+    with app.app_context():
+        app.UserSession.query.filter_by(user_id=2).update({'expires_at': datetime.utcnow() - timedelta(days=1)})
+        app.db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['payflow', 'sweep-sessions'])
+    assert result.exit_code == 0, result.output
+    assert 'Removed 1 expired sessions.' in result.output
+    with app.app_context():
+        assert [row.user_id for row in app.UserSession.query] == [1]
+    assert client.get('/api/shifts').status_code == 200
+
+
+def test_cookie_backend(make_app, login):
+    app = make_app(SESSION_BACKEND='cookie')
+    client = login(app)
+    assert change_password(client).status_code == 200
+    assert client.get('/api/shifts').status_code == 200
+    with app.app_context():
+        assert app.UserSession.query.count() == 0
+    result = app.test_cli_runner().invoke(args=['payflow', 'sweep-sessions'])
+    assert 'nothing to sweep' in result.output
@@ -0,0 +1,72 @@
+"""Incremental /api/sync: changed rows and tombstones since a token."""
+from datetime import date, datetime, timedelta
+
+import app as payflow
+
+TODAY = date.today().isoformat()
+
+
+def age_rows(app, hours=1):
+    """Move every row's updated_at back so only later writes count as changes."""
+    earlier = datetime.utcnow() - timedelta(hours=hours)
+    with app.app_context():
+        for model in (app.Shift, app.Job, app.Expense, app.Receipt):
+            model.query.update({'updated_at': earlier}, synchronize_session=False)
+        app.db.session.commit()
+
+
+def add_shift(client, job_id=None):
+    response = client.post('/api/shifts', json={
+        'date': TODAY, 'job_id': job_id, 'start_time': '09:00', 'end_time': '17:00', 'total_wage': '8000',
+    })
+    return response.get_json()['id']
+
+
+def test_first_sync_is_a_full_snapshot(client, job):
+    add_shift(client, job['id'])
+    client.post('/api/expenses', json={'date': TODAY, 'category': 'food', 'amount': 500})
+    body = client.get('/api/sync').get_json()
+    assert body['full'] is True
+    assert [len(body[name]) for name in ('shifts', 'jobs', 'expenses', 'receipts')] == [1, 1, 1, 0]
+    assert body['token']
+
+
+def test_delta_returns_only_changes_and_deletions(app, client, job):
+    kept = add_shift(client, job['id'])
+    removed = add_shift(client)
+    token = client.get('/api/sync').get_json()['token']
+    age_rows(app)
+
+    quiet = client.get(f'/api/sync?since={token}').get_json()
+    assert quiet['full'] is False
+    assert quiet['shifts'] == [] and quiet['jobs'] == []
+    assert quiet['deleted']['shifts'] == []
+
+    added = add_shift(client)
+    assert client.delete(f'/api/shifts/{removed}').status_code == 200
+    delta = client.get(f'/api/sync?since={token}').get_json()
+    assert [shift['id'] for shift in delta['shifts']] == [added]
+    assert delta['deleted']['shifts'] == [removed]
+    assert kept not in delta['deleted']['shifts']
+
+
+def test_job_rename_resends_its_shifts(app, client, job):
+    shift_id = add_shift(client, job['id'])
+    token = client.get('/api/sync').get_json()['token']
+    age_rows(app)
+    client.put(f"/api/jobs/{job['id']}", json={'name': 'Bakery'})
+    delta = client.get(f'/api/sync?since={token}').get_json()
+    assert [(s['id'], s['job_name']) for s in delta['shifts']] == [(shift_id, 'Bakery')]
+    assert [j['name'] for j in delta['jobs']] == ['Bakery']
+
+
+def test_expired_and_invalid_tokens(client):
+    stale = payflow.encode_cursor([(datetime.utcnow() - timedelta(days=90)).isoformat()])
+    assert client.get(f'/api/sync?since={stale}').get_json()['full'] is True
+    assert client.get('/api/sync?since=not-a-token').status_code == 400
+
+
+def test_sync_is_per_user(app, client, login):
+    add_shift(client)
+    other = login(app, username='bob')
+    assert other.get('/api/sync').get_json()['shifts'] == []